@@ -1,35 +1,136 @@
+import base64
 import csv
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+import click
+from flask import Flask, current_app, render_template, request, redirect, url_for, flash, jsonify, g, has_app_context, has_request_context, stream_with_context, Response
+from flask.cli import AppGroup
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-import subprocess
+from sqlalchemy import event
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import IntegrityError, OperationalError
+from datetime import datetime, timedelta
+import atexit
+import io
+import logging
+import math
 import os
 import json
+import random
+import sqlite3
+import threading
+import time
 from collections import deque
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+from bulk_io import CONTENT_TYPES, FORMATS, Progress, chunks, guess_format, gzip_pieces, read_rows, write_rows
+from contraction import HierarchyRouter, get_hierarchy
+from delivery_planner import plan_fleet, plan_route
+from jobs import DONE, FAILED, Job, JobQueue
+from map_payload import get_map_payload, parse_bbox
+from metrics import Registry
+from native_router import NativeRouter
+from network_planner import plan_network
+from road_graph import get_graph
+from route_cache import RouteCache
+from routing import search_observers
+from spatial_index import get_location_index, parse_coordinates
+from user_store import UserStore
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-here'
-
-# Ensure users.csv exists at startup
+# Nothing here touches the disk or the database at import; create_app()
+# builds a configured app and the map, caches and user index load on
+# first use (or all at once in warm()).
 USERS_CSV = 'users.csv'
-def ensure_users_csv():
-    if not os.path.exists(USERS_CSV):
-        with open(USERS_CSV, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['id', 'email', 'password'])
-        print('users.csv created with header: id,email,password')
-ensure_users_csv()
-
-# SQLite database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///logistics.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+def default_config():
+    """Settings every app starts from; create_app(config) overrides any of them"""
+    return {
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'your-secret-key-here'),
+        # CSV file holding user accounts; created on the first signup
+        'USERS_CSV': USERS_CSV,
+        # SQLite database configuration
+        'SQLALCHEMY_DATABASE_URI': os.environ.get('DATABASE_URL', 'sqlite:///logistics.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        # Wait for locks instead of failing straight away when several workers write
+        'SQLITE_BUSY_TIMEOUT_MS': SQLITE_BUSY_TIMEOUT_MS,
+        # Attempts for a transaction that keeps hitting "database is locked"
+        'DB_LOCK_RETRIES': 5,
+        # Seconds of 2-opt / Or-opt local search allowed per batch delivery plan
+        'ROUTE_PLAN_TIME_BUDGET': 2.0,
+        # Entries kept in the in-process route cache
+        'ROUTE_CACHE_SIZE': 4096,
+        # Farthest (km) an order's location may be from the road network and still snap to it
+        'SNAP_RADIUS_KM': 2.0,
+        # Largest max_km /api/snap accepts; bigger radii are clamped to it
+        'SNAP_RADIUS_MAX_KM': 25.0,
+        # Warm routing_engine processes; 0 routes everything through routing.py
+        'ROUTING_ENGINE_PROCESSES': 2,
+        # 'ch' answers allocation and planning searches from the contraction
+        # hierarchy (see `flask build-ch`); 'native' uses the engine pool
+        'ROUTING_BACKEND': os.environ.get('ROUTING_BACKEND', 'native'),
+        # Threads running background batch plans
+        'PLAN_JOB_WORKERS': 2,
+        # Processes for "plan all warehouses"; None uses every core
+        'PLAN_ALL_WORKERS': None,
+        # Rows per executemany batch in bulk imports and per fetch in exports
+        'BULK_CHUNK_SIZE': 1000,
+        # Requests slower than this many seconds are logged; None turns the log off
+        'SLOW_REQUEST_SECONDS': float(os.environ['SLOW_REQUEST_SECONDS']) if os.environ.get('SLOW_REQUEST_SECONDS') else None,
+        # File for the slow-request log (otherwise it goes to the app's log output)
+        'SLOW_REQUEST_LOG': os.environ.get('SLOW_REQUEST_LOG'),
+    }
+
+db = SQLAlchemy()
+
+@event.listens_for(Engine, 'connect')
+def configure_sqlite(dbapi_connection, connection_record):
+    """WAL lets readers run alongside a writer; busy_timeout makes writers queue"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        timeout = current_app.config['SQLITE_BUSY_TIMEOUT_MS'] if has_app_context() else SQLITE_BUSY_TIMEOUT_MS
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(timeout)}')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+class Views:
+    """Routes, request hooks and CLI commands declared below, added to each app by create_app()
+
+    Endpoint names stay the view function names, as with @app.route.
+    """
+
+    def __init__(self):
+        self.routes = []
+        self.hooks = []
+        self.cli = AppGroup()
+
+    def route(self, rule, **options):
+        def decorator(view):
+            self.routes.append((rule, options, view))
+            return view
+        return decorator
+
+    def before_request(self, fn):
+        self.hooks.append(('before_request', fn))
+        return fn
+
+    def after_request(self, fn):
+        self.hooks.append(('after_request', fn))
+        return fn
+
+    def init_app(self, app):
+        for rule, options, view in self.routes:
+            app.add_url_rule(rule, view_func=view, **options)
+        for kind, fn in self.hooks:
+            getattr(app, kind)(fn)
+        for command in self.cli.commands.values():
+            app.cli.add_command(command)
+
+views = Views()
 
 # Database Models
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)  # natural key for catalogue imports
     category = db.Column(db.String(50), nullable=False)
     weight = db.Column(db.Float, nullable=False)
     price = db.Column(db.Float, nullable=False)
@@ -37,12 +138,16 @@ class Product(db.Model):
 
 class Warehouse(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)
     location = db.Column(db.String(100), nullable=False)
     capacity = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Inventory(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'location', name='uq_inventory_product_location'),
+        db.Index('ix_inventory_location', 'location'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     location = db.Column(db.String(100), nullable=False)  # 'factory' or warehouse name
@@ -52,6 +157,11 @@ class Inventory(db.Model):
     product = db.relationship('Product', backref='inventory_items')
 
 class Order(db.Model):
+    __table_args__ = (
+        db.Index('ix_order_type_created', 'type', 'created_at', 'id'),
+        db.Index('ix_order_type_warehouse_status', 'type', 'warehouse_id', 'status'),
+        db.Index('ix_order_type_status', 'type', 'status'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(50), nullable=False)  # 'customer_order', 'shipment', 'delivery'
     customer_name = db.Column(db.String(100))
@@ -68,17 +178,508 @@ class Order(db.Model):
     warehouse = db.relationship('Warehouse', backref='orders')
 
 class Route(db.Model):
+    # Unique so cached routes can be upserted; see `flask upgrade-db` for older databases
+    __table_args__ = (db.Index('uq_route_type_endpoints', 'type', 'start_point', 'end_point', unique=True),)
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(50), nullable=False)  # 'map_data', 'calculated_route'
     start_point = db.Column(db.String(100))
     end_point = db.Column(db.String(100))
-    route_data = db.Column(db.Text)
+    route_data = db.Column(db.Text)  # JSON: graph version, distance, path
     data = db.Column(db.Text)  # For map data
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    @property
+    def summary(self):
+        """Decoded route_data for calculated routes"""
+        try:
+            return json.loads(self.route_data or '{}')
+        except ValueError:
+            return {}
+
+# Keyset (cursor) pagination over orders, newest first
+ORDER_PAGE_SIZE = 50
+
+def encode_cursor(order):
+    raw = f'{order.created_at.isoformat()}|{order.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from a cursor, or None if it is missing or invalid"""
+    if not cursor:
+        return None
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def order_page(order_type, cursor=None, limit=ORDER_PAGE_SIZE, warehouse_id=None, status=None):
+    """Return (orders, next_cursor) for one page of orders of a type"""
+    query = Order.query.options(db.joinedload(Order.product)).filter(Order.type == order_type)
+    if warehouse_id is not None:
+        query = query.filter(Order.warehouse_id == warehouse_id)
+    if status is not None:
+        query = query.filter(Order.status == status)
+    position = decode_cursor(cursor)
+    if position:
+        query = query.filter(db.tuple_(Order.created_at, Order.id) < position)
+    rows = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def order_to_dict(order):
+    return {
+        'id': order.id,
+        'type': order.type,
+        'customer_name': order.customer_name,
+        'customer_email': order.customer_email,
+        'customer_address': order.customer_address,
+        'product_id': order.product_id,
+        'product_name': order.product_name,
+        'warehouse_id': order.warehouse_id,
+        'warehouse_name': order.warehouse_name,
+        'quantity': order.quantity,
+        'status': order.status,
+        'created_at': order.created_at.isoformat() if order.created_at else None,
+    }
+
+# Stock read model: every (location, product) level from one indexed query
+def stock_levels(product_id=None, product_ids=None):
+    """Return {location: {product_id: quantity}}, optionally for some products"""
+    query = db.session.query(Inventory.location, Inventory.product_id, Inventory.quantity)
+    if product_id is not None:
+        query = query.filter(Inventory.product_id == product_id)
+    if product_ids is not None:
+        query = query.filter(Inventory.product_id.in_(product_ids))
+    levels = {}
+    for location, pid, quantity in query:
+        levels.setdefault(location, {})[pid] = quantity or 0
+    return levels
+
+# Stock reservation: conditional in-database updates, safe across worker processes
+def reserve_stock(product_id, location, quantity):
+    """Take quantity from a location only if enough is on hand; returns True on success"""
+    # A negative quantity would pass the stock check and add stock instead
+    if quantity < 1:
+        raise ValueError(f'quantity to reserve must be positive, got {quantity}')
+    result = db.session.execute(
+        db.update(Inventory)
+        .where(Inventory.product_id == product_id,
+               Inventory.location == location,
+               Inventory.quantity >= quantity)
+        .values(quantity=Inventory.quantity - quantity, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    adjust_inventory_rollup(location, quantity=-quantity)
+    return True
+
+def receive_stock(product_id, location, quantity):
+    """Add quantity to a location, creating its inventory row if needed
+
+    A quantity of 0 only makes sure the row exists (a new product with no stock).
+    """
+    if quantity < 0:
+        raise ValueError(f'quantity to receive must not be negative, got {quantity}')
+    update = (db.update(Inventory)
+              .where(Inventory.product_id == product_id, Inventory.location == location)
+              .values(quantity=Inventory.quantity + quantity, updated_at=datetime.utcnow())
+              .execution_options(synchronize_session=False))
+    if db.session.execute(update).rowcount:
+        adjust_inventory_rollup(location, quantity=quantity)
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(Inventory(product_id=product_id, location=location, quantity=quantity))
+        adjust_inventory_rollup(location, products=1, quantity=quantity)
+    except IntegrityError:
+        # Another worker created the row first
+        db.session.execute(update)
+        adjust_inventory_rollup(location, quantity=quantity)
+
+def form_quantity(minimum=1, default='1'):
+    """The form's 'quantity' as an int of at least minimum, or None if it is not"""
+    try:
+        quantity = int(request.form.get('quantity', default))
+    except ValueError:
+        return None
+    return quantity if quantity >= minimum else None
+
+def run_transaction(work):
+    """Run work() and commit, retrying with backoff while the database is locked"""
+    attempts = current_app.config['DB_LOCK_RETRIES']
+    for attempt in range(attempts):
+        try:
+            result = work()
+            db.session.commit()
+            return result
+        except OperationalError as e:
+            db.session.rollback()
+            if 'locked' not in str(e) or attempt == attempts - 1:
+                raise
+            time.sleep(0.05 * (2 ** attempt) * (1 + random.random()))
+
+def inventory_by_location(locations):
+    """Return {location: [Inventory]} with products loaded, in one query"""
+    items = {location: [] for location in locations}
+    rows = (Inventory.query.options(db.joinedload(Inventory.product))
+            .filter(Inventory.location.in_(items))
+            .order_by(Inventory.location, Inventory.product_id))
+    for item in rows:
+        items[item.location].append(item)
+    return items
+
+# Report rollups, updated in the same transaction as the rows they summarise
+class InventoryRollup(db.Model):
+    location = db.Column(db.String(100), primary_key=True)
+    total_products = db.Column(db.Integer, nullable=False, default=0)
+    total_quantity = db.Column(db.Integer, nullable=False, default=0)
+
+class DeliveryStatusRollup(db.Model):
+    status = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class ThroughputBucket(db.Model):
+    bucket_start = db.Column(db.DateTime, primary_key=True)  # start of the hour
+    warehouse_id = db.Column(db.Integer, primary_key=True, default=0)  # 0 when unassigned
+    kind = db.Column(db.String(50), primary_key=True)  # order type
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# Databases upsert() and hour_of() can write rollups and cached routes to
+UPSERT_BACKENDS = ('sqlite', 'postgresql', 'mysql', 'mariadb')
+
+def upsert(table, keys, update, dialect=None):
+    """INSERT that updates the row already holding the same keys instead
+
+    update(proposed) returns the SET clause given the proposed row's
+    columns. The construct follows the session's database (SQLite,
+    PostgreSQL or MySQL/MariaDB); values are bound at execute time.
+    """
+    dialect = dialect or db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        return stmt.on_conflict_do_update(index_elements=list(keys), set_=update(stmt.excluded))
+    if dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update(update(stmt.inserted))
+    raise NotImplementedError(f'No upsert for the {dialect} dialect')
+
+def hour_of(column, dialect=None):
+    """SQL expression truncating a timestamp column to the start of its hour"""
+    dialect = dialect or db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return db.func.date_trunc('hour', column)
+    if dialect in ('mysql', 'mariadb'):
+        return db.func.date_format(column, '%Y-%m-%d %H:00:00')
+    return db.func.strftime('%Y-%m-%d %H:00:00', column)
+
+def _rollup_add(model, key, **deltas):
+    """Upsert a rollup row, adding deltas to its counters"""
+    stmt = upsert(model.__table__, key, lambda proposed: {
+        name: getattr(model, name) + proposed[name] for name in deltas})
+    db.session.execute(stmt.values(**key, **deltas))
+
+def _hour(moment=None):
+    return (moment or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+
+def adjust_inventory_rollup(location, products=0, quantity=0):
+    _rollup_add(InventoryRollup, {'location': location}, total_products=products, total_quantity=quantity)
+
+def adjust_delivery_status(old_status, new_status, count=1):
+    if old_status:
+        _rollup_add(DeliveryStatusRollup, {'status': old_status}, count=-count)
+    if new_status:
+        _rollup_add(DeliveryStatusRollup, {'status': new_status}, count=count)
+
+def record_new_orders(orders):
+    """Count newly created orders (model instances or row dicts) in the rollups"""
+    statuses = {}
+    buckets = {}
+    hour = _hour()
+    for order in orders:
+        get = order.get if isinstance(order, dict) else lambda name: getattr(order, name)
+        if get('type') == 'delivery':
+            status = get('status') or 'pending'
+            statuses[status] = statuses.get(status, 0) + 1
+        key = (get('warehouse_id') or 0, get('type'))
+        buckets[key] = buckets.get(key, 0) + 1
+    for status, count in statuses.items():
+        adjust_delivery_status(None, status, count)
+    for (warehouse_id, kind), count in buckets.items():
+        _rollup_add(ThroughputBucket, {'bucket_start': hour, 'warehouse_id': warehouse_id, 'kind': kind}, count=count)
+
+def rebuild_rollups():
+    """Recompute every rollup table from the source rows (fixes drift)"""
+    InventoryRollup.query.delete()
+    DeliveryStatusRollup.query.delete()
+    ThroughputBucket.query.delete()
+    db.session.execute(db.insert(InventoryRollup).from_select(
+        ['location', 'total_products', 'total_quantity'],
+        db.select(Inventory.location, db.func.count(Inventory.id), db.func.coalesce(db.func.sum(Inventory.quantity), 0))
+        .group_by(Inventory.location)))
+    db.session.execute(db.insert(DeliveryStatusRollup).from_select(
+        ['status', 'count'],
+        db.select(Order.status, db.func.count(Order.id)).where(Order.type == 'delivery').group_by(Order.status)))
+    hour = hour_of(Order.created_at)
+    rows = db.session.query(hour, db.func.coalesce(Order.warehouse_id, 0), Order.type, db.func.count(Order.id)) \
+        .group_by(hour, db.func.coalesce(Order.warehouse_id, 0), Order.type).all()
+    if rows:
+        db.session.execute(db.insert(ThroughputBucket), [
+            {'bucket_start': start if isinstance(start, datetime) else datetime.fromisoformat(start),
+             'warehouse_id': warehouse_id, 'kind': kind, 'count': count}
+            for start, warehouse_id, kind, count in rows if start
+        ])
+
+# Persistent tier of the route cache: one 'calculated_route' row per endpoint pair
+def load_cached_routes(version, pairs):
+    """{(start, end): (distance, path)} of stored routes at this graph version, in one query per 500 pairs"""
+    found = {}
+    for chunk in chunks(pairs, 500):
+        rows = Route.query.filter(Route.type == 'calculated_route',
+                                  db.tuple_(Route.start_point, Route.end_point).in_(chunk))
+        for row in rows:
+            data = row.summary
+            if data.get('version') == version:
+                found[(row.start_point, row.end_point)] = (data['distance'], data['path'])
+    return found
+
+def store_cached_routes(version, routes):
+    """Upsert (start, end, distance, path) routes with one executemany
+
+    Runs in the current session; committed with the caller's transaction.
+    """
+    stmt = upsert(Route.__table__, ['type', 'start_point', 'end_point'], lambda proposed: {
+        'route_data': proposed.route_data, 'created_at': proposed.created_at})
+    now = datetime.utcnow()
+    db.session.execute(stmt, [
+        {'type': 'calculated_route', 'start_point': start, 'end_point': end, 'created_at': now,
+         'route_data': json.dumps({'version': version, 'distance': distance, 'path': path})}
+        for start, end, distance, path in routes
+    ])
+
+class lazy:
+    """Attribute built on first access under the owner's lock, then kept on the instance"""
+
+    def __init__(self, build):
+        self.build = build
+        self.name = build.__name__
+        self.__doc__ = build.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        with instance._lock:
+            if self.name not in instance.__dict__:
+                instance.__dict__[self.name] = self.build(instance)
+        return instance.__dict__[self.name]
+
+class Services:
+    """Per-app user index, route cache, routers and job queue
+
+    Each is built the first time a request (or warm()) needs it, so
+    creating an app costs no file, process or thread start-up.
+    """
+
+    def __init__(self, app):
+        self.config = app.config
+        # Seconds spent in create_app() and warm(), reported on /metrics
+        self.startup = {}
+        self._lock = threading.RLock()
+
+    @lazy
+    def user_store(self):
+        return UserStore(self.config['USERS_CSV'])
+
+    @lazy
+    def route_cache(self):
+        return RouteCache(maxsize=self.config['ROUTE_CACHE_SIZE'], load=load_cached_routes, store=store_cached_routes)
+
+    @lazy
+    def native_router(self):
+        """Native routing engine pool; falls back to routing.py if the binary is not built"""
+        # Engine processes start on the first native call, not here
+        router = NativeRouter(processes=self.config['ROUTING_ENGINE_PROCESSES'])
+        atexit.register(router.close)
+        return router
+
+    @lazy
+    def ch_router(self):
+        """Contraction hierarchy searches; the engine pool serves them while it builds"""
+        return HierarchyRouter(fallback=self.native_router)
+
+    @lazy
+    def plan_jobs(self):
+        """Batch plans run on a background pool; finished plans are kept as
+        Route(type='batch_plan') rows keyed by job id"""
+        queue = JobQueue(workers=self.config['PLAN_JOB_WORKERS'], name='plan')
+        atexit.register(queue.shutdown, wait=False)
+        return queue
+
+def services():
+    """Services of the current app"""
+    return current_app.extensions['logistics']
+
+def active_router():
+    """Router for allocation and planning searches per ROUTING_BACKEND"""
+    s = services()
+    return s.ch_router if current_app.config['ROUTING_BACKEND'] == 'ch' else s.native_router
+
+# Request, SQL and routing metrics, scraped from /metrics
+metrics = Registry()
+request_duration = metrics.histogram('http_request_duration_seconds', 'Request latency by endpoint',
+                                     ('endpoint', 'method', 'status'))
+request_queries = metrics.histogram('http_request_sql_queries', 'SQL statements run per request', ('endpoint',),
+                                    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 1000))
+slow_requests = metrics.counter('http_slow_requests_total', 'Requests over SLOW_REQUEST_SECONDS', ('endpoint',))
+sql_queries = metrics.counter('sql_queries_total', 'SQL statements executed', ('operation',))
+sql_duration = metrics.histogram('sql_query_duration_seconds', 'SQL statement latency', ('operation',),
+                                 buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+routing_duration = metrics.histogram('routing_duration_seconds', 'Routing and planning time by operation',
+                                     ('operation',))
+routing_searches = metrics.counter('routing_searches_total', 'Shortest-path searches run by algorithm', ('algorithm',))
+routing_settled = metrics.histogram('routing_nodes_settled', 'Nodes settled per search', ('algorithm',),
+                                    buckets=(1, 10, 100, 1000, 10000, 100000, 1000000))
+routing_pushes = metrics.counter('routing_heap_pushes_total', 'Heap pushes made by searches', ('algorithm',))
+bulk_rows = metrics.counter('bulk_rows_total', 'Rows read by bulk imports and written by exports',
+                            ('kind', 'direction'))
+bulk_duration = metrics.histogram('bulk_duration_seconds', 'Bulk import and export time', ('kind', 'direction'),
+                                  buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+SQL_OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'PRAGMA', 'CREATE', 'SAVEPOINT', 'RELEASE', 'ROLLBACK'}
+
+slow_log = logging.getLogger('logistics.slow_requests')
+# Statements listed per slow request, slowest first
+SLOW_LOG_STATEMENTS = 10
+
+def configure_slow_log(path):
+    """Send the slow-request log to path (once per file, however many apps are created)"""
+    if not path:
+        return
+    path = os.path.abspath(path)
+    if any(getattr(handler, 'baseFilename', None) == path for handler in slow_log.handlers):
+        return
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    slow_log.addHandler(handler)
+    slow_log.setLevel(logging.INFO)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    operation = statement.lstrip()[:8].split(None, 1)[0].upper() if statement.strip() else ''
+    if operation not in SQL_OPERATIONS:
+        operation = 'OTHER'
+    sql_queries.inc(operation=operation)
+    sql_duration.observe(elapsed, operation=operation)
+    if has_request_context():
+        g.sql_queries = g.get('sql_queries', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+        if current_app.config['SLOW_REQUEST_SECONDS'] is not None:
+            # [count, seconds] per statement for the slow-request log; an
+            # N+1 loop shows up as one statement with a large count
+            totals = g.setdefault('sql_statements', {}).setdefault(statement, [0, 0.0])
+            totals[0] += 1
+            totals[1] += elapsed
+
+@event.listens_for(Engine, 'handle_error')
+def _query_failed(exception_context):
+    # after_cursor_execute does not fire for failed statements
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_started'):
+        conn.info['query_started'].pop()
+
+def record_search(stats):
+    """Count a finished routing search, per request as well when in one"""
+    routing_searches.inc(algorithm=stats.algorithm)
+    routing_settled.observe(stats.settled, algorithm=stats.algorithm)
+    routing_pushes.inc(stats.pushes, algorithm=stats.algorithm)
+    if has_request_context():
+        totals = g.setdefault('routing_searches', {}).setdefault(stats.algorithm, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += stats.settled
+        totals[2] += stats.pushes
+
+search_observers.append(record_search)
+
+def slow_request_breakdown():
+    """Lines listing the request's slowest SQL statements and its routing searches"""
+    statements = sorted(g.get('sql_statements', {}).items(), key=lambda item: item[1][1], reverse=True)
+    lines = [f'  sql {count}x {seconds:.3f}s {" ".join(statement.split())[:200]}'
+             for statement, (count, seconds) in statements[:SLOW_LOG_STATEMENTS]]
+    if len(statements) > SLOW_LOG_STATEMENTS:
+        lines.append(f'  sql ... {len(statements) - SLOW_LOG_STATEMENTS} more statements')
+    lines.extend(f'  routing {algorithm} {searches} searches, {settled} settled, {pushes} pushes'
+                 for algorithm, (searches, settled, pushes) in sorted(g.get('routing_searches', {}).items()))
+    return lines
+
+@views.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@views.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or 'unmatched'
+    queries = g.get('sql_queries', 0)
+    sql_seconds = g.get('sql_seconds', 0.0)
+    request_duration.observe(elapsed, endpoint=endpoint, method=request.method, status=str(response.status_code))
+    request_queries.observe(queries, endpoint=endpoint)
+    response.headers['Server-Timing'] = f'app;dur={elapsed * 1000:.1f}, db;dur={sql_seconds * 1000:.1f}'
+    threshold = current_app.config['SLOW_REQUEST_SECONDS']
+    if threshold is not None and elapsed >= threshold:
+        slow_requests.inc(endpoint=endpoint)
+        # Statements can contain % themselves, so the breakdown goes in as an argument
+        slow_log.warning('slow request %s %s -> %s in %.3fs (%d SQL statements, %.3fs in SQL)%s',
+                         request.method, request.full_path.rstrip('?'), response.status_code,
+                         elapsed, queries, sql_seconds, ''.join('\n' + line for line in slow_request_breakdown()))
+    return response
+
+@metrics.collector
+def routing_metrics():
+    # Only services already built report; a scrape must not start the job
+    # pool or the routing engines
+    s = services()
+    built = s.__dict__
+    series = [
+        ('app_startup_seconds', 'gauge', 'Time spent in create_app() and warm()', ('phase',),
+         {(phase,): seconds for phase, seconds in s.startup.items()}),
+    ]
+    if 'plan_jobs' in built:
+        series.append(('plan_jobs', 'gauge', 'Batch planning jobs by status', ('status',),
+                       {(status,): count for status, count in s.plan_jobs.stats().items()}))
+    if 'route_cache' in built:
+        cache = s.route_cache.stats()
+        series += [
+            ('route_cache_lookups_total', 'counter', 'Route cache lookups by outcome', ('outcome',), {
+                ('memory_hit',): cache['hits'],
+                ('memory_miss',): cache['misses'],
+                ('persistent_hit',): cache['persistent_hits'],
+                ('computed',): cache['computed'],
+            }),
+            ('route_cache_entries', 'gauge', 'Routes held in the in-process cache', (), {(): cache['size']}),
+        ]
+    calls = {}
+    if 'native_router' in built:
+        pool = s.native_router.stats()
+        calls.update({('native',): pool['native_calls'], ('python',): pool['fallback_calls']})
+    if 'ch_router' in built:
+        calls[('ch',)] = s.ch_router.stats()['ch_calls']
+    if calls:
+        series.append(('routing_calls_total', 'counter', 'Routing calls by backend', ('backend',), calls))
+    if 'native_router' in built:
+        series.append(('routing_engine_warm_processes', 'gauge', 'Idle native routing engine processes', (),
+                       {(): pool['warm']}))
+    return series
+
 # Flask-Login setup
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
 
 # User class for Flask-Login
@@ -91,20 +692,15 @@ class User(UserMixin):
     def get_id(self):
         return self.id
 
-# Load user from CSV
+# Load user from the indexed CSV store
 @login_manager.user_loader
 def load_user(user_id):
-    try:
-        with open(USERS_CSV, 'r', newline='') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['id'] == user_id:
-                    return User(row['id'], row['email'], row['password'])
-    except Exception:
-        pass
+    row = services().user_store.get(user_id)
+    if row:
+        return User(row['id'], row['email'], row['password'])
     return None
 
-@app.route('/login', methods=['GET', 'POST'])
+@views.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form['email'].strip().lower()
@@ -113,20 +709,16 @@ def login():
         if '@' not in email or '.' not in email or 'gmail.com' not in email:
             flash('Invalid email format. Please enter a valid Gmail address.', 'error')
             return render_template('login.html')
-        with open(USERS_CSV, 'r', newline='') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if 'email' not in row or 'password' not in row:
-                    continue
-                if row['email'].strip().lower() == email and row['password'].strip() == password:
-                    user = User(row['id'], row['email'], row['password'])
-                    login_user(user)
-                    flash('Logged in successfully!', 'success')
-                    return redirect(url_for('home'))
+        row = services().user_store.find_by_email(email)
+        if row and row['password'].strip() == password:
+            user = User(row['id'], row['email'], row['password'])
+            login_user(user)
+            flash('Logged in successfully!', 'success')
+            return redirect(url_for('home'))
         flash('Invalid email or password', 'error')
     return render_template('login.html')
 
-@app.route('/signup', methods=['GET', 'POST'])
+@views.route('/signup', methods=['GET', 'POST'])
 def signup():
     if request.method == 'POST':
         email = request.form['email'].strip().lower()
@@ -135,25 +727,15 @@ def signup():
         if '@' not in email or '.' not in email or 'gmail.com' not in email:
             flash('Invalid email format. Please enter a valid Gmail address.', 'error')
             return render_template('signup.html')
-        # Check if email exists
-        with open(USERS_CSV, 'r', newline='') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if 'email' not in row:
-                    continue
-                if row['email'].strip().lower() == email:
-                    flash('Email already exists', 'error')
-                    return render_template('signup.html')
-        # Add new user
-        with open(USERS_CSV, 'a', newline='') as f:
-            writer = csv.writer(f)
-            user_id = str(sum(1 for _ in open(USERS_CSV)) - 1)
-            writer.writerow([user_id, email, password])
+        # Add new user; the store rejects an existing email atomically
+        if services().user_store.add(email, password) is None:
+            flash('Email already exists', 'error')
+            return render_template('signup.html')
         flash('Signup successful! Please log in.', 'success')
         return redirect(url_for('login'))
     return render_template('signup.html')
 
-@app.route('/logout')
+@views.route('/logout')
 @login_required
 def logout():
     logout_user()
@@ -161,196 +743,187 @@ def logout():
     return redirect(url_for('login'))
 
 # Protect main pages
-@app.route('/')
+@views.route('/')
 @login_required
 def home():
     """Home page with system introduction"""
     return render_template('home.html')
 
-@app.route('/factory')
+@views.route('/factory')
 def factory():
     """Factory dashboard showing products and shipment controls"""
     # Get products from factory inventory
-    factory_inventory = Inventory.query.filter_by(location='factory').all()
+    factory_inventory = inventory_by_location(['factory'])['factory']
     
-    # Get recent shipments
-    recent_shipments = Order.query.filter_by(type='shipment').order_by(Order.created_at.desc()).limit(10).all()
+    # Get recent shipments, one page at a time
+    recent_shipments, next_cursor = order_page('shipment', request.args.get('cursor'), limit=10)
     
     return render_template('factory.html', 
                          inventory=factory_inventory, 
-                         shipments=recent_shipments)
+                         shipments=recent_shipments,
+                         next_cursor=next_cursor)
 
-@app.route('/ship_to_warehouse', methods=['POST'])
+@views.route('/ship_to_warehouse', methods=['POST'])
 def ship_to_warehouse():
     """Trigger shipment from factory to warehouse"""
     product_id = request.form.get('product_id')
     warehouse_id = request.form.get('warehouse_id')
-    quantity = int(request.form.get('quantity', 1))
+    quantity = form_quantity()
+    if quantity is None:
+        flash('Quantity must be a whole number of at least 1', 'error')
+        return redirect(url_for('factory'))
     
     # Get product and warehouse details
     product = Product.query.get(product_id)
     warehouse = Warehouse.query.get(warehouse_id)
     
     if product and warehouse:
-        # Create shipment order
-        shipment = Order(
-            type='shipment',
-            product_id=product.id,
-            product_name=product.name,
-            warehouse_id=warehouse.id,
-            warehouse_name=warehouse.name,
-            quantity=quantity,
-            status='in_transit'
-        )
-        db.session.add(shipment)
-        
-        # Update factory inventory
-        factory_inventory = Inventory.query.filter_by(product_id=product.id, location='factory').first()
-        if factory_inventory:
-            factory_inventory.quantity -= quantity
-        else:
-            factory_inventory = Inventory(product_id=product.id, location='factory', quantity=-quantity)
-            db.session.add(factory_inventory)
+        def ship():
+            # Take stock from the factory first; nothing is written if it runs short
+            if not reserve_stock(product.id, 'factory', quantity):
+                return False
+            receive_stock(product.id, warehouse.name, quantity)
+            
+            # Create shipment order
+            shipment = Order(
+                type='shipment',
+                product_id=product.id,
+                product_name=product.name,
+                warehouse_id=warehouse.id,
+                warehouse_name=warehouse.name,
+                quantity=quantity,
+                status='in_transit'
+            )
+            db.session.add(shipment)
+            record_new_orders([shipment])
+            return True
         
-        # Update warehouse inventory
-        warehouse_inventory = Inventory.query.filter_by(product_id=product.id, location=warehouse.name).first()
-        if warehouse_inventory:
-            warehouse_inventory.quantity += quantity
+        if run_transaction(ship):
+            flash(f'Shipped {quantity} {product.name} to {warehouse.name}', 'success')
         else:
-            warehouse_inventory = Inventory(product_id=product.id, location=warehouse.name, quantity=quantity)
-            db.session.add(warehouse_inventory)
-        
-        db.session.commit()
-        flash(f'Shipped {quantity} {product.name} to {warehouse.name}', 'success')
+            flash(f'Not enough {product.name} in factory stock to ship {quantity}', 'error')
     
     return redirect(url_for('factory'))
 
-@app.route('/warehouses')
+@views.route('/warehouses')
 def warehouses():
     """Warehouse dashboard showing stock and dispatch controls"""
     # Get all warehouses
     warehouses_list = Warehouse.query.all()
     
-    # Get inventory for each warehouse
-    warehouse_inventory = {}
-    for warehouse in warehouses_list:
-        inventory = Inventory.query.filter_by(location=warehouse.name).all()
-        warehouse_inventory[warehouse.name] = inventory
+    # Get inventory for every warehouse in a single query
+    warehouse_inventory = inventory_by_location([warehouse.name for warehouse in warehouses_list])
     
-    # Get delivery status
-    deliveries = Order.query.filter_by(type='delivery').order_by(Order.created_at.desc()).limit(20).all()
+    # Get delivery status, one page at a time
+    deliveries, next_cursor = order_page('delivery', request.args.get('cursor'), limit=20)
     
     return render_template('warehouses.html', 
                          warehouses=warehouses_list,
                          inventory=warehouse_inventory,
-                         deliveries=deliveries)
+                         deliveries=deliveries,
+                         next_cursor=next_cursor)
 
-@app.route('/dispatch_from_warehouse', methods=['POST'])
+@views.route('/dispatch_from_warehouse', methods=['POST'])
 def dispatch_from_warehouse():
     """Dispatch product from warehouse to customer"""
     warehouse_id = request.form.get('warehouse_id')
     product_id = request.form.get('product_id')
-    quantity = int(request.form.get('quantity', 1))
+    quantity = form_quantity()
     customer_address = request.form.get('customer_address')
+    if quantity is None:
+        flash('Quantity must be a whole number of at least 1', 'error')
+        return redirect(url_for('warehouses'))
     
     warehouse = Warehouse.query.get(warehouse_id)
     product = Product.query.get(product_id)
     
     if warehouse and product:
-        # Create delivery order
-        delivery = Order(
-            type='delivery',
-            product_id=product.id,
-            product_name=product.name,
-            warehouse_id=warehouse.id,
-            warehouse_name=warehouse.name,
-            quantity=quantity,
-            customer_address=customer_address,
-            status='processing'
-        )
-        db.session.add(delivery)
-        
-        # Update warehouse inventory
-        warehouse_inventory = Inventory.query.filter_by(product_id=product.id, location=warehouse.name).first()
-        if warehouse_inventory:
-            warehouse_inventory.quantity -= quantity
+        def dispatch():
+            if not reserve_stock(product.id, warehouse.name, quantity):
+                return False
+            
+            # Create delivery order
+            delivery = Order(
+                type='delivery',
+                product_id=product.id,
+                product_name=product.name,
+                warehouse_id=warehouse.id,
+                warehouse_name=warehouse.name,
+                quantity=quantity,
+                customer_address=customer_address,
+                status='processing'
+            )
+            db.session.add(delivery)
+            record_new_orders([delivery])
+            return True
         
-        db.session.commit()
-        flash(f'Dispatched {quantity} {product.name} from {warehouse.name}', 'success')
+        if run_transaction(dispatch):
+            flash(f'Dispatched {quantity} {product.name} from {warehouse.name}', 'success')
+        else:
+            flash(f'Not enough {product.name} in {warehouse.name} to dispatch {quantity}', 'error')
     
     return redirect(url_for('warehouses'))
 
-@app.route('/orders', methods=['GET', 'POST'])
+@views.route('/orders', methods=['GET', 'POST'])
 def orders():
     """Order management page with form to place orders"""
     if request.method == 'POST':
         # Process new order
         customer_name = request.form.get('customer_name')
         customer_email = request.form.get('customer_email')
-        customer_address = request.form.get('customer_address')
+        customer_address = (request.form.get('customer_address') or '').strip()
         product_id = request.form.get('product_id')
-        quantity = int(request.form.get('quantity', 1))
+        quantity = form_quantity()
+        # Optional coordinates travel with the address so planning can snap it too
+        lat = request.form.get('customer_lat', type=float)
+        lon = request.form.get('customer_lon', type=float)
+        if lat is not None and lon is not None and not parse_coordinates(customer_address):
+            customer_address = f'{customer_address} ({lat:.6f}, {lon:.6f})'.strip()
         
         product = Product.query.get(product_id)
         
-        if product:
+        # Shared road graph (built once per map file version)
+        graph = get_graph()
+        # Road node the order is delivered to
+        destination, snap_km = get_location_index(graph).resolve(customer_address, current_app.config['SNAP_RADIUS_KM'])
+        
+        if quantity is None:
+            flash('Quantity must be a whole number of at least 1', 'error')
+        elif product and destination is None:
+            flash('Delivery address could not be matched to the road network', 'error')
+        elif product:
             # Find best warehouse based on inventory and location
             warehouses_list = Warehouse.query.all()
-            best_warehouse = None
-            best_distance = float('inf')
-            best_path = []
-            
-            # Load map data
-            with open('real_map_with_distances.json', 'r') as f:
-                map_data = json.load(f)
-            nodes = {node['name']: node for node in map_data['nodes']}
-            edges = map_data['edges']
-            # Build adjacency list
-            adj = {node['name']: [] for node in map_data['nodes']}
-            for edge in edges:
-                from_name = next(n['name'] for n in map_data['nodes'] if n['id'] == edge['from'])
-                to_name = next(n['name'] for n in map_data['nodes'] if n['id'] == edge['to'])
-                adj[from_name].append((to_name, edge['distance']))
-                adj[to_name].append((from_name, edge['distance']))
-            
-            def dijkstra(source, target):
-                import heapq
-                dist = {n: float('inf') for n in adj}
-                prev = {n: None for n in adj}
-                dist[source] = 0
-                heap = [(0, source)]
-                while heap:
-                    d, u = heapq.heappop(heap)
-                    if u == target:
-                        break
-                    for v, w in adj[u]:
-                        if w is None:
-                            continue  # Skip edges with no distance
-                        if dist[v] > d + w:
-                            dist[v] = d + w
-                            prev[v] = u
-                            heapq.heappush(heap, (dist[v], v))
-                # Reconstruct path
-                path = []
-                u = target
-                while u:
-                    path.append(u)
-                    u = prev[u]
-                path.reverse()
-                return dist[target], path
             
+            # Warehouses holding enough stock for this order
+            levels = stock_levels(product_id=product.id)
+            stocked = {}
             for warehouse in warehouses_list:
-                inventory = Inventory.query.filter_by(product_id=product.id, location=warehouse.name).first()
-                if inventory and inventory.quantity >= quantity:
-                    # Calculate shortest path from warehouse to customer address
-                    if warehouse.name in adj and customer_address in adj:
-                        d, path = dijkstra(warehouse.name, customer_address)
-                        if d < best_distance:
-                            best_distance = d
-                            best_warehouse = warehouse
-                            best_path = path
+                if levels.get(warehouse.name, {}).get(product.id, 0) >= quantity and warehouse.name in graph:
+                    stocked.setdefault(warehouse.name, warehouse)
             
-            if best_warehouse:
+            # Cached warehouse -> address routes; otherwise one search from
+            # the customer ranks every stocked warehouse
+            route_cache = services().route_cache
+            cached = route_cache.get_many(graph.version, [(name, destination) for name in stocked])
+            computed = []
+            if len(cached) == len(stocked):
+                candidates = sorted(((name, d, path) for (name, _), (d, path) in cached.items()), key=lambda c: c[1])
+            else:
+                with routing_duration.time(operation='allocate'):
+                    candidates, _ = active_router().nearest_targets(graph, destination, stocked)
+                computed = [(name, destination, d, path) for name, d, path in candidates]
+            def place_order():
+                # Stored with the order, so a lock retry writes the routes again
+                route_cache.persist(graph.version, computed)
+                # Reserve at the nearest warehouse that still holds the stock
+                for name, distance, path in candidates:
+                    if reserve_stock(product.id, name, quantity):
+                        break
+                else:
+                    return None
+                warehouse = stocked[name]
+                
                 # Create customer order
                 order = Order(
                     type='customer_order',
@@ -360,12 +933,11 @@ def orders():
                     product_id=product.id,
                     product_name=product.name,
                     quantity=quantity,
-                    warehouse_id=best_warehouse.id,
-                    warehouse_name=best_warehouse.name,
+                    warehouse_id=warehouse.id,
+                    warehouse_name=warehouse.name,
                     status='assigned'
                 )
                 db.session.add(order)
-                db.session.commit()
 
                 # Automatically create a delivery order for batch delivery
                 delivery_order = Order(
@@ -376,53 +948,248 @@ def orders():
                     product_id=product.id,
                     product_name=product.name,
                     quantity=quantity,
-                    warehouse_id=best_warehouse.id,
-                    warehouse_name=best_warehouse.name,
+                    warehouse_id=warehouse.id,
+                    warehouse_name=warehouse.name,
                     status='pending'
                 )
                 db.session.add(delivery_order)
-                db.session.commit()
-
-                flash(f'Order placed successfully! Assigned to {best_warehouse.name} (distance: {best_distance:.2f} km)', 'success')
+                record_new_orders([order, delivery_order])
+                return warehouse, distance
+            
+            placed = run_transaction(place_order) if candidates else None
+            # Only committed routes go to the memory tier
+            route_cache.remember(graph.version, computed)
+            if placed:
+                best_warehouse, best_distance = placed
+                message = f'Order placed successfully! Assigned to {best_warehouse.name} (distance: {best_distance:.2f} km)'
+                if snap_km:
+                    message += f', delivering via {destination} ({snap_km:.2f} km from the given location)'
+                flash(message, 'success')
             else:
                 flash('Product not available in sufficient quantity or invalid address', 'error')
     
-    # Get all orders
-    orders_list = Order.query.filter_by(type='customer_order').order_by(Order.created_at.desc()).all()
+    # Get one page of orders plus status counts for the statistics panel
+    orders_list, next_cursor = order_page('customer_order', request.args.get('cursor'))
     products_list = Product.query.all()
+    status_counts = dict(db.session.query(Order.status, db.func.count(Order.id))
+                         .filter(Order.type == 'customer_order').group_by(Order.status).all())
     
-    return render_template('orders.html', orders=orders_list, products=products_list)
+    return render_template('orders.html', orders=orders_list, products=products_list,
+                           next_cursor=next_cursor, status_counts=status_counts)
+
+@views.route('/api/orders')
+def orders_api():
+    """Keyset-paginated JSON listing of orders, deliveries or shipments"""
+    order_type = request.args.get('type', 'customer_order')
+    if order_type not in ('customer_order', 'delivery', 'shipment'):
+        return jsonify({'error': 'type must be customer_order, delivery or shipment'}), 400
+    limit = min(max(request.args.get('limit', ORDER_PAGE_SIZE, type=int), 1), 500)
+    rows, next_cursor = order_page(order_type, request.args.get('cursor'), limit,
+                                   warehouse_id=request.args.get('warehouse_id', type=int),
+                                   status=request.args.get('status'))
+    return jsonify({'items': [order_to_dict(o) for o in rows], 'next_cursor': next_cursor})
+
+# Bulk order ingestion
+ORDER_IMPORT_FIELDS = ('customer_name', 'customer_email', 'customer_address', 'product_id', 'quantity')
+
+class StaleStockSnapshot(Exception):
+    """Stock changed between reading the snapshot and reserving it"""
+
+def parse_order_rows(text, fmt):
+    """Parse a JSON list (or {"orders": [...]}) or CSV text into row dicts"""
+    if fmt == 'json':
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get('orders', [])
+        if not isinstance(data, list):
+            raise ValueError('Expected a JSON list of orders')
+        return data
+    return list(csv.DictReader(text.splitlines()))
+
+def ingest_orders(rows, attempts=3):
+    """Validate, allocate and insert a batch of orders in a single transaction
+
+    All orders share one stock snapshot and one routing search per distinct
+    address. Returns a report with one entry per input row.
+    """
+    report = [{'row': i, 'status': 'rejected'} for i in range(len(rows))]
+    valid = []
+    product_ids = set()
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            report[i]['error'] = 'row must be an object'
+            continue
+        try:
+            product_id = int(row.get('product_id'))
+            quantity = int(row.get('quantity', 1))
+        except (TypeError, ValueError):
+            report[i]['error'] = 'product_id and quantity must be integers'
+            continue
+        address = (row.get('customer_address') or '').strip()
+        if quantity < 1:
+            report[i]['error'] = 'quantity must be positive'
+        elif not address:
+            report[i]['error'] = 'customer_address is required'
+        else:
+            valid.append((i, row, product_id, quantity, address))
+            product_ids.add(product_id)
+
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids))}
+    for i, _, product_id, _, _ in valid:
+        if product_id not in products:
+            report[i]['error'] = f'unknown product {product_id}'
+    valid = [entry for entry in valid if entry[2] in products]
+
+    # One routing pass: rank every warehouse once per distinct delivery node
+    graph = get_graph()
+    destinations = get_location_index(graph).resolve_many((row[4] for row in valid), current_app.config['SNAP_RADIUS_KM'])
+    warehouses_on_map = {w.name: w for w in Warehouse.query.all() if w.name in graph}
+    with routing_duration.time(operation='bulk_rank'):
+        ranked = active_router().nearest_targets_many(graph, {node for node in destinations.values() if node},
+                                                      warehouses_on_map, with_paths=False)
+    ranking = {address: [(name, distance) for name, distance, _ in ranked.get(node, ())]
+               for address, node in destinations.items()}
+
+    def allocate_and_insert():
+        levels = stock_levels(product_ids=products)
+        taken = {}
+        outcome = {}
+        order_rows = []
+        for i, row, product_id, quantity, address in valid:
+            for name, distance in ranking[address]:
+                key = (product_id, name)
+                if levels.get(name, {}).get(product_id, 0) - taken.get(key, 0) >= quantity:
+                    taken[key] = taken.get(key, 0) + quantity
+                    break
+            else:
+                error = 'no warehouse with stock reachable from address'
+                if destinations[address] is None:
+                    error = 'address could not be matched to the road network'
+                outcome[i] = {'status': 'unfulfilled', 'error': error}
+                continue
+            warehouse = warehouses_on_map[name]
+            outcome[i] = {'status': 'allocated', 'warehouse': name, 'distance': distance}
+            for order_type, status in (('customer_order', 'assigned'), ('delivery', 'pending')):
+                order_rows.append({
+                    'type': order_type,
+                    'customer_name': row.get('customer_name'),
+                    'customer_email': row.get('customer_email'),
+                    'customer_address': address,
+                    'product_id': product_id,
+                    'product_name': products[product_id].name,
+                    'quantity': quantity,
+                    'warehouse_id': warehouse.id,
+                    'warehouse_name': name,
+                    'status': status,
+                })
+        # One conditional decrement per (product, warehouse) for the whole batch
+        for (product_id, name), quantity in taken.items():
+            if not reserve_stock(product_id, name, quantity):
+                raise StaleStockSnapshot()
+        if order_rows:
+            db.session.execute(db.insert(Order), order_rows)
+            record_new_orders(order_rows)
+        return outcome
+
+    outcome = None
+    for _ in range(attempts):
+        try:
+            outcome = run_transaction(allocate_and_insert)
+            break
+        except StaleStockSnapshot:
+            db.session.rollback()
+    if outcome is None:
+        outcome = {i: {'status': 'unfulfilled', 'error': 'stock changed during import, please retry'}
+                   for i, _, _, _, _ in valid}
+    for i, result in outcome.items():
+        report[i].update(result)
+    return report
+
+def summarize_import(report, elapsed):
+    counts = {}
+    for entry in report:
+        counts[entry['status']] = counts.get(entry['status'], 0) + 1
+    return {'total': len(report), 'counts': counts, 'seconds': round(elapsed, 3)}
+
+@views.route('/api/orders/bulk', methods=['POST'])
+def bulk_orders_api():
+    """Bulk order ingestion from a JSON list or CSV body"""
+    fmt = 'csv' if 'csv' in (request.content_type or '') else 'json'
+    try:
+        rows = parse_order_rows(request.get_data(as_text=True), fmt)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    started = time.perf_counter()
+    report = ingest_orders(rows)
+    return jsonify({'summary': summarize_import(report, time.perf_counter() - started), 'results': report})
+
+@views.cli.command('import-orders')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--report', 'report_path', type=click.Path(dir_okay=False), help='Write the per-order report as JSON')
+def import_orders_command(path, report_path):
+    """Import orders from a .json or .csv file"""
+    with open(path, 'r', newline='') as f:
+        rows = parse_order_rows(f.read(), 'csv' if path.lower().endswith('.csv') else 'json')
+    started = time.perf_counter()
+    report = ingest_orders(rows)
+    summary = summarize_import(report, time.perf_counter() - started)
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump({'summary': summary, 'results': report}, f, indent=2)
+    click.echo(json.dumps(summary))
 
-@app.route('/reports')
+@views.route('/reports')
 def reports():
     """Reports page showing summary tables"""
-    # Inventory summary
-    inventory_summary = db.session.query(
-        Inventory.location,
-        db.func.count(Inventory.id).label('total_products'),
-        db.func.sum(Inventory.quantity).label('total_quantity')
-    ).group_by(Inventory.location).all()
+    # Inventory and delivery summaries come from the maintained rollups
+    inventory_summary = InventoryRollup.query.order_by(InventoryRollup.location).all()
+    delivery_summary = DeliveryStatusRollup.query.filter(DeliveryStatusRollup.count > 0) \
+        .order_by(DeliveryStatusRollup.status).all()
     
-    # Delivery status summary
-    delivery_summary = db.session.query(
-        Order.status,
-        db.func.count(Order.id).label('count')
-    ).filter(Order.type == 'delivery').group_by(Order.status).all()
+    # Hourly throughput per warehouse over the last day
+    since = _hour() - timedelta(hours=23)
+    throughput = db.session.query(ThroughputBucket, Warehouse.name) \
+        .outerjoin(Warehouse, Warehouse.id == ThroughputBucket.warehouse_id) \
+        .filter(ThroughputBucket.bucket_start >= since) \
+        .order_by(ThroughputBucket.bucket_start.desc(), ThroughputBucket.warehouse_id).all()
     
     # Recent routes
-    recent_routes = Route.query.order_by(Route.created_at.desc()).limit(10).all()
+    recent_routes = Route.query.filter_by(type='calculated_route').order_by(Route.created_at.desc()).limit(10).all()
     
     return render_template('reports.html',
                          inventory_summary=inventory_summary,
                          delivery_summary=delivery_summary,
+                         throughput=throughput,
                          recent_routes=recent_routes)
 
-@app.route('/init_db')
+@views.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Bring an existing database up to the current tables and indexes"""
+    db.create_all()
+    # Older databases may hold duplicate cached routes; keep the newest of each
+    newest = db.select(db.func.max(Route.id)).where(Route.type == 'calculated_route') \
+        .group_by(Route.start_point, Route.end_point)
+    db.session.execute(db.delete(Route).where(Route.type == 'calculated_route', Route.id.not_in(newest))
+                       .execution_options(synchronize_session=False))
+    db.session.execute(db.text('DROP INDEX IF EXISTS ix_route_type_endpoints'))
+    db.session.commit()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    click.echo('Database upgraded')
+
+@views.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the report rollup tables from inventory and orders"""
+    rebuild_rollups()
+    db.session.commit()
+    click.echo('Report rollups rebuilt')
+
+@views.route('/init_db')
 def init_db():
     """Initialize database with sample data"""
     # Create all tables
-    with app.app_context():
-        db.create_all()
+    db.create_all()
     
     # Clear existing data
     Product.query.delete()
@@ -441,11 +1208,6 @@ def init_db():
         Product(name='Blender', category='Appliances', weight=1.5, price=2499.99)
     ]
     
-    for product in products:
-        db.session.add(product)
-    
-    db.session.commit()
-    
     # Sample warehouses with Indian locations
     warehouses = [
         Warehouse(name='Clement Town Warehouse', location='Clement Town, Dehradun', capacity=10000),
@@ -453,32 +1215,24 @@ def init_db():
         Warehouse(name='Raipur Warehouse', location='Raipur, Dehradun', capacity=12000)
     ]
     
-    for warehouse in warehouses:
-        db.session.add(warehouse)
-    
-    db.session.commit()
+    # One flush assigns ids; everything below commits together
+    db.session.add_all(products + warehouses)
+    db.session.flush()
     
-    # Sample inventory
-    inventory_data = []
-    
-    # Factory inventory (Clock Tower Dehradun)
-    for product in products:
-        inventory_data.append(Inventory(product_id=product.id, location='factory', quantity=100))
-    
-    # Warehouse inventory
+    # Sample inventory: factory stock (Clock Tower Dehradun), then each warehouse
+    inventory_data = [{'product_id': product.id, 'location': 'factory', 'quantity': 100} for product in products]
     for warehouse in warehouses:
         for i, product in enumerate(products):
-            inventory_data.append(Inventory(product_id=product.id, location=warehouse.name, quantity=20 + (i * 5)))
-    
-    for inventory in inventory_data:
-        db.session.add(inventory)
+            inventory_data.append({'product_id': product.id, 'location': warehouse.name, 'quantity': 20 + (i * 5)})
+    db.session.execute(db.insert(Inventory), inventory_data)
     
+    rebuild_rollups()
     db.session.commit()
     
     flash('Database initialized with sample data!', 'success')
     return redirect(url_for('home'))
 
-@app.route('/add_product', methods=['GET', 'POST'])
+@views.route('/add_product', methods=['GET', 'POST'])
 def add_product():
     """Add a new product to the system from the factory dashboard"""
     if request.method == 'POST':
@@ -486,130 +1240,612 @@ def add_product():
         category = request.form.get('category')
         weight = float(request.form.get('weight', 0))
         price = float(request.form.get('price', 0))
-        quantity = int(request.form.get('quantity', 0))
+        quantity = form_quantity(minimum=0, default='0')
+        if quantity is None:
+            flash('Initial stock must be a whole number, 0 or more', 'error')
+            return render_template('add_product.html')
         
-        # Create product
-        product = Product(name=name, category=category, weight=weight, price=price)
-        db.session.add(product)
-        db.session.commit()
+        def create():
+            # Product and its factory stock commit together
+            product = Product(name=name, category=category, weight=weight, price=price)
+            db.session.add(product)
+            db.session.flush()
+            receive_stock(product.id, 'factory', quantity)
         
-        # Add to factory inventory
-        inventory = Inventory(product_id=product.id, location='factory', quantity=quantity)
-        db.session.add(inventory)
-        db.session.commit()
+        run_transaction(create)
         
         flash(f'Product "{name}" added to factory inventory!', 'success')
         return redirect(url_for('factory'))
     
     return render_template('add_product.html')
 
-@app.route('/batch_delivery', methods=['GET', 'POST'])
+# Bulk catalogue import and export, streamed row by row as CSV or NDJSON
+PRODUCT_FIELDS = ('id', 'name', 'category', 'weight', 'price')
+INVENTORY_FIELDS = ('product_id', 'product', 'location', 'quantity')
+# Rejected rows described in an import summary; the rest are only counted
+MAX_IMPORT_ERRORS = 20
+
+def parse_product_row(row):
+    """Column values for a product import row; raises ValueError"""
+    name = str(row.get('name') or '').strip()
+    category = str(row.get('category') or '').strip()
+    if not name or not category:
+        raise ValueError('name and category are required')
+    try:
+        weight, price = float(row.get('weight')), float(row.get('price'))
+    except (TypeError, ValueError):
+        raise ValueError('weight and price must be numbers')
+    if not (weight >= 0 and price >= 0):
+        raise ValueError('weight and price must not be negative')
+    return {'name': name, 'category': category, 'weight': weight, 'price': price}
+
+def parse_inventory_row(row):
+    """Product (id or name), location and quantity for a stock import row; raises ValueError"""
+    location = str(row.get('location') or '').strip()
+    product = str(row.get('product') or '').strip()
+    try:
+        product_id = int(row['product_id']) if row.get('product_id') not in (None, '') else None
+        quantity = int(row.get('quantity'))
+    except (TypeError, ValueError):
+        raise ValueError('product_id and quantity must be integers')
+    if not location:
+        raise ValueError('location is required')
+    if product_id is None and not product:
+        raise ValueError('product_id or product is required')
+    if quantity < 0:
+        raise ValueError('quantity must not be negative')
+    return {'product_id': product_id, 'product': product, 'location': location, 'quantity': quantity}
+
+def _reject(summary, line, error):
+    summary['rejected'] += 1
+    if len(summary['errors']) < MAX_IMPORT_ERRORS:
+        summary['errors'].append({'line': line, 'error': error})
+
+def _parsed_rows(rows, parse, summary):
+    # (line, values) for good rows; bad ones only go into the summary
+    for line, row in rows:
+        if row is None:
+            _reject(summary, line, 'row must be a JSON object')
+            continue
+        try:
+            yield line, parse(row)
+        except ValueError as e:
+            _reject(summary, line, str(e))
+
+def import_products(rows, chunk_size):
+    """Upsert products by name from (line, row) pairs
+
+    Each chunk costs one lookup, one executemany UPDATE and one executemany
+    INSERT; a name repeated in the input keeps its last row. Runs in the
+    caller's transaction, so commit afterwards.
+    """
+    progress = Progress()
+    summary = {'inserted': 0, 'updated': 0, 'rejected': 0, 'errors': []}
+    table = Product.__table__
+    update = db.update(table).where(table.c.name == db.bindparam('key'))
+    for chunk in chunks(_parsed_rows(progress.count(rows), parse_product_row, summary), chunk_size):
+        latest = {values['name']: values for _, values in chunk}
+        existing = set(db.session.scalars(db.select(Product.name).where(Product.name.in_(latest))))
+        updates = [dict(values, key=name) for name, values in latest.items() if name in existing]
+        inserts = [values for name, values in latest.items() if name not in existing]
+        if updates:
+            db.session.execute(update, updates)
+        if inserts:
+            db.session.execute(db.insert(table), inserts)
+        summary['updated'] += len(updates)
+        summary['inserted'] += len(inserts)
+    summary.update(progress.as_dict())
+    return summary
+
+def refresh_inventory_rollup(locations):
+    """Recompute the inventory rollup rows of some locations"""
+    for chunk in chunks(sorted(locations), 500):
+        db.session.execute(db.delete(InventoryRollup).where(InventoryRollup.location.in_(chunk))
+                           .execution_options(synchronize_session=False))
+        db.session.execute(db.insert(InventoryRollup).from_select(
+            ['location', 'total_products', 'total_quantity'],
+            db.select(Inventory.location, db.func.count(Inventory.id), db.func.coalesce(db.func.sum(Inventory.quantity), 0))
+            .where(Inventory.location.in_(chunk)).group_by(Inventory.location)))
+
+def import_inventory(rows, chunk_size):
+    """Upsert stock levels by (product, location) from (line, row) pairs
+
+    Rows name their product by product_id or by product name, and their
+    quantity replaces the stored level. Rollups of the touched locations
+    are recomputed at the end. Runs in the caller's transaction.
+    """
+    progress = Progress()
+    summary = {'upserted': 0, 'rejected': 0, 'errors': []}
+    stmt = upsert(Inventory.__table__, ['product_id', 'location'], lambda proposed: {
+        'quantity': proposed.quantity, 'updated_at': proposed.updated_at})
+    locations = set()
+    for chunk in chunks(_parsed_rows(progress.count(rows), parse_inventory_row, summary), chunk_size):
+        ids = {values['product_id'] for _, values in chunk if values['product_id'] is not None}
+        names = {values['product'] for _, values in chunk if values['product_id'] is None}
+        known = set(db.session.scalars(db.select(Product.id).where(Product.id.in_(ids)))) if ids else set()
+        by_name = dict(db.session.execute(db.select(Product.name, Product.id).where(Product.name.in_(names)))
+                       .all()) if names else {}
+        now = datetime.utcnow()
+        levels = []
+        for line, values in chunk:
+            if values['product_id'] is None:
+                product_id = by_name.get(values['product'])
+            else:
+                product_id = values['product_id'] if values['product_id'] in known else None
+            if product_id is None:
+                _reject(summary, line, f"unknown product {values['product_id'] or values['product']}")
+                continue
+            levels.append({'product_id': product_id, 'location': values['location'],
+                           'quantity': values['quantity'], 'created_at': now, 'updated_at': now})
+            locations.add(values['location'])
+        if levels:
+            db.session.execute(stmt, levels)
+        summary['upserted'] += len(levels)
+    refresh_inventory_rollup(locations)
+    summary.update(progress.as_dict())
+    return summary
+
+def export_products(batch, category=None):
+    """Product rows as dicts, fetched batch rows at a time"""
+    query = db.select(Product.id, Product.name, Product.category, Product.weight, Product.price)
+    if category:
+        query = query.where(Product.category == category)
+    for row in db.session.execute(query.order_by(Product.id).execution_options(yield_per=batch)):
+        yield row._asdict()
+
+def export_inventory(batch, location=None):
+    """Stock level rows as dicts with product names, fetched batch rows at a time"""
+    query = db.select(Inventory.product_id, Product.name.label('product'), Inventory.location, Inventory.quantity) \
+        .outerjoin(Product, Product.id == Inventory.product_id)
+    if location:
+        query = query.where(Inventory.location == location)
+    query = query.order_by(Inventory.location, Inventory.product_id).execution_options(yield_per=batch)
+    for row in db.session.execute(query):
+        yield row._asdict()
+
+# kind -> columns, importer, exporter and the column its export can be filtered on
+CATALOG = {
+    'products': {'fields': PRODUCT_FIELDS, 'import': import_products, 'export': export_products, 'filter': 'category'},
+    'inventory': {'fields': INVENTORY_FIELDS, 'import': import_inventory, 'export': export_inventory,
+                  'filter': 'location'},
+}
+
+def run_catalog_import(kind, rows):
+    """Import rows of a catalogue kind in one transaction and return the summary"""
+    summary = CATALOG[kind]['import'](rows, current_app.config['BULK_CHUNK_SIZE'])
+    db.session.commit()
+    bulk_rows.inc(summary['rows'], kind=kind, direction='import')
+    bulk_duration.observe(summary['seconds'], kind=kind, direction='import')
+    return summary
+
+def export_pieces(kind, rows, fields, fmt, progress=None):
+    """Yield text pieces of rows; their count and time go to the metrics at the end
+
+    progress, if given, is updated as rows are written.
+    """
+    progress = progress or Progress()
+    yield from write_rows(progress.count(rows), fields, fmt)
+    bulk_rows.inc(progress.rows, kind=kind, direction='export')
+    bulk_duration.observe(progress.as_dict()['seconds'], kind=kind, direction='export')
+
+def export_catalog(kind, fmt, value=None, progress=None):
+    """Text pieces of a catalogue export; value filters on the kind's filter column"""
+    entry = CATALOG[kind]
+    rows = entry['export'](current_app.config['BULK_CHUNK_SIZE'], value)
+    return export_pieces(kind, rows, entry['fields'], fmt, progress)
+
+def export_response(pieces, fmt, filename):
+    """Streamed attachment of export pieces, gzipped for clients that accept it
+
+    The generator keeps the request context, so the query is read batch by
+    batch while the response is sent.
+    """
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    body = stream_with_context(gzip_pieces(pieces) if use_gzip else pieces)
+    response = current_app.response_class(body, mimetype=CONTENT_TYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+@views.route('/api/<any(products, inventory):kind>/import', methods=['POST'])
+def catalog_import_api(kind):
+    """Upsert products or stock levels from a CSV or NDJSON body, read as it streams in
+
+    The format comes from ?format= or the Content-Type (text/csv or
+    application/x-ndjson).
+    """
+    fmt = request.args.get('format') or guess_format(request.content_type)
+    if fmt not in FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    try:
+        summary = run_catalog_import(kind, read_rows(stream, fmt))
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        return jsonify({'error': f'unreadable {fmt} body: {e}'}), 400
+    return jsonify(summary)
+
+@views.route('/api/<any(products, inventory):kind>/export')
+def catalog_export_api(kind):
+    """Stream every product or stock level as CSV (default) or NDJSON
+
+    ?category= (products) or ?location= (inventory) narrows the export.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    pieces = export_catalog(kind, fmt, request.args.get(CATALOG[kind]['filter']))
+    return export_response(pieces, fmt, f'{kind}.{fmt}')
+
+@views.cli.command('import-catalog')
+@click.argument('kind', type=click.Choice(sorted(CATALOG)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+def import_catalog_command(kind, path, fmt):
+    """Upsert products or stock levels from a .csv or .ndjson file"""
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        summary = run_catalog_import(kind, read_rows(f, fmt or guess_format(path)))
+    click.echo(json.dumps(summary))
+
+@views.cli.command('export-catalog')
+@click.argument('kind', type=click.Choice(sorted(CATALOG)))
+@click.option('--output', '-o', type=click.Path(dir_okay=False),
+              help='File to write, gzipped if it ends in .gz (default: stdout).')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension, else csv.')
+@click.option('--only', help='Only this category (products) or location (inventory).')
+def export_catalog_command(kind, output, fmt, only):
+    """Write every product or stock level as CSV or NDJSON"""
+    progress = Progress()
+    write_export(export_catalog(kind, fmt or guess_format(output), only, progress), output)
+    click.echo(json.dumps(progress.as_dict()), err=True)
+
+def write_export(pieces, output=None):
+    """Write export pieces to a file (gzipped if it ends in .gz) or to stdout"""
+    if output and output.endswith('.gz'):
+        with click.open_file(output, 'wb', atomic=True) as f:
+            for data in gzip_pieces(pieces):
+                f.write(data)
+        return
+    with click.open_file(output or '-', 'w', encoding='utf-8', atomic=bool(output)) as f:
+        for piece in pieces:
+            f.write(piece)
+
+# Order history export, streamed in created_at order
+ORDER_TYPES = ('customer_order', 'delivery', 'shipment')
+ORDER_EXPORT_FIELDS = ('id', 'type', 'customer_name', 'customer_email', 'customer_address', 'product_id',
+                       'product_name', 'warehouse_id', 'warehouse_name', 'quantity', 'status', 'created_at')
+
+def export_orders(batch, types=None, statuses=None, warehouse_id=None, since=None, until=None):
+    """Order rows as dicts, oldest first, fetched batch rows at a time
+
+    types and statuses are lists of accepted values; since is inclusive
+    and until exclusive. Only plain column tuples are loaded, so no ORM
+    objects pile up in the session.
+    """
+    table = Order.__table__
+    query = db.select(*(table.c[field] for field in ORDER_EXPORT_FIELDS))
+    if types:
+        query = query.where(table.c.type.in_(types))
+    if statuses:
+        query = query.where(table.c.status.in_(statuses))
+    if warehouse_id is not None:
+        query = query.where(table.c.warehouse_id == warehouse_id)
+    if since is not None:
+        query = query.where(table.c.created_at >= since)
+    if until is not None:
+        query = query.where(table.c.created_at < until)
+    query = query.order_by(table.c.created_at, table.c.id).execution_options(yield_per=batch)
+    for row in db.session.execute(query):
+        order = row._asdict()
+        if order['created_at'] is not None:
+            order['created_at'] = order['created_at'].isoformat()
+        yield order
+
+def parse_order_filters(args):
+    """export_orders() filters from query parameters; raises ValueError
+
+    type and status take comma-separated lists; since and until are ISO
+    dates or datetimes.
+    """
+    def values(name):
+        return [value.strip() for value in (args.get(name) or '').split(',') if value.strip()]
+
+    def moment(name):
+        return datetime.fromisoformat(args[name]) if args.get(name) else None
+
+    types = values('type')
+    unknown = set(types) - set(ORDER_TYPES)
+    if unknown:
+        raise ValueError(f"unknown order type {', '.join(sorted(unknown))}")
+    try:
+        warehouse_id = int(args['warehouse_id']) if args.get('warehouse_id') else None
+    except ValueError:
+        raise ValueError('warehouse_id must be an integer')
+    try:
+        since, until = moment('since'), moment('until')
+    except ValueError:
+        raise ValueError('since and until must be ISO dates, e.g. 2024-01-31 or 2024-01-31T12:00')
+    return {'types': types, 'statuses': values('status'), 'warehouse_id': warehouse_id,
+            'since': since, 'until': until}
+
+@views.route('/api/orders/export')
+def orders_export_api():
+    """Stream order history as CSV (default) or NDJSON
+
+    Filters: type, status (comma-separated), warehouse_id, since and until.
+    Sent gzipped to clients that accept it. Rows are read in yield_per
+    batches while the response streams; with SQLite in WAL mode the open
+    read does not block writers.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    try:
+        filters = parse_order_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    rows = export_orders(current_app.config['BULK_CHUNK_SIZE'], **filters)
+    return export_response(export_pieces('orders', rows, ORDER_EXPORT_FIELDS, fmt), fmt, f'orders.{fmt}')
+
+@views.cli.command('export-orders')
+@click.option('--output', '-o', type=click.Path(dir_okay=False),
+              help='File to write, gzipped if it ends in .gz (default: stdout).')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension, else csv.')
+@click.option('--type', 'types', multiple=True, type=click.Choice(ORDER_TYPES), help='Order type (repeatable).')
+@click.option('--status', 'statuses', multiple=True, help='Order status (repeatable).')
+@click.option('--warehouse-id', type=int)
+@click.option('--since', type=click.DateTime(), help='Created at or after this date/time.')
+@click.option('--until', type=click.DateTime(), help='Created before this date/time.')
+def export_orders_command(output, fmt, types, statuses, warehouse_id, since, until):
+    """Write order history as CSV or NDJSON, oldest first"""
+    progress = Progress()
+    rows = export_orders(current_app.config['BULK_CHUNK_SIZE'], list(types), list(statuses), warehouse_id, since, until)
+    write_export(export_pieces('orders', rows, ORDER_EXPORT_FIELDS, fmt or guess_format(output), progress), output)
+    click.echo(json.dumps(progress.as_dict()), err=True)
+
+def pending_deliveries(warehouse_id):
+    """Pending or processing delivery orders for a warehouse"""
+    return Order.query.filter(Order.type=='delivery', Order.warehouse_id==warehouse_id,
+                              Order.status.in_(['pending', 'processing'])).order_by(Order.id).all()
+
+def delivery_nodes(graph, orders):
+    """{customer address: road node} for orders, keeping unmatched addresses as they are
+
+    Unmatched addresses are not graph nodes, so the planners report them as
+    skipped or unassigned.
+    """
+    nodes = get_location_index(graph).resolve_many((o.customer_address for o in orders),
+                                                   current_app.config['SNAP_RADIUS_KM'])
+    return {address: node or address for address, node in nodes.items()}
+
+def compute_batch_plan(warehouse, orders, vehicles=None, capacity=None):
+    """Plan deliveries for one warehouse: a fleet plan when vehicles is set, else one tour
+
+    Deliveries left out of the plan are logged and listed in its 'warnings'.
+    """
+    # Shared road graph (built once per map file version)
+    graph = get_graph()
+    nodes = delivery_nodes(graph, orders)
+    cache = services().route_cache
+    if vehicles:
+        # Capacitated multi-vehicle routes, load = product weight x quantity
+        weights = {p.id: p.weight for p in Product.query.filter(Product.id.in_({o.product_id for o in orders}))}
+        deliveries = [{'id': o.id, 'address': nodes[o.customer_address],
+                       'weight': weights.get(o.product_id, 0) * o.quantity}
+                      for o in orders]
+        with routing_duration.time(operation='plan_fleet'):
+            route_result = plan_fleet(graph, warehouse.name, deliveries, vehicles, capacity,
+                                      time_budget=current_app.config['ROUTE_PLAN_TIME_BUDGET'], cache=cache,
+                                      router=active_router())
+        warnings = [f"delivery {item['id']} not planned ({item['reason']})" for item in route_result['unassigned']]
+    else:
+        # Distance-matrix tour with 2-opt / Or-opt improvement
+        with routing_duration.time(operation='plan_route'):
+            route_result = plan_route(graph, warehouse.name, [nodes[o.customer_address] for o in orders],
+                                      time_budget=current_app.config['ROUTE_PLAN_TIME_BUDGET'], cache=cache,
+                                      router=active_router())
+        warnings = [f"address '{addr}' not reachable on the map, skipped" for addr in route_result['skipped']]
+    for warning in warnings:
+        current_app.logger.warning('Plan for %s: %s', warehouse.name, warning)
+    route_result['warnings'] = warnings
+    return route_result
+
+def run_plan_job(job, app, warehouse_id, order_ids, vehicles, capacity):
+    """Worker: plan in its own app context and persist the result"""
+    with app.app_context():
+        warehouse = Warehouse.query.get(warehouse_id)
+        orders = Order.query.filter(Order.id.in_(order_ids)).order_by(Order.id).all()
+        plan = compute_batch_plan(warehouse, orders, vehicles, capacity)
+        row = Route(type='batch_plan', start_point=warehouse.name, end_point=job.id, route_data=json.dumps({
+            'version': job.key[0],
+            'warehouse_id': warehouse_id,
+            'order_ids': list(order_ids),
+            'vehicles': vehicles,
+            'capacity': capacity,
+            'distance': plan['total_distance'],
+            'plan': plan,
+        }))
+        db.session.add(row)
+        # Also persists the legs the planner added to the route cache
+        db.session.commit()
+        return {'route_id': row.id, 'plan': plan, 'warnings': plan['warnings']}
+
+def submit_plan_job(warehouse, orders, vehicles=None, capacity=None):
+    """Queue a plan for these orders; identical in-flight requests share one job"""
+    order_ids = tuple(o.id for o in orders)
+    key = (get_graph().version, warehouse.id, order_ids, vehicles, capacity)
+    return services().plan_jobs.submit(key, run_plan_job, current_app._get_current_object(),
+                                       warehouse.id, order_ids, vehicles, capacity)
+
+def plan_job_status(job_id):
+    """Status dict for a job (with its plan once done), or None if unknown"""
+    job = services().plan_jobs.get(job_id)
+    if job is not None:
+        status = job.as_dict()
+        if job.status == DONE:
+            status.update(job.result)
+        return status
+    # Finished before a restart, or dropped from the in-memory list
+    row = Route.query.filter(Route.type.in_(['batch_plan', 'network_plan']), Route.end_point==job_id).first()
+    if row is None:
+        return None
+    plan = row.summary.get('plan')
+    return {'id': job_id, 'status': DONE, 'route_id': row.id, 'plan': plan, 'warnings': (plan or {}).get('warnings', [])}
+
+def network_plan_tasks(vehicles=None, capacity=None):
+    """One planning task per warehouse with pending deliveries"""
+    warehouses = {w.id: w for w in Warehouse.query.all()}
+    orders = Order.query.filter(Order.type=='delivery', Order.warehouse_id.in_(warehouses),
+                                Order.status.in_(['pending', 'processing'])).order_by(Order.id).all()
+    weights = {p.id: p.weight for p in Product.query.filter(Product.id.in_({o.product_id for o in orders}))}
+    nodes = delivery_nodes(get_graph(), orders)
+    tasks = {}
+    for o in orders:
+        warehouse = warehouses[o.warehouse_id]
+        task = tasks.setdefault(warehouse.id, {
+            'warehouse_id': warehouse.id,
+            'name': warehouse.name,
+            'deliveries': [],
+            'vehicles': vehicles,
+            'capacity': capacity,
+            'time_budget': current_app.config['ROUTE_PLAN_TIME_BUDGET'],
+        })
+        task['deliveries'].append({'id': o.id, 'address': nodes[o.customer_address],
+                                   'weight': weights.get(o.product_id, 0) * o.quantity})
+    return list(tasks.values())
+
+def run_network_plan_job(job, app, vehicles=None, capacity=None, workers=None):
+    """Plan every warehouse across worker processes and persist the network plan"""
+    with app.app_context():
+        tasks = network_plan_tasks(vehicles, capacity)
+        with routing_duration.time(operation='plan_network'):
+            network = plan_network(get_graph(), tasks, workers or app.config['PLAN_ALL_WORKERS'])
+        row = Route(type='network_plan', start_point='all warehouses', end_point=job.id, route_data=json.dumps({
+            'version': network['version'],
+            'vehicles': vehicles,
+            'capacity': capacity,
+            'distance': network['total_distance'],
+            'plan': network,
+        }))
+        db.session.add(row)
+        db.session.commit()
+        return {'route_id': row.id, 'plan': network}
+
+def submit_network_plan_job(vehicles=None, capacity=None):
+    """Queue a plan for all warehouses; deduplicated on the whole pending order set"""
+    order_ids = tuple(o.id for o in Order.query.with_entities(Order.id).filter(
+        Order.type=='delivery', Order.status.in_(['pending', 'processing'])).order_by(Order.id))
+    key = (get_graph().version, 'all', order_ids, vehicles, capacity)
+    return services().plan_jobs.submit(key, run_network_plan_job, current_app._get_current_object(), vehicles, capacity)
+
+@views.route('/batch_delivery', methods=['GET', 'POST'])
 def batch_delivery():
-    """Batch delivery planner using greedy nearest neighbor algorithm"""
+    """Batch delivery planner; plans run as background jobs"""
     warehouses = Warehouse.query.all()
     selected_warehouse_id = request.args.get('warehouse_id') or request.form.get('warehouse_id')
+    job_id = request.args.get('job_id')
     orders = []
+    job = None
     route_result = None
-    nodes = []
-    edges = []
     route_path_edges = []
     
     if selected_warehouse_id:
         warehouse = Warehouse.query.get(selected_warehouse_id)
         # Get all pending or processing delivery orders for this warehouse
-        orders = Order.query.filter(Order.type=='delivery', Order.warehouse_id==warehouse.id, Order.status.in_(['pending', 'processing'])).all()
-        nodes = []
-        edges = []
-        route_path_edges = []
+        orders = pending_deliveries(warehouse.id)
         if request.method == 'POST' and orders:
-            # Load map data
-            with open('real_map_with_distances.json', 'r') as f:
-                map_data = json.load(f)
-            nodes = map_data['nodes']
-            edges = map_data['edges']
-            # Build adjacency list
-            adj = {node['name']: [] for node in map_data['nodes']}
-            for edge in edges:
-                from_name = next(n['name'] for n in map_data['nodes'] if n['id'] == edge['from'])
-                to_name = next(n['name'] for n in map_data['nodes'] if n['id'] == edge['to'])
-                adj[from_name].append((to_name, edge['distance']))
-                adj[to_name].append((from_name, edge['distance']))
-            def dijkstra(source, target):
-                import heapq
-                dist = {n: float('inf') for n in adj}
-                prev = {n: None for n in adj}
-                dist[source] = 0
-                heap = [(0, source)]
-                while heap:
-                    d, u = heapq.heappop(heap)
-                    if u == target:
-                        break
-                    for v, w in adj[u]:
-                        if w is None:
-                            continue  # Skip edges with no distance
-                        if dist[v] > d + w:
-                            dist[v] = d + w
-                            prev[v] = u
-                            heapq.heappush(heap, (dist[v], v))
-                # Reconstruct path
-                path = []
-                u = target
-                while u:
-                    path.append(u)
-                    u = prev[u]
-                path.reverse()
-                return dist[target], path
-            # Greedy nearest neighbor
-            current = warehouse.name
-            remaining = [o.customer_address for o in orders]
-            delivery_order = []
-            total_distance = 0
-            route_path_edges = []
-            while remaining:
-                # Find closest
-                best = None
-                best_dist = float('inf')
-                best_path = []
-                for addr in remaining:
-                    if current not in adj:
-                        print(f"Warning: current node '{current}' not in map nodes! Skipping.")
-                        continue
-                    if addr not in adj:
-                        print(f"Warning: address '{addr}' not in map nodes! Skipping.")
-                        continue
-                    d, path = dijkstra(current, addr)
-                    if d < best_dist:
-                        best = addr
-                        best_dist = d
-                        best_path = path
-                if best is None:
-                    print(f"Error: No reachable address from '{current}'. Remaining: {remaining}")
-                    break
-                delivery_order.append({'from': current, 'to': best, 'distance': best_dist, 'path': best_path})
-                # Add path edges for map visualization
-                for i in range(len(best_path)-1):
-                    route_path_edges.append((best_path[i], best_path[i+1]))
-                total_distance += best_dist
-                current = best
-                if best in remaining:
-                    remaining.remove(best)
-                else:
-                    print(f"Warning: {best} not in remaining list: {remaining}")
-            route_result = {'order': delivery_order, 'total_distance': total_distance}
-        elif request.method == 'POST':
-            # If no orders, still load map data for map display
-            with open('real_map_with_distances.json', 'r') as f:
-                map_data = json.load(f)
-            nodes = map_data['nodes']
-            edges = map_data['edges']
+            vehicles = request.form.get('vehicles', type=int)
+            capacity = request.form.get('capacity', type=float)
+            job, created = submit_plan_job(warehouse, orders, vehicles, capacity)
+            if not created:
+                flash('The same plan is already being computed; showing that job.', 'info')
+            return redirect(url_for('batch_delivery', warehouse_id=warehouse.id, job_id=job.id))
     
-    return render_template('batch_delivery.html', warehouses=warehouses, orders=orders, selected_warehouse_id=selected_warehouse_id, route_result=route_result, nodes=nodes, edges=edges, route_path_edges=route_path_edges)
+    if job_id:
+        job = plan_job_status(job_id)
+        if job is None:
+            flash('Unknown planning job.', 'error')
+        elif job['status'] == DONE:
+            route_result = job['plan']
+            route_path_edges = route_result['route_path_edges']
+        elif job['status'] == FAILED:
+            flash(f"Planning failed: {job['error']}", 'error')
+    
+    return render_template('batch_delivery.html', warehouses=warehouses, orders=orders, selected_warehouse_id=selected_warehouse_id, job=job, route_result=route_result, route_path_edges=route_path_edges)
+
+@views.route('/api/plan_jobs', methods=['POST'])
+def plan_jobs_api():
+    """Queue a batch plan (warehouse_id 'all' plans every warehouse); responds 202 with the job id"""
+    data = request.get_json(silent=True) or request.form
+    try:
+        vehicles = int(data['vehicles']) if data.get('vehicles') else None
+        capacity = float(data['capacity']) if data.get('capacity') not in (None, '') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'vehicles and capacity must be numbers'}), 400
+    if str(data.get('warehouse_id')) == 'all':
+        # Network-wide plan over every warehouse, fanned out across processes
+        job, created = submit_network_plan_job(vehicles, capacity)
+    else:
+        warehouse = Warehouse.query.get(data.get('warehouse_id'))
+        if warehouse is None:
+            return jsonify({'error': 'unknown warehouse'}), 404
+        orders = pending_deliveries(warehouse.id)
+        if not orders:
+            return jsonify({'error': 'no pending deliveries for this warehouse'}), 400
+        job, created = submit_plan_job(warehouse, orders, vehicles, capacity)
+    status_url = url_for('plan_job_api', job_id=job.id)
+    response = jsonify(dict(job.as_dict(), deduplicated=not created, status_url=status_url))
+    response.headers['Location'] = status_url
+    return response, 202
+
+@views.route('/api/plan_jobs/<job_id>')
+def plan_job_api(job_id):
+    """Status of a planning job, with the plan once it is done"""
+    status = plan_job_status(job_id)
+    if status is None:
+        return jsonify({'error': 'unknown job'}), 404
+    return jsonify(status)
 
-@app.route('/complete_delivery/<int:order_id>', methods=['POST'])
+@views.cli.command('plan-all')
+@click.option('--vehicles', type=int, help='Plan capacitated fleets of this many vehicles per warehouse.')
+@click.option('--capacity', type=float, help='Vehicle capacity in kg (with --vehicles).')
+@click.option('--workers', type=int, help='Planner processes (default: every core).')
+@click.option('--output', type=click.Path(dir_okay=False), help='Also write the network plan as JSON.')
+def plan_all_command(vehicles, capacity, workers, output):
+    """Plan pending deliveries for every warehouse in parallel"""
+    # Runs in the foreground; the Job only supplies the id the plan is stored under
+    network = run_network_plan_job(Job('plan-all'), current_app._get_current_object(), vehicles, capacity, workers)['plan']
+    for result in network['warehouses']:
+        click.echo(f"{result['name']}: {result['plan']['total_distance']:.2f} km in {result['seconds']:.2f}s")
+    click.echo(f"Total {network['total_distance']:.2f} km, {network['planned_orders']} orders planned, "
+               f"{len(network['unplanned'])} unplanned; {network['wall_seconds']:.2f}s wall, "
+               f"{network['cpu_seconds']:.2f}s planning on {network['workers']} worker(s)")
+    if output:
+        with open(output, 'w') as f:
+            json.dump(network, f, indent=2)
+
+@views.cli.command('build-ch')
+def build_ch_command():
+    """Build (or load) the contraction hierarchy for the current map"""
+    graph = get_graph()
+    started = time.perf_counter()
+    hierarchy = get_hierarchy(graph, wait=True)
+    click.echo(f'{len(hierarchy)} nodes, {hierarchy.shortcuts} shortcuts, ready in {time.perf_counter() - started:.1f}s')
+
+@views.cli.command('warm')
+def warm_command():
+    """Load the map, snapping index and user index and report startup timings"""
+    timings = warm(current_app._get_current_object())
+    click.echo(', '.join(f'{phase} {seconds * 1000:.1f} ms' for phase, seconds in timings.items()))
+
+@views.route('/complete_delivery/<int:order_id>', methods=['POST'])
 def complete_delivery(order_id):
     """Mark a delivery order as completed"""
     order = Order.query.get(order_id)
     if order and order.type == 'delivery' and order.status in ['pending', 'processing', 'in_transit']:
+        adjust_delivery_status(order.status, 'completed')
         order.status = 'completed'
         db.session.commit()
         flash('Delivery marked as completed!', 'success')
@@ -617,21 +1853,71 @@ def complete_delivery(order_id):
         flash('Unable to complete delivery.', 'error')
     return redirect(url_for('warehouses'))
 
-@app.route('/map/interactive')
+@views.route('/map/interactive')
 def map_leaflet_view():
-    """Interactive map page using Leaflet.js and OpenStreetMap"""
-    with open('real_map_with_distances.json', 'r') as f:
-        map_data = json.load(f)
-    valid_nodes = [
-        n for n in map_data['nodes']
-        if isinstance(n, dict)
-        and isinstance(n.get('lat'), (float, int))
-        and isinstance(n.get('lon'), (float, int))
-    ]
-    edges = map_data['edges']
-    return render_template('map_leaflet.html', nodes=valid_nodes, edges=edges)
+    """Interactive map page using Leaflet.js and OpenStreetMap; data comes from /api/map"""
+    return render_template('map_leaflet.html')
+
+@views.route('/metrics')
+def metrics_view():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@views.route('/api/map')
+def map_api():
+    """Map nodes and edges as pre-serialized JSON with ETag and gzip support"""
+    bbox = parse_bbox(request.args.get('bbox'))
+    zoom = request.args.get('zoom', type=int)
+    payload = get_map_payload(get_graph(), bbox, zoom)
+    
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    etag = payload.etag + ('-gz' if use_gzip else '')
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(payload.gzipped if use_gzip else payload.body, mimetype='application/json')
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-@app.route('/complete_customer_order/<int:order_id>', methods=['POST'])
+@views.route('/api/snap', methods=['GET', 'POST'])
+def snap_api():
+    """Snap coordinates or addresses to road nodes
+
+    GET takes lat/lon or address query parameters; POST takes JSON with
+    "points" ([[lat, lon], ...]) and/or "addresses". max_km overrides the
+    configured snap radius, up to SNAP_RADIUS_MAX_KM.
+    """
+    graph = get_graph()
+    locations = get_location_index(graph)
+    data = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    if not isinstance(data, dict) and request.method == 'POST':
+        return jsonify({'error': 'expected a JSON object'}), 400
+    try:
+        max_km = float(data.get('max_km', current_app.config['SNAP_RADIUS_KM']))
+        if request.method == 'POST':
+            points = [(float(lat), float(lon)) for lat, lon in data.get('points', [])]
+            addresses = [str(address) for address in data.get('addresses', [])]
+        elif data.get('lat') is not None and data.get('lon') is not None:
+            points, addresses = [(float(data['lat']), float(data['lon']))], []
+        else:
+            points, addresses = [], [data.get('address', '')]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'points must be [lat, lon] pairs and max_km a number'}), 400
+    if not all(math.isfinite(value) for value in [max_km, *(c for point in points for c in point)]) or max_km < 0:
+        return jsonify({'error': 'max_km and coordinates must be finite, and max_km not negative'}), 400
+    # An unbounded radius would scan the whole grid for every point
+    max_km = min(max_km, current_app.config['SNAP_RADIUS_MAX_KM'])
+    results = [{'lat': lat, 'lon': lon, 'node': node, 'km': km}
+               for (lat, lon), (node, km) in zip(points, locations.snap_many(points, max_km))]
+    results += [{'address': address, 'node': node, 'km': km}
+                for address, (node, km) in ((address, locations.resolve(address, max_km)) for address in addresses)]
+    return jsonify({'version': graph.version, 'max_km': max_km, 'results': results})
+
+@views.route('/complete_customer_order/<int:order_id>', methods=['POST'])
 def complete_customer_order(order_id):
     """Mark a customer order as completed (shipped)"""
     order = Order.query.get(order_id)
@@ -643,7 +1929,67 @@ def complete_customer_order(order_id):
         flash('Unable to complete order.', 'error')
     return redirect(url_for('orders'))
 
+def create_app(config=None):
+    """Build an app from default_config() plus config
+
+    Only configuration happens here: the map, snapping index, route cache,
+    user index and routing engines load on first use, or up front in warm().
+    """
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.config.update(default_config())
+    app.config.update(config or {})
+    backend = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    if backend not in UPSERT_BACKENDS:
+        raise ValueError(f'Unsupported database {backend}; use one of {", ".join(UPSERT_BACKENDS)}')
+    if backend == 'sqlite':
+        # sqlite3's own lock wait; other drivers reject an unknown timeout argument
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS',
+                              {'connect_args': {'timeout': app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}})
+    db.init_app(app)
+    login_manager.init_app(app)
+    views.init_app(app)
+    configure_slow_log(app.config['SLOW_REQUEST_LOG'])
+    app.extensions['logistics'] = Services(app)
+    app.extensions['logistics'].startup['create_app'] = time.perf_counter() - started
+    return app
+
+def warm(app):
+    """Load everything requests share, e.g. once in a pre-fork server's master
+
+    Forked workers then inherit the road graph, snapping index, full map
+    payload, user index and (with ROUTING_BACKEND=ch) the contraction
+    hierarchy instead of each building their own. Engine processes, job
+    threads and database connections are not started, since they must not
+    be shared across a fork. Returns the startup timings in seconds.
+    """
+    started = time.perf_counter()
+    with app.app_context():
+        s = services()
+        graph = get_graph()
+        get_location_index(graph).warm()
+        get_map_payload(graph)
+        len(s.user_store)
+        if app.config['ROUTING_BACKEND'] == 'ch':
+            get_hierarchy(graph, wait=True)
+    s.startup['warm'] = time.perf_counter() - started
+    return dict(s.startup)
+
+_default_app = None
+_default_app_lock = threading.Lock()
+
+def __getattr__(name):
+    # `from app import app` and `flask --app app` get a default app, built on first access
+    global _default_app
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _default_app_lock:
+        if _default_app is None:
+            _default_app = create_app()
+    return _default_app
+
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
-    app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000) 
\ No newline at end of file
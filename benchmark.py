@@ -0,0 +1,487 @@
+"""
+Performance benchmarks for the logistics app
+Generates synthetic road graphs (grid and random-geometric) with matching
+warehouses, inventory, users and order history, then times the hot paths:
+order allocation, batch delivery planning, dashboard pages and load_user().
+
+    python benchmark.py run --sizes 1000,10000 --output bench.json
+    python benchmark.py compare bench.json baseline.json
+    python benchmark.py ch --sizes 1000,10000
+
+Each run works in a scratch directory with its own map file, users.csv and
+SQLite database, so it never touches the real data.
+"""
+
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import click
+
+from road_graph import MAP_FILE, haversine_km
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# Synthetic networks are laid out around Dehradun
+ORIGIN_LAT, ORIGIN_LON = 30.25, 77.95
+NODE_SPACING_DEG = 0.003  # about 300 m between neighbouring nodes
+GEOMETRIC_DEGREE = 6  # average degree of random-geometric graphs
+PRODUCTS = 20
+STATUSES = ['pending', 'processing', 'shipped', 'delivered']
+
+
+# Synthetic graphs
+
+def _node(i, lat, lon):
+    return {'id': f'n{i}', 'name': f'Node {i}', 'lat': round(lat, 6), 'lon': round(lon, 6)}
+
+
+def _edge(a, b, rnd):
+    # Roads wind a little, so edges are longer than the straight line
+    straight = haversine_km(a['lat'], a['lon'], b['lat'], b['lon'])
+    return {'from': a['id'], 'to': b['id'], 'distance': round(straight * rnd.uniform(1.0, 1.3), 4)}
+
+
+def grid_graph(size, seed=0):
+    """Jittered square grid with about size nodes and 5% of streets missing"""
+    rnd = random.Random(seed)
+    side = max(2, math.isqrt(size))
+    nodes = []
+    for r in range(side):
+        for c in range(side):
+            jitter = NODE_SPACING_DEG * 0.2
+            nodes.append(_node(len(nodes),
+                               ORIGIN_LAT + r * NODE_SPACING_DEG + rnd.uniform(-jitter, jitter),
+                               ORIGIN_LON + c * NODE_SPACING_DEG + rnd.uniform(-jitter, jitter)))
+    edges = []
+    for r in range(side):
+        for c in range(side):
+            i = r * side + c
+            if c + 1 < side and rnd.random() < 0.95:
+                edges.append(_edge(nodes[i], nodes[i + 1], rnd))
+            if r + 1 < side and rnd.random() < 0.95:
+                edges.append(_edge(nodes[i], nodes[i + side], rnd))
+    return {'nodes': nodes, 'edges': edges}
+
+
+def geometric_graph(size, seed=0):
+    """Random-geometric graph: uniform points joined when closer than a radius"""
+    rnd = random.Random(seed)
+    extent = math.sqrt(size) * NODE_SPACING_DEG
+    radius = extent * math.sqrt(GEOMETRIC_DEGREE / (math.pi * size))
+    nodes = [_node(i, ORIGIN_LAT + rnd.random() * extent, ORIGIN_LON + rnd.random() * extent)
+             for i in range(size)]
+
+    # Bucket points into radius-sized cells so only neighbouring cells are checked
+    cells = {}
+    for i, node in enumerate(nodes):
+        key = (int((node['lat'] - ORIGIN_LAT) / radius), int((node['lon'] - ORIGIN_LON) / radius))
+        cells.setdefault(key, []).append(i)
+    edges = []
+    limit = radius * radius
+    for (cy, cx), members in cells.items():
+        for dy, dx in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+            others = cells.get((cy + dy, cx + dx))
+            if not others:
+                continue
+            for i in members:
+                a = nodes[i]
+                for j in others:
+                    if (dy, dx) == (0, 0) and j <= i:
+                        continue
+                    b = nodes[j]
+                    if (a['lat'] - b['lat']) ** 2 + (a['lon'] - b['lon']) ** 2 <= limit:
+                        edges.append(_edge(a, b, rnd))
+    return {'nodes': nodes, 'edges': edges}
+
+
+GENERATORS = {'grid': grid_graph, 'geometric': geometric_graph}
+
+
+def largest_component(graph):
+    """Node names in the largest connected component of a RoadGraph"""
+    seen = bytearray(len(graph))
+    best = []
+    for root in range(len(graph)):
+        if seen[root]:
+            continue
+        seen[root] = 1
+        component = [root]
+        for u in component:
+            for k in range(graph.offsets[u], graph.offsets[u + 1]):
+                v = graph.targets[k]
+                if not seen[v]:
+                    seen[v] = 1
+                    component.append(v)
+        if len(component) > len(best):
+            best = component
+    return [graph.index_to_name[i] for i in best]
+
+
+# Timing
+
+def summarize(samples):
+    """count/mean/p50/p95/max in milliseconds for a list of durations in seconds"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 4),
+        'p50_ms': round(pct(0.50), 4),
+        'p95_ms': round(pct(0.95), 4),
+        'max_ms': round(ordered[-1] * 1000, 4),
+    }
+
+
+def timed(samples, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    samples.append(time.perf_counter() - start)
+    return result
+
+
+# Scenario
+
+class Workspace:
+    """Scratch directory with the app imported against it"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'bench.db')
+        os.chdir(directory)
+        sys.path.insert(0, REPO_DIR)
+        import app as app_module
+        self.module = app_module
+        self.app = app_module.create_app()
+        self.services = self.app.extensions['logistics']
+        self.db = app_module.db
+
+    def write_map(self, data):
+        with open(MAP_FILE, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+    def write_users(self, count):
+        with open(self.module.USERS_CSV, 'w') as f:
+            f.write('id,email,password\n')
+            for i in range(count):
+                f.write(f'{i},user{i}@gmail.com,secret{i}\n')
+
+    def seed(self, names, rnd, warehouses, history, deliveries):
+        """Fresh tables with warehouses on random nodes, stock and order history"""
+        m, db = self.module, self.db
+        db.drop_all()
+        db.create_all()
+        products = [m.Product(name=f'Product {i}', category='Bench', weight=rnd.uniform(0.2, 5.0),
+                              price=rnd.uniform(100, 50000)) for i in range(PRODUCTS)]
+        sites = [m.Warehouse(name=name, location=name, capacity=10000)
+                 for name in rnd.sample(names, min(warehouses, len(names)))]
+        db.session.add_all(products + sites)
+        db.session.flush()
+
+        db.session.execute(db.insert(m.Inventory), [
+            {'product_id': p.id, 'location': location, 'quantity': rnd.randint(50, 500)}
+            for location in ['factory'] + [w.name for w in sites] for p in products
+        ])
+
+        # Order history spread over the last 30 days, plus pending deliveries
+        # queued at every warehouse for the batch planner
+        now = datetime.utcnow()
+        rows = []
+        for i in range(history):
+            p, w = rnd.choice(products), rnd.choice(sites)
+            rows.append({
+                'type': rnd.choice(['customer_order', 'delivery', 'shipment']),
+                'customer_name': f'Customer {i}', 'customer_email': f'c{i}@gmail.com',
+                'customer_address': rnd.choice(names), 'product_id': p.id, 'product_name': p.name,
+                'warehouse_id': w.id, 'warehouse_name': w.name, 'quantity': rnd.randint(1, 5),
+                'status': rnd.choice(STATUSES), 'created_at': now - timedelta(seconds=rnd.randint(0, 30 * 86400)),
+            })
+        for w in sites:
+            for i in range(deliveries):
+                p = rnd.choice(products)
+                rows.append({
+                    'type': 'delivery', 'customer_name': f'Queued {i}', 'customer_email': f'q{i}@gmail.com',
+                    'customer_address': rnd.choice(names), 'product_id': p.id, 'product_name': p.name,
+                    'warehouse_id': w.id, 'warehouse_name': w.name, 'quantity': 1,
+                    'status': 'pending', 'created_at': now,
+                })
+        if rows:
+            db.session.execute(db.insert(m.Order), rows)
+        m.rebuild_rollups()
+        db.session.commit()
+        return [p.id for p in products], [w.id for w in sites]
+
+
+def plan_and_wait(client, services, form):
+    """Submit a batch plan through /api/plan_jobs and block until it finishes"""
+    job_id = client.post('/api/plan_jobs', json=form).get_json()['id']
+    job = services.plan_jobs.get(job_id)
+    while job is not None and not job.finished:
+        time.sleep(0.001)
+    return job
+
+
+def run_scenario(ws, kind, size, options):
+    """Build one synthetic world and time every hot path against it"""
+    rnd = random.Random(options['seed'])
+    m = ws.module
+    setup = {}
+
+    start = time.perf_counter()
+    data = GENERATORS[kind](size, options['seed'])
+    setup['generate_s'] = round(time.perf_counter() - start, 3)
+    ws.write_map(data)
+    del data
+
+    start = time.perf_counter()
+    graph = m.get_graph()
+    setup['graph_load_s'] = round(time.perf_counter() - start, 3)
+
+    # Warehouses and customers sit on the main road network, not on islands
+    names = largest_component(graph)
+    setup['component_nodes'] = len(names)
+
+    ws.write_users(options['users'])
+    # Snapping index, map payload and user index, as a pre-fork server would
+    start = time.perf_counter()
+    m.warm(ws.app)
+    setup['warm_s'] = round(time.perf_counter() - start, 3)
+
+    with ws.app.app_context():
+        start = time.perf_counter()
+        product_ids, warehouse_ids = ws.seed(names, rnd, options['warehouses'], options['history'],
+                                             options['deliveries'])
+        setup['seed_s'] = round(time.perf_counter() - start, 3)
+
+    # Every scenario starts from cold caches
+    ws.services.route_cache.memory.clear()
+    ws.services.native_router.close()
+    ws.app.config['ROUTE_PLAN_TIME_BUDGET'] = options['plan_budget']
+
+    metrics = {}
+    client = ws.app.test_client()
+    client.post('/login', data={'email': 'user0@gmail.com', 'password': 'secret0'})
+
+    # Per-order allocation: one POST /orders each, redirect not followed
+    samples = []
+    for i in range(options['orders']):
+        form = {
+            'customer_name': f'Bench {i}', 'customer_email': f'bench{i}@gmail.com',
+            'customer_address': rnd.choice(names), 'product_id': rnd.choice(product_ids), 'quantity': 1,
+        }
+        timed(samples, client.post, '/orders', data=form)
+    metrics['orders.allocate'] = summarize(samples)
+
+    # Batch planning, single vehicle and a three-vehicle fleet, from the
+    # POST until the background job has finished
+    for label, extra in (('batch.plan_route', {}), ('batch.plan_fleet', {'vehicles': 3})):
+        samples = []
+        for warehouse_id in warehouse_ids[:options['plans']]:
+            form = dict(extra, warehouse_id=warehouse_id)
+            timed(samples, plan_and_wait, client, ws.services, form)
+        metrics[label] = summarize(samples)
+
+    # Dashboard pages
+    for path in ('/reports', '/orders', '/warehouses', '/factory'):
+        samples = []
+        for _ in range(options['repeat']):
+            timed(samples, client.get, path)
+        metrics['dashboard.' + path.strip('/')] = summarize(samples)
+
+    # Session user lookups
+    samples = []
+    with ws.app.app_context():
+        for _ in range(options['lookups']):
+            timed(samples, m.load_user, str(rnd.randrange(options['users'])))
+    metrics['auth.load_user'] = summarize(samples)
+
+    return {
+        'graph': kind,
+        'size': size,
+        'nodes': len(graph),
+        'edges': len(graph.targets) // 2,
+        'setup': setup,
+        'metrics': metrics,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def scenario_key(scenario):
+    return f"{scenario['graph']}-{scenario['size']}"
+
+
+# Command line
+
+@click.group()
+def cli():
+    """Logistics performance benchmarks"""
+
+
+@cli.command()
+@click.option('--sizes', default='1000,10000', show_default=True, help='Comma-separated node counts.')
+@click.option('--graphs', default='grid,geometric', show_default=True, help='Comma-separated graph kinds.')
+@click.option('--warehouses', default=10, show_default=True)
+@click.option('--history', default=20000, show_default=True, help='Past orders seeded for the dashboards.')
+@click.option('--deliveries', default=30, show_default=True, help='Pending deliveries queued per warehouse.')
+@click.option('--orders', default=100, show_default=True, help='Orders placed through /orders.')
+@click.option('--plans', default=3, show_default=True, help='Warehouses to plan batches for.')
+@click.option('--plan-budget', default=0.5, show_default=True, help='Local search seconds per plan.')
+@click.option('--users', default=10000, show_default=True)
+@click.option('--lookups', default=20000, show_default=True, help='load_user() calls.')
+@click.option('--repeat', default=10, show_default=True, help='Requests per dashboard page.')
+@click.option('--seed', default=42, show_default=True)
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write results JSON here.')
+def run(sizes, graphs, output, **options):
+    """Generate synthetic worlds and time the hot paths"""
+    kinds = [k.strip() for k in graphs.split(',') if k.strip()]
+    for kind in kinds:
+        if kind not in GENERATORS:
+            raise click.BadParameter(f'unknown graph kind {kind!r}', param_hint='--graphs')
+    sizes = [int(s) for s in sizes.split(',') if s.strip()]
+    output = os.path.abspath(output) if output else None
+
+    results = {
+        'meta': {
+            'commit': _git_commit(),
+            'started_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'options': dict(options, sizes=sizes, graphs=kinds),
+        },
+        'scenarios': [],
+    }
+    with tempfile.TemporaryDirectory(prefix='logistics-bench-') as directory:
+        ws = Workspace(directory)
+        results['meta']['create_app_s'] = round(ws.services.startup['create_app'], 3)
+        try:
+            for kind in kinds:
+                for size in sizes:
+                    click.echo(f'{kind} {size} ...', err=True)
+                    scenario = run_scenario(ws, kind, size, options)
+                    results['scenarios'].append(scenario)
+                    for name, stats in scenario['metrics'].items():
+                        click.echo(f"  {name:<24} p50 {stats.get('p50_ms', 0):>10.3f} ms"
+                                   f"  p95 {stats.get('p95_ms', 0):>10.3f} ms", err=True)
+        finally:
+            ws.services.native_router.close()
+            os.chdir(REPO_DIR)
+
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+        click.echo(f'Results written to {output}', err=True)
+    else:
+        click.echo(text)
+
+
+@cli.command()
+@click.option('--sizes', default='1000,10000', show_default=True, help='Comma-separated node counts.')
+@click.option('--graphs', default='grid,geometric', show_default=True, help='Comma-separated graph kinds.')
+@click.option('--queries', default=200, show_default=True, help='Random point-to-point queries per graph.')
+@click.option('--seed', default=42, show_default=True)
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write results JSON here.')
+def ch(sizes, graphs, queries, seed, output):
+    """Time contraction hierarchy queries against plain Dijkstra"""
+    from contraction import build_hierarchy
+    from road_graph import RoadGraph
+    from routing import dijkstra
+
+    results = []
+    for kind in [k.strip() for k in graphs.split(',') if k.strip()]:
+        if kind not in GENERATORS:
+            raise click.BadParameter(f'unknown graph kind {kind!r}', param_hint='--graphs')
+        for size in [int(s) for s in sizes.split(',') if s.strip()]:
+            graph = RoadGraph(GENERATORS[kind](size, seed), f'{kind}-{size}')
+            started = time.perf_counter()
+            hierarchy = build_hierarchy(graph)
+            build_seconds = time.perf_counter() - started
+
+            rnd = random.Random(seed)
+            names = largest_component(graph)
+            plain, contracted = [], []
+            mismatches = 0
+            for _ in range(queries):
+                a, b = rnd.choice(names), rnd.choice(names)
+                expected = timed(plain, dijkstra, graph, a, b)
+                distance, _, _ = timed(contracted, hierarchy.query, graph.name_to_index[a], graph.name_to_index[b])
+                mismatches += abs(distance - expected.distance) > 1e-6
+            result = {
+                'graph': kind,
+                'size': len(graph),
+                'build_seconds': round(build_seconds, 3),
+                'shortcuts': hierarchy.shortcuts,
+                'mismatches': mismatches,
+                'metrics': {'dijkstra': summarize(plain), 'ch': summarize(contracted)},
+            }
+            results.append(result)
+            speedup = result['metrics']['dijkstra']['mean_ms'] / max(result['metrics']['ch']['mean_ms'], 1e-9)
+            click.echo(f"{kind} {len(graph)}: built in {build_seconds:.1f}s with {hierarchy.shortcuts} shortcuts; "
+                       f"dijkstra p50 {result['metrics']['dijkstra']['p50_ms']:.3f} ms, "
+                       f"ch p50 {result['metrics']['ch']['p50_ms']:.3f} ms ({speedup:.1f}x), "
+                       f"{mismatches} mismatches", err=True)
+
+    if output:
+        with open(output, 'w') as f:
+            f.write(json.dumps({'scenarios': results}, indent=2) + '\n')
+        click.echo(f'Results written to {output}', err=True)
+    if any(result['mismatches'] for result in results):
+        sys.exit(1)
+
+
+@cli.command()
+@click.argument('results', type=click.Path(exists=True, dir_okay=False))
+@click.argument('baseline', type=click.Path(exists=True, dir_okay=False))
+@click.option('--metric', default='p50_ms', show_default=True, type=click.Choice(['mean_ms', 'p50_ms', 'p95_ms']))
+@click.option('--threshold', default=0.10, show_default=True, help='Allowed slowdown as a fraction.')
+@click.option('--min-delta-ms', default=0.05, show_default=True, help='Ignore slowdowns smaller than this.')
+def compare(results, baseline, metric, threshold, min_delta_ms):
+    """Compare a results file to a baseline; exit 1 on regressions"""
+    with open(results) as f:
+        current = {scenario_key(s): s for s in json.load(f)['scenarios']}
+    with open(baseline) as f:
+        base = {scenario_key(s): s for s in json.load(f)['scenarios']}
+
+    regressions = 0
+    click.echo(f"{'scenario':<18} {'metric':<24} {'baseline':>11} {'current':>11} {'change':>8}")
+    for key, scenario in current.items():
+        if key not in base:
+            click.echo(f'{key:<18} (no baseline)')
+            continue
+        for name, stats in scenario['metrics'].items():
+            old = base[key]['metrics'].get(name, {}).get(metric)
+            new = stats.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            regressed = change > threshold and new - old > min_delta_ms
+            regressions += regressed
+            flag = '  REGRESSION' if regressed else ''
+            click.echo(f'{key:<18} {name:<24} {old:>11.3f} {new:>11.3f} {change:>+8.1%}{flag}')
+
+    if regressions:
+        click.echo(f'{regressions} regression(s) over {threshold:.0%}', err=True)
+        sys.exit(1)
+    click.echo('No regressions', err=True)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,111 @@
+"""
+Streaming CSV and NDJSON rows for bulk imports and exports
+Rows are read and written one at a time (exports are buffered into
+~64 KB pieces), so memory stays flat however large the file is.
+"""
+
+import csv
+import io
+import json
+import time
+import zlib
+
+FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+# Text gathered before an export yields a piece
+WRITE_BUFFER = 64 * 1024
+
+
+def guess_format(hint, default='csv'):
+    """'csv' or 'ndjson' from a file name or content type"""
+    hint = (hint or '').lower()
+    if 'json' in hint:
+        return 'ndjson'
+    if 'csv' in hint:
+        return 'csv'
+    return default
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict) from a text stream
+
+    The row is None for an NDJSON line that is not a JSON object. Blank
+    lines are skipped.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            if any(value not in (None, '') for value in row.values()):
+                yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def write_rows(rows, fields, fmt):
+    """Yield text pieces of rows (dicts) as CSV with a header, or as NDJSON"""
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        write = lambda row: writer.writerow([row.get(field) for field in fields])
+    else:
+        write = lambda row: buffer.write(json.dumps({field: row.get(field) for field in fields}) + '\n')
+    for row in rows:
+        write(row)
+        if buffer.tell() >= WRITE_BUFFER:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_pieces(pieces, level=6):
+    """Gzip a stream of text pieces into a stream of bytes"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for piece in pieces:
+        data = compressor.compress(piece.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def chunks(iterable, size):
+    """Yield lists of up to size items"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Progress:
+    """Row count and rate of a running import or export"""
+
+    def __init__(self):
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    def count(self, rows):
+        """Pass rows through, counting them"""
+        for row in rows:
+            self.rows += 1
+            yield row
+
+    def as_dict(self):
+        seconds = time.perf_counter() - self.started
+        return {
+            'rows': self.rows,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(self.rows / seconds) if seconds > 0 else None,
+        }
@@ -0,0 +1,513 @@
+"""
+Contraction hierarchy for the road graph
+An optional preprocessing stage: nodes are contracted one at a time in
+order of importance, adding shortcut edges wherever a shortest path ran
+through the contracted node. Queries then only ever climb to more
+important nodes from both ends, which settles a few hundred nodes instead
+of a large part of the map, and shortcuts are unpacked back into the
+original road path.
+
+The hierarchy is saved next to the map file (real_map_with_distances.ch)
+tagged with the graph version, so editing the map makes the saved file
+stale and triggers a rebuild.
+"""
+
+import os
+import struct
+import threading
+import time
+import traceback
+from array import array
+from heapq import heappop, heappush
+
+from delivery_planner import distance_matrix
+from road_graph import MAP_FILE
+from routing import INF, PathResult, SearchStats, nearest_targets, report_search, shortest_path
+
+# magic, format version, graph version (sha1 hex), nodes, upward arcs
+_HEADER = struct.Struct('<4sI40sqq')
+_MAGIC = b'LGCH'
+FORMAT_VERSION = 1
+
+# Witness searches give up after settling this many nodes; a missed
+# witness only costs an unnecessary shortcut, never a wrong answer
+WITNESS_SETTLE_LIMIT = 60
+# Smaller limit while only estimating a node's priority
+PRIORITY_SETTLE_LIMIT = 20
+
+
+def hierarchy_path(map_path=MAP_FILE):
+    """File the hierarchy for map_path is saved to"""
+    return os.path.splitext(os.path.abspath(map_path))[0] + '.ch'
+
+
+class Hierarchy:
+    """Node ranks plus the upward graph (original edges and shortcuts)
+
+    The arcs leaving node u are up_targets[up_offsets[u]:up_offsets[u + 1]]
+    and only lead to nodes of higher rank. up_middle is the contracted node
+    a shortcut bypasses, or -1 for an original road edge. The road graph is
+    undirected, so the same upward graph serves both search directions.
+    """
+
+    def __init__(self, version, rank, up_offsets, up_targets, up_weights, up_middle):
+        self.version = version
+        self.rank = rank
+        self.up_offsets = up_offsets
+        self.up_targets = up_targets
+        self.up_weights = up_weights
+        self.up_middle = up_middle
+
+    def __len__(self):
+        return len(self.rank)
+
+    @property
+    def shortcuts(self):
+        return sum(1 for middle in self.up_middle if middle >= 0)
+
+    def save(self, path):
+        """Write the hierarchy to path atomically"""
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, FORMAT_VERSION, self.version.encode(), len(self.rank), len(self.up_targets)))
+            for part in (self.rank, self.up_offsets, self.up_targets, self.up_weights, self.up_middle):
+                part.tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a saved hierarchy, or return None if the file is unusable"""
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return None
+                magic, fmt, version, n, m = _HEADER.unpack(header)
+                if magic != _MAGIC or fmt != FORMAT_VERSION:
+                    return None
+                parts = []
+                for typecode, count in (('q', n), ('q', n + 1), ('q', m), ('d', m), ('q', m)):
+                    part = array(typecode)
+                    part.fromfile(f, count)
+                    parts.append(part)
+        except (OSError, EOFError, struct.error):
+            return None
+        return cls(version.rstrip(b'\0').decode(), *parts)
+
+    def _arc(self, u, v):
+        # Index of the upward arc u -> v
+        for k in range(self.up_offsets[u], self.up_offsets[u + 1]):
+            if self.up_targets[k] == v:
+                return k
+        raise KeyError((u, v))
+
+    def unpack(self, u, k):
+        """Original node indexes along upward arc k from u, excluding u"""
+        path = []
+        stack = [(u, self.up_targets[k], self.up_middle[k])]
+        while stack:
+            a, b, middle = stack.pop()
+            if middle < 0:
+                path.append(b)
+                continue
+            # Both halves are upward arcs out of the bypassed node
+            first = self._arc(middle, a)
+            second = self._arc(middle, b)
+            stack.append((middle, b, self.up_middle[second]))
+            stack.append((a, middle, self.up_middle[first]))
+        return path
+
+    def upward_search(self, source):
+        """Distances to every node reachable upward from source: {index: dist}"""
+        offsets, targets, weights = self.up_offsets, self.up_targets, self.up_weights
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heappop(heap)
+            if d > dist[u]:
+                continue
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                nd = d + weights[k]
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    heappush(heap, (nd, v))
+        return dist
+
+    def query(self, s, t):
+        """Bidirectional upward search between node indexes
+
+        Returns (distance, path of indexes, stats); the path is empty and
+        the distance INF when t cannot be reached.
+        """
+        stats = SearchStats('ch')
+        if s == t:
+            stats.pushes = stats.settled = 1
+            return 0.0, [s], report_search(stats)
+        offsets, targets, weights = self.up_offsets, self.up_targets, self.up_weights
+        dist = ({s: 0.0}, {t: 0.0})
+        prev = ({s: None}, {t: None})  # node -> (parent, arc index)
+        heaps = ([(0.0, s)], [(0.0, t)])
+        best, meet = INF, -1
+        pushes, settled = 2, 0
+
+        side = 0
+        while heaps[0] or heaps[1]:
+            # Alternate directions, skipping an exhausted or finished one
+            if not heaps[side] or heaps[side][0][0] >= best:
+                side ^= 1
+                if not heaps[side] or heaps[side][0][0] >= best:
+                    break
+            d, u = heappop(heaps[side])
+            here, there = dist[side], dist[side ^ 1]
+            if d > here[u]:
+                side ^= 1
+                continue
+            settled += 1
+            if u in there and d + there[u] < best:
+                best, meet = d + there[u], u
+            # Stall on demand: if a higher node already reaches u more
+            # cheaply, u cannot lie on a shortest up-down path
+            arcs = range(offsets[u], offsets[u + 1])
+            if any(here.get(targets[k], INF) + weights[k] < d for k in arcs):
+                side ^= 1
+                continue
+            for k in arcs:
+                v = targets[k]
+                nd = d + weights[k]
+                if nd < here.get(v, INF):
+                    here[v] = nd
+                    prev[side][v] = (u, k)
+                    heappush(heaps[side], (nd, v))
+                    pushes += 1
+            side ^= 1
+
+        stats.pushes, stats.settled = pushes, settled
+        report_search(stats)
+        if meet < 0:
+            return INF, [], stats
+        return best, self._path(prev, meet), stats
+
+    def _path(self, prev, meet):
+        # Forward half: climb from meet back to s, then unpack in order
+        arcs = []
+        node = meet
+        while prev[0][node] is not None:
+            parent, k = prev[0][node]
+            arcs.append((parent, k))
+            node = parent
+        path = [node]
+        for parent, k in reversed(arcs):
+            path.extend(self.unpack(parent, k))
+        # Backward half: each arc runs upward towards meet, so unpack and reverse
+        node = meet
+        while prev[1][node] is not None:
+            parent, k = prev[1][node]
+            leg = [parent] + self.unpack(parent, k)
+            leg.pop()
+            path.extend(reversed(leg))
+            node = parent
+        return path
+
+    def many_to_many(self, sources, targets=None):
+        """Distance rows for source x target node indexes using search buckets
+
+        With targets None the targets are the sources themselves. Arcs run
+        both ways, so each node's upward search is only run once.
+        """
+        forward = [self.upward_search(s) for s in sources]
+        backward = forward if targets is None else [self.upward_search(t) for t in targets]
+        buckets = {}
+        for j, space in enumerate(backward):
+            for v, d in space.items():
+                buckets.setdefault(v, []).append((j, d))
+        rows = []
+        for space in forward:
+            row = [INF] * len(backward)
+            for v, d in space.items():
+                for j, dt in buckets.get(v, ()):
+                    if d + dt < row[j]:
+                        row[j] = d + dt
+            rows.append(row)
+        return rows
+
+
+# Preprocessing
+
+def _witness_search(adj, source, skip, limit, settle_limit):
+    # Local Dijkstra over not-yet-contracted nodes, avoiding skip
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    settled = 0
+    while heap:
+        d, u = heappop(heap)
+        if d > dist[u]:
+            continue
+        if d > limit or settled >= settle_limit:
+            break
+        settled += 1
+        for v, (w, _) in adj[u].items():
+            if v == skip:
+                continue
+            nd = d + w
+            if nd < dist.get(v, INF):
+                dist[v] = nd
+                heappush(heap, (nd, v))
+    return dist
+
+
+def _needed_shortcuts(adj, v, settle_limit):
+    # (u, x, weight) for neighbour pairs whose only short path runs through v
+    neighbours = list(adj[v].items())
+    shortcuts = []
+    for i, (u, (wu, _)) in enumerate(neighbours):
+        others = neighbours[i + 1:]
+        if not others:
+            break
+        limit = wu + max(wx for _, (wx, _) in others)
+        dist = _witness_search(adj, u, v, limit, settle_limit)
+        for x, (wx, _) in others:
+            via = wu + wx
+            if dist.get(x, INF) > via:
+                shortcuts.append((u, x, via))
+    return shortcuts
+
+
+def build_hierarchy(graph, log=None):
+    """Contract every node of a RoadGraph and return its Hierarchy
+
+    Nodes are ordered by twice the edge difference (shortcuts added minus
+    edges removed) plus the number of already contracted neighbours and
+    the node's depth in the hierarchy so far, which spreads contraction
+    evenly over the map. Updates are lazy: a popped node is re-scored and
+    put back if it is no longer the cheapest.
+    """
+    started = time.perf_counter()
+    n = len(graph)
+    adj = [{} for _ in range(n)]  # node -> {neighbour: (weight, middle)}
+    for u in range(n):
+        for k in range(graph.offsets[u], graph.offsets[u + 1]):
+            v, w = graph.targets[k], graph.weights[k]
+            if v != u and w < adj[u].get(v, (INF,))[0]:
+                adj[u][v] = (w, -1)
+
+    contracted_neighbours = [0] * n
+    level = [0] * n
+
+    def priority(v):
+        added = len(_needed_shortcuts(adj, v, PRIORITY_SETTLE_LIMIT))
+        return 2 * (added - len(adj[v])) + contracted_neighbours[v] + level[v]
+
+    heap = [(priority(v), v) for v in range(n)]
+    heap.sort()
+    rank = array('q', [0]) * n
+    upward = [None] * n
+    order = 0
+    while heap:
+        _, v = heappop(heap)
+        score = priority(v)
+        if heap and score > heap[0][0]:
+            heappush(heap, (score, v))
+            continue
+
+        rank[v] = order
+        order += 1
+        # Remaining neighbours are contracted later, so every current edge is upward
+        upward[v] = list(adj[v].items())
+        for u, x, via in _needed_shortcuts(adj, v, WITNESS_SETTLE_LIMIT):
+            if via < adj[u].get(x, (INF,))[0]:
+                adj[u][x] = (via, v)
+                adj[x][u] = (via, v)
+        for u in adj[v]:
+            del adj[u][v]
+            contracted_neighbours[u] += 1
+            level[u] = max(level[u], level[v] + 1)
+        adj[v] = {}
+        if log and order % 10000 == 0:
+            log(f'contracted {order}/{n} nodes')
+
+    up_offsets = array('q', [0]) * (n + 1)
+    up_targets, up_weights, up_middle = array('q'), array('d'), array('q')
+    for u in range(n):
+        for v, (w, middle) in sorted(upward[u]):
+            up_targets.append(v)
+            up_weights.append(w)
+            up_middle.append(middle)
+        up_offsets[u + 1] = len(up_targets)
+    if log:
+        shortcuts = sum(1 for middle in up_middle if middle >= 0)
+        log(f'contraction hierarchy: {n} nodes, {len(up_targets)} upward arcs, '
+            f'{shortcuts} shortcuts in {time.perf_counter() - started:.1f}s')
+    return Hierarchy(graph.version, rank, up_offsets, up_targets, up_weights, up_middle)
+
+
+# Shared hierarchies
+
+_lock = threading.Lock()
+_loaded = {}  # hierarchy file -> Hierarchy
+_building = {}  # (hierarchy file, graph version) -> Event set when that build ends
+_failed = {}  # (hierarchy file, graph version) -> exception its build raised
+
+
+def _build_and_save(graph, path, done):
+    key = (path, graph.version)
+    try:
+        hierarchy = build_hierarchy(graph)
+        hierarchy.save(path)
+    except Exception as e:
+        with _lock:
+            _failed[key] = e
+        raise
+    finally:
+        with _lock:
+            _building.pop(key, None)
+        done.set()
+    with _lock:
+        _loaded[path] = hierarchy
+    return hierarchy
+
+
+def _build_in_background(graph, path, done):
+    try:
+        _build_and_save(graph, path, done)
+    except Exception:
+        traceback.print_exc()
+
+
+def get_hierarchy(graph, map_path=MAP_FILE, wait=False):
+    """Hierarchy matching graph's version, loading or rebuilding it as needed
+
+    A missing or stale file (the map changed since it was built) triggers
+    a rebuild. With wait=False the rebuild runs on a background thread and
+    None is returned until it is ready, so callers fall back to plain
+    searches meanwhile. With wait=True a build already running for this
+    version is waited for rather than started again.
+
+    A build that fails is not retried for the same map version: later
+    calls return None, or raise RuntimeError with wait=True.
+    """
+    path = hierarchy_path(map_path)
+    hierarchy = _loaded.get(path)
+    if hierarchy is not None and hierarchy.version == graph.version:
+        return hierarchy
+    key = (path, graph.version)
+    with _lock:
+        done = _building.get(key)
+        start = done is None and key not in _failed
+        if start:
+            hierarchy = _loaded.get(path)
+            if hierarchy is None or hierarchy.version != graph.version:
+                hierarchy = Hierarchy.load(path)
+                if hierarchy is None or hierarchy.version != graph.version or len(hierarchy) != len(graph):
+                    hierarchy = None
+                else:
+                    _loaded[path] = hierarchy
+            if hierarchy is not None:
+                return hierarchy
+            done = _building[key] = threading.Event()
+    if start:
+        if wait:
+            return _build_and_save(graph, path, done)
+        threading.Thread(target=_build_in_background, args=(graph, path, done), name='ch-build', daemon=True).start()
+        return None
+    if not wait:
+        return None
+    if done is not None:
+        done.wait()
+    with _lock:
+        hierarchy = _loaded.get(path)
+        if hierarchy is not None and hierarchy.version == graph.version:
+            return hierarchy
+        error = _failed.get(key)
+    raise RuntimeError(f'contraction hierarchy build for map version {graph.version} failed: {error}') from error
+
+
+class HierarchyRouter:
+    """Routing calls answered from the contraction hierarchy
+
+    Same methods and return shapes as native_router.NativeRouter. Until a
+    hierarchy for the graph's version is ready the calls go to fallback (a
+    router object, or routing.py when None).
+    """
+
+    def __init__(self, map_path=MAP_FILE, fallback=None):
+        self.map_path = os.path.abspath(map_path)
+        self.fallback = fallback
+        self.ch_calls = 0
+        self.fallback_calls = 0
+
+    def _hierarchy(self, graph):
+        hierarchy = get_hierarchy(graph, self.map_path)
+        if hierarchy is None:
+            self.fallback_calls += 1
+        else:
+            self.ch_calls += 1
+        return hierarchy
+
+    def shortest_path(self, graph, source, target):
+        """PathResult between two node names, like routing.shortest_path"""
+        hierarchy = self._hierarchy(graph)
+        if hierarchy is None:
+            return shortest_path(graph, source, target)
+        if source not in graph or target not in graph:
+            return PathResult(INF, [], SearchStats('ch'))
+        distance, path, stats = hierarchy.query(graph.name_to_index[source], graph.name_to_index[target])
+        return PathResult(distance, [graph.index_to_name[i] for i in path], stats)
+
+    def shortest_paths(self, graph, pairs, algorithm='astar'):
+        """(distance, path) for each (start, end) pair"""
+        if get_hierarchy(graph, self.map_path) is None and self.fallback is not None:
+            self.fallback_calls += 1
+            return self.fallback.shortest_paths(graph, pairs, algorithm)
+        return [tuple(self.shortest_path(graph, a, b)[:2]) for a, b in pairs]
+
+    def nearest_targets_many(self, graph, sources, targets, with_paths=True):
+        """{source: ranked} for several sources against one target set"""
+        sources = list(dict.fromkeys(sources))
+        hierarchy = self._hierarchy(graph)
+        if hierarchy is None:
+            if self.fallback is not None:
+                return self.fallback.nearest_targets_many(graph, sources, targets, with_paths)
+            return {s: nearest_targets(graph, s, targets, with_paths)[0] for s in sources}
+        names = [t for t in dict.fromkeys(targets) if t in graph]
+        known = [s for s in sources if s in graph]
+        rows = hierarchy.many_to_many([graph.name_to_index[s] for s in known],
+                                      [graph.name_to_index[t] for t in names])
+        ranking = {s: [] for s in sources}
+        for source, row in zip(known, rows):
+            ranked = sorted((d, name) for name, d in zip(names, row) if d < INF)
+            ranking[source] = [(name, d, self._path_back(hierarchy, graph, source, name) if with_paths else None)
+                               for d, name in ranked]
+        return ranking
+
+    @staticmethod
+    def _path_back(hierarchy, graph, source, target):
+        # routing.nearest_targets paths run from the target back to source
+        _, path, _ = hierarchy.query(graph.name_to_index[target], graph.name_to_index[source])
+        return [graph.index_to_name[i] for i in path]
+
+    def nearest_targets(self, graph, source, targets, with_paths=True):
+        """Drop-in for routing.nearest_targets; returns (ranked, stats)"""
+        if get_hierarchy(graph, self.map_path) is None:
+            self.fallback_calls += 1
+            search = self.fallback.nearest_targets if self.fallback is not None else nearest_targets
+            return search(graph, source, targets, with_paths)
+        return self.nearest_targets_many(graph, [source], targets, with_paths)[source], SearchStats('ch')
+
+    def distance_matrix(self, graph, points):
+        """Road distances between every pair of node names (INF if unreachable)"""
+        hierarchy = self._hierarchy(graph)
+        if hierarchy is None:
+            if self.fallback is not None:
+                return self.fallback.distance_matrix(graph, points)
+            return distance_matrix(graph, points)
+        known = [i for i, p in enumerate(points) if p in graph]
+        rows = hierarchy.many_to_many([graph.name_to_index[points[i]] for i in known])
+        matrix = [[0.0 if i == j else INF for j in range(len(points))] for i in range(len(points))]
+        for a, row in zip(known, rows):
+            for b, d in zip(known, row):
+                matrix[a][b] = d
+        return matrix
+
+    def stats(self):
+        return {'ch_calls': self.ch_calls, 'fallback_calls': self.fallback_calls}
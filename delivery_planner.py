@@ -0,0 +1,439 @@
+"""
+Batch delivery route planning
+Builds a stop-to-stop distance matrix with one search per stop, then
+constructs single-vehicle tours or capacitated fleet routes and improves
+them with 2-opt, Or-opt and relocate local search
+"""
+
+import time
+
+from routing import INF, nearest_targets, shortest_path
+
+DEFAULT_TIME_BUDGET = 2.0  # seconds of local search per plan
+
+
+def distance_matrix(graph, points):
+    """Road distances between every pair of node names, one search per point
+
+    The road graph is undirected, so the search from point i only has to
+    settle the points after it and the matrix is filled symmetrically.
+    """
+    size = len(points)
+    matrix = [[INF] * size for _ in range(size)]
+    position = {name: i for i, name in enumerate(points)}
+    for i, source in enumerate(points):
+        matrix[i][i] = 0.0
+        ranked, _ = nearest_targets(graph, source, points[i + 1:], with_paths=False)
+        for name, distance, _ in ranked:
+            j = position[name]
+            matrix[i][j] = matrix[j][i] = distance
+    return matrix
+
+
+class _PythonRouter:
+    """The searches plan_route and plan_fleet need, served by routing.py"""
+    nearest_targets = staticmethod(nearest_targets)
+    distance_matrix = staticmethod(distance_matrix)
+
+
+_python_router = _PythonRouter()
+
+
+def _leg_paths(graph, legs, cache):
+    """(distance, path) for each (start, end) leg, through the route cache when given
+
+    The cache resolves all legs with one lookup and one write.
+    """
+    if cache is not None:
+        return cache.paths(graph, legs)
+    return [tuple(shortest_path(graph, start, end)[:2]) for start, end in legs]
+
+
+def _tour_length(matrix, tour):
+    return sum(matrix[tour[k]][tour[k + 1]] for k in range(len(tour) - 1))
+
+
+def nearest_neighbour_tour(matrix):
+    """Greedy open tour starting at index 0"""
+    unvisited = set(range(1, len(matrix)))
+    tour = [0]
+    while unvisited:
+        row = matrix[tour[-1]]
+        nxt = min(unvisited, key=row.__getitem__)
+        tour.append(nxt)
+        unvisited.remove(nxt)
+    return tour
+
+
+def two_opt(matrix, tour, deadline, fixed_end=False):
+    """Reverse tour segments while that shortens the path
+
+    The first node is always fixed; with fixed_end the last one is too,
+    which is how closed vehicle routes (depot at both ends) are handled.
+    """
+    improved = True
+    last = len(tour) - 1
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(1, last):
+            a, b = tour[i - 1], tour[i]
+            row_a, row_b = matrix[a], matrix[b]
+            for j in range(i + 1, last if fixed_end else last + 1):
+                c = tour[j]
+                if j < last:
+                    d = tour[j + 1]
+                    delta = row_a[c] + row_b[d] - row_a[b] - matrix[c][d]
+                else:
+                    delta = row_a[c] - row_a[b]
+                if delta < -1e-9:
+                    tour[i:j + 1] = reversed(tour[i:j + 1])
+                    b = tour[i]
+                    row_b = matrix[b]
+                    improved = True
+            if time.perf_counter() >= deadline:
+                break
+    return tour
+
+
+def or_opt(matrix, tour, deadline, max_segment=3, fixed_end=False):
+    """Move short segments of the tour to a cheaper position
+
+    Start (and with fixed_end, the last node) stay in place.
+    """
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for length in range(1, max_segment + 1):
+            i = 1
+            while i + length <= len(tour) - fixed_end:
+                segment = tour[i:i + length]
+                prev = tour[i - 1]
+                nxt = tour[i + length] if i + length < len(tour) else None
+                removed_gain = matrix[prev][segment[0]]
+                if nxt is not None:
+                    removed_gain += matrix[segment[-1]][nxt] - matrix[prev][nxt]
+                rest = tour[:i] + tour[i + length:]
+
+                best_delta, best_move = -1e-9, None
+                for k in range(len(rest) - fixed_end):
+                    before = rest[k]
+                    after = rest[k + 1] if k + 1 < len(rest) else None
+                    for seg in (segment, segment[::-1]):
+                        added = matrix[before][seg[0]]
+                        if after is not None:
+                            added += matrix[seg[-1]][after] - matrix[before][after]
+                        delta = added - removed_gain
+                        if delta < best_delta:
+                            best_delta, best_move = delta, (k, seg)
+                if best_move:
+                    k, seg = best_move
+                    tour[:] = rest[:k + 1] + seg + rest[k + 1:]
+                    improved = True
+                else:
+                    i += 1
+                if time.perf_counter() >= deadline:
+                    return tour
+    return tour
+
+
+def improve_tour(matrix, tour, time_budget=DEFAULT_TIME_BUDGET, fixed_end=False, deadline=None):
+    """Alternate 2-opt and Or-opt until neither helps or time runs out"""
+    if deadline is None:
+        deadline = time.perf_counter() + time_budget
+    best = _tour_length(matrix, tour)
+    while time.perf_counter() < deadline:
+        two_opt(matrix, tour, deadline, fixed_end)
+        or_opt(matrix, tour, deadline, fixed_end=fixed_end)
+        length = _tour_length(matrix, tour)
+        if length >= best - 1e-9:
+            break
+        best = length
+    return tour
+
+
+def plan_route(graph, start, addresses, time_budget=DEFAULT_TIME_BUDGET, cache=None, router=None):
+    """Plan a single-vehicle delivery route from start through every address
+
+    Returns a dict with the ordered legs ('order'), 'total_distance',
+    'route_path_edges' for the map, and the addresses that were 'skipped'
+    because they are not on the map or not reachable from start. Leg paths
+    go through cache (a route_cache.RouteCache) when one is given; router
+    (a native_router.NativeRouter) serves the searches when given.
+    """
+    counts = {}
+    for addr in addresses:
+        counts[addr] = counts.get(addr, 0) + 1
+    skipped = [addr for addr in counts if addr not in graph]
+    stops = [addr for addr in counts if addr in graph and addr != start]
+    result = {'order': [], 'total_distance': 0, 'route_path_edges': [], 'skipped': skipped}
+    if start not in graph:
+        result['skipped'] = list(counts)
+        return result
+    if start in counts:
+        # Deliveries at the start node itself: a zero-distance first stop
+        result['order'].append({'from': start, 'to': start, 'distance': 0.0, 'path': [start],
+                                'orders': counts[start]})
+    if not stops:
+        return result
+
+    # Drop stops that cannot be reached from the start node
+    search = router or _python_router
+    reachable, _ = search.nearest_targets(graph, start, stops, with_paths=False)
+    reachable_names = {name for name, _, _ in reachable}
+    skipped.extend(addr for addr in stops if addr not in reachable_names)
+    stops = [addr for addr in stops if addr in reachable_names]
+    if not stops:
+        return result
+
+    points = [start] + stops
+    matrix = search.distance_matrix(graph, points)
+    tour = improve_tour(matrix, nearest_neighbour_tour(matrix), time_budget)
+
+    # Expand the chosen legs into full paths for display
+    legs = [(points[a], points[b]) for a, b in zip(tour, tour[1:])]
+    for (a, b), (distance, path) in zip(zip(tour, tour[1:]), _leg_paths(graph, legs, cache)):
+        result['order'].append({
+            'from': points[a],
+            'to': points[b],
+            'distance': distance,
+            'path': path,
+            'orders': counts[points[b]],
+        })
+        result['total_distance'] += distance
+        result['route_path_edges'].extend(zip(path, path[1:]))
+    return result
+
+
+def _savings_routes(matrix, node, demand, capacity):
+    """Clarke-Wright savings construction over customer indices"""
+    depot_row = matrix[0]
+    count = len(node)
+    savings = []
+    for i in range(count):
+        di = depot_row[node[i]]
+        row = matrix[node[i]]
+        for j in range(i + 1, count):
+            saving = di + depot_row[node[j]] - row[node[j]]
+            if saving > 0:
+                savings.append((saving, i, j))
+    savings.sort(reverse=True)
+
+    routes = {i: [i] for i in range(count)}
+    route_of = list(range(count))
+    load = {i: demand[i] for i in range(count)}
+    for _, i, j in savings:
+        ri, rj = route_of[i], route_of[j]
+        if ri == rj:
+            continue
+        a, b = routes[ri], routes[rj]
+        # Only customers at a route end can be linked
+        if i not in (a[0], a[-1]) or j not in (b[0], b[-1]):
+            continue
+        if capacity is not None and load[ri] + load[rj] > capacity:
+            continue
+        if a[-1] != i:
+            a.reverse()
+        if b[0] != j:
+            b.reverse()
+        a.extend(b)
+        load[ri] += load.pop(rj)
+        for c in b:
+            route_of[c] = ri
+        del routes[rj]
+    return [(route, load[rid]) for rid, route in routes.items()]
+
+
+def _link(matrix, node, a, b):
+    """(added distance, link) of the cheapest way to join routes a and b
+
+    Joining only replaces two depot legs with one link between route ends,
+    so a join is scored from the ends alone.
+    """
+    depot_row = matrix[0]
+    ends_a = (node[a[0]], node[a[-1]])
+    ends_b = (node[b[0]], node[b[-1]])
+    best = None
+    # (end of a, start of b) for a + b, a + b reversed, a reversed + b, b + a
+    for link, (p, q) in enumerate(((ends_a[1], ends_b[0]), (ends_a[1], ends_b[1]),
+                                   (ends_a[0], ends_b[0]), (ends_b[1], ends_a[0]))):
+        added = matrix[p][q] - depot_row[p] - depot_row[q]
+        if best is None or added < best[0]:
+            best = (added, link)
+    return best
+
+
+def _fit_fleet(matrix, node, routes, vehicles, capacity, deadline=None):
+    """Merge routes until they fit the fleet; returns (routes, dropped)
+
+    Each step joins the two routes whose linking adds the least distance.
+    Once deadline passes, each step joins the two lightest routes instead,
+    which is cheap and still merges whenever any pair fits the capacity.
+    Routes are only dropped, lightest first, when no pair fits.
+    """
+    routes = [(list(route), load) for route, load in routes]
+    while len(routes) > vehicles:
+        best = None
+        if deadline is not None and time.perf_counter() >= deadline:
+            # If the two lightest routes overflow a vehicle, every pair does
+            x, y = sorted(range(len(routes)), key=lambda k: routes[k][1])[:2]
+            if capacity is None or routes[x][1] + routes[y][1] <= capacity:
+                best = _link(matrix, node, routes[x][0], routes[y][0]) + (x, y)
+        else:
+            for x in range(len(routes)):
+                a, la = routes[x]
+                for y in range(x + 1, len(routes)):
+                    b, lb = routes[y]
+                    if capacity is not None and la + lb > capacity:
+                        continue
+                    added, link = _link(matrix, node, a, b)
+                    if best is None or added < best[0]:
+                        best = (added, link, x, y)
+        if best is None:
+            break
+        _, link, x, y = best
+        (a, la), (b, lb) = routes[x], routes[y]
+        joined = (a + b, a + b[::-1], a[::-1] + b, b + a)[link]
+        routes = [r for k, r in enumerate(routes) if k not in (x, y)] + [(joined, la + lb)]
+
+    # Whatever still does not fit goes unassigned, lightest routes first
+    routes.sort(key=lambda r: r[1], reverse=True)
+    return routes[:vehicles], routes[vehicles:]
+
+
+def _improve_route(matrix, node, route, deadline):
+    """2-opt / Or-opt on one closed route via a small local matrix"""
+    if len(route) < 3:
+        return route
+    points = [0] + [node[c] for c in route] + [0]
+    local = [[matrix[p][q] for q in points] for p in points]
+    tour = improve_tour(local, list(range(len(points))), fixed_end=True, deadline=deadline)
+    return [route[k - 1] for k in tour[1:-1]]
+
+
+def _relocate(matrix, node, routes, loads, demand, capacity, deadline):
+    """Move single customers between routes while that shortens the plan"""
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for ra in range(len(routes)):
+            k = 0
+            while k < len(routes[ra]):
+                route = routes[ra]
+                c = route[k]
+                prev = node[route[k - 1]] if k > 0 else 0
+                nxt = node[route[k + 1]] if k + 1 < len(route) else 0
+                here = node[c]
+                gain = matrix[prev][here] + matrix[here][nxt] - matrix[prev][nxt]
+
+                best = None
+                for rb in range(len(routes)):
+                    if rb == ra:
+                        continue
+                    if capacity is not None and loads[rb] + demand[c] > capacity:
+                        continue
+                    other = routes[rb]
+                    for pos in range(len(other) + 1):
+                        p = node[other[pos - 1]] if pos > 0 else 0
+                        q = node[other[pos]] if pos < len(other) else 0
+                        added = matrix[p][here] + matrix[here][q] - matrix[p][q]
+                        if added - gain < -1e-9 and (best is None or added < best[0]):
+                            best = (added, rb, pos)
+                if best:
+                    _, rb, pos = best
+                    del route[k]
+                    routes[rb].insert(pos, c)
+                    loads[ra] -= demand[c]
+                    loads[rb] += demand[c]
+                    improved = True
+                else:
+                    k += 1
+                if time.perf_counter() >= deadline:
+                    return
+
+
+def plan_fleet(graph, depot, deliveries, vehicles, capacity=None, time_budget=DEFAULT_TIME_BUDGET, cache=None, router=None):
+    """Plan capacitated routes for a fleet leaving and returning to depot
+
+    deliveries is a list of dicts with 'id', 'address' and 'weight'. Uses
+    savings construction over a precomputed distance matrix, then improves
+    each route with 2-opt / Or-opt and moves customers between routes.
+    Returns a dict with per-vehicle 'vehicles' (legs in the same format as
+    plan_route), 'total_distance', 'route_path_edges' and 'unassigned'
+    deliveries with a reason. cache and router work as in plan_route.
+    """
+    deadline = time.perf_counter() + time_budget
+    result = {'vehicles': [], 'total_distance': 0, 'route_path_edges': [], 'unassigned': []}
+    if depot not in graph:
+        result['unassigned'] = [dict(d, reason='warehouse not on map') for d in deliveries]
+        return result
+
+    addresses = list(dict.fromkeys(d['address'] for d in deliveries if d['address'] in graph))
+    search = router or _python_router
+    reachable, _ = search.nearest_targets(graph, depot, addresses, with_paths=False)
+    reachable = {name for name, _, _ in reachable}
+    customers = []
+    for d in deliveries:
+        if d['address'] not in reachable:
+            result['unassigned'].append(dict(d, reason='address not reachable on map'))
+        elif capacity is not None and d['weight'] > capacity:
+            result['unassigned'].append(dict(d, reason='heavier than vehicle capacity'))
+        else:
+            customers.append(d)
+    if not customers or vehicles < 1:
+        result['unassigned'].extend(dict(d, reason='no vehicles') for d in customers)
+        return result
+
+    points = [depot] + [addr for addr in addresses if addr in reachable]
+    position = {name: i for i, name in enumerate(points)}
+    matrix = search.distance_matrix(graph, points)
+    node = [position[d['address']] for d in customers]
+    demand = [d['weight'] for d in customers]
+
+    routes = _savings_routes(matrix, node, demand, capacity)
+    routes, dropped = _fit_fleet(matrix, node, routes, vehicles, capacity, deadline)
+    for route, _ in dropped:
+        result['unassigned'].extend(dict(customers[c], reason='fleet capacity exceeded') for c in route)
+
+    loads = [load for _, load in routes]
+    routes = [_improve_route(matrix, node, route, deadline) for route, _ in routes]
+    _relocate(matrix, node, routes, loads, demand, capacity, deadline)
+    routes = [_improve_route(matrix, node, route, deadline) for route in routes]
+
+    # Expand each route into legs, merging consecutive drops at the same node
+    planned = []
+    for route, load in zip(routes, loads):
+        if not route:
+            continue
+        stops = []
+        for c in route:
+            if stops and stops[-1][0] == customers[c]['address']:
+                stops[-1][1].append(customers[c])
+            else:
+                stops.append((customers[c]['address'], [customers[c]]))
+        sequence = [depot] + [addr for addr, _ in stops] + [depot]
+        planned.append((stops, load, list(zip(sequence, sequence[1:]))))
+    # Every leg of every vehicle in one batch through the cache
+    paths = iter(_leg_paths(graph, [leg for _, _, route_legs in planned for leg in route_legs], cache))
+    for number, (stops, load, route_legs) in enumerate(planned, 1):
+        legs = []
+        distance_total = 0
+        for k, (a, b) in enumerate(route_legs):
+            distance, path = next(paths)
+            legs.append({
+                'from': a,
+                'to': b,
+                'distance': distance,
+                'path': path,
+                'orders': len(stops[k][1]) if k < len(stops) else 0,
+            })
+            distance_total += distance
+            result['route_path_edges'].extend(zip(path, path[1:]))
+        result['vehicles'].append({
+            'vehicle': number,
+            'order': legs,
+            'deliveries': [d['id'] for _, group in stops for d in group],
+            'load': load,
+            'total_distance': distance_total,
+        })
+        result['total_distance'] += distance_total
+    return result
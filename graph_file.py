@@ -0,0 +1,430 @@
+"""
+Compact binary road graph file
+The nodes/edges schema of real_map_with_distances.json as flat arrays:
+coordinates, the edge list, a prebuilt CSR adjacency and sorted string
+tables for node ids and names. Every section is 8-byte aligned, so a
+mapped file is read as typed arrays without copying; processes that map
+the same file share its page-cache pages. A SHA-1 of everything after the
+header is checked at load and doubles as the graph version.
+
+MappedRoadGraph reads the sections through memoryview casts rather than
+NumPy views. NumPy is not a dependency of the app. The routing loops
+also index one element at a time from Python, and a memoryview is faster
+at that than a NumPy array. GraphFile.array() returns the same bytes as
+read-only numpy.frombuffer views where NumPy is installed, for
+vectorised work; both kinds of view share the mapped pages.
+
+Layout after the header, in order (n nodes, m edges, a arcs):
+    lat d[n], lon d[n]              radians, NaN when missing
+    edge_from q[m], edge_to q[m]    node indexes
+    edge_distance d[m]              km, NaN for a null distance
+    offsets q[n+1], targets q[a], weights d[a]
+                                    undirected arcs, as RoadGraph builds them
+    id_offsets q[n+1], id_order q[n]
+    name_offsets q[n+1], name_order q[n]
+                                    *_order lists indexes sorted by the string
+    id blob, name blob              UTF-8, each padded to 8 bytes
+
+    python graph_file.py convert real_map_with_distances.json real_map.graph
+    python graph_file.py info real_map.graph
+"""
+
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from functools import cached_property
+
+import click
+
+from road_graph import RoadGraph, admissible_scale
+
+try:
+    import numpy
+except ImportError:  # optional; memoryviews serve the same data
+    numpy = None
+
+MAGIC = b'LGGR'
+FORMAT_VERSION = 2
+# magic, format version, nodes, edges, arcs, id blob bytes, name blob bytes,
+# heuristic scale, sha1 of the payload
+HEADER = struct.Struct('<4sIqqqqqd20s4x')
+
+
+class GraphFileError(ValueError):
+    """The file is not a graph file, has another format version, or is corrupt"""
+
+
+def _padded(size):
+    return (size + 7) // 8 * 8
+
+
+def _string_table(strings):
+    encoded = [text.encode() for text in strings]
+    offsets = array('q', [0]) * (len(encoded) + 1)
+    for i, data in enumerate(encoded):
+        offsets[i + 1] = offsets[i] + len(data)
+    order = array('q', sorted(range(len(encoded)), key=encoded.__getitem__))
+    return offsets, order, b''.join(encoded)
+
+
+def build_adjacency(n, edge_from, edge_to, edge_distance):
+    """CSR (offsets, targets, weights) with the same arc order as RoadGraph
+
+    Each edge with a distance becomes two arcs; a node's arcs are sorted by
+    neighbour index, then weight.
+    """
+    offsets = array('q', [0]) * (n + 1)
+    for u, v, w in zip(edge_from, edge_to, edge_distance):
+        if not math.isnan(w):
+            offsets[u + 1] += 1
+            offsets[v + 1] += 1
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+    fill = array('q', offsets[:n])
+    targets = array('q', [0]) * offsets[n]
+    weights = array('d', [0.0]) * offsets[n]
+    for u, v, w in zip(edge_from, edge_to, edge_distance):
+        if math.isnan(w):
+            continue
+        for a, b in ((u, v), (v, u)):
+            targets[fill[a]] = b
+            weights[fill[a]] = w
+            fill[a] += 1
+    for u in range(n):
+        start, end = offsets[u], offsets[u + 1]
+        if end - start > 1:
+            arcs = sorted(zip(targets[start:end], weights[start:end]))
+            targets[start:end] = array('q', (v for v, _ in arcs))
+            weights[start:end] = array('d', (w for _, w in arcs))
+    return offsets, targets, weights
+
+
+def write_graph(path, ids, names, lat, lon, edge_from, edge_to, edge_distance):
+    """Write a graph file atomically and return its SHA-1 hex digest
+
+    ids and names are sequences of str; lat/lon are degrees (NaN when
+    unknown) and the edge arrays hold node indexes and km (NaN for null).
+    """
+    n, m = len(ids), len(edge_from)
+    lat = array('d', (math.radians(x) for x in lat))
+    lon = array('d', (math.radians(x) for x in lon))
+    offsets, targets, weights = build_adjacency(n, edge_from, edge_to, edge_distance)
+    scale = admissible_scale(((u, v, w) for u, v, w in zip(edge_from, edge_to, edge_distance)
+                              if not math.isnan(w)), lat, lon)
+    id_offsets, id_order, id_blob = _string_table(ids)
+    name_offsets, name_order, name_blob = _string_table(names)
+    sections = [
+        lat, lon,
+        array('q', edge_from), array('q', edge_to), array('d', edge_distance),
+        offsets, targets, weights,
+        id_offsets, id_order, name_offsets, name_order,
+        id_blob.ljust(_padded(len(id_blob)), b'\0'),
+        name_blob.ljust(_padded(len(name_blob)), b'\0'),
+    ]
+
+    digest = hashlib.sha1()
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(bytes(HEADER.size))
+        for section in sections:
+            data = section if isinstance(section, bytes) else section.tobytes()
+            digest.update(data)
+            f.write(data)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, n, m, len(targets), len(id_blob), len(name_blob),
+                            scale, digest.digest()))
+    os.replace(tmp, path)
+    return digest.hexdigest()
+
+
+def convert_json(map_data, path):
+    """Write map data in the JSON schema to a graph file
+
+    Returns (digest, skipped) where skipped counts edges whose endpoints
+    are not nodes of the map (RoadGraph ignores those too).
+    """
+    nodes = map_data.get('nodes', [])
+    index = {node['id']: i for i, node in enumerate(nodes)}
+    edge_from, edge_to, edge_distance = array('q'), array('q'), array('d')
+    skipped = 0
+    for edge in map_data.get('edges', []):
+        u, v = index.get(edge.get('from')), index.get(edge.get('to'))
+        if u is None or v is None:
+            skipped += 1
+            continue
+        distance = edge.get('distance')
+        edge_from.append(u)
+        edge_to.append(v)
+        edge_distance.append(math.nan if distance is None else float(distance))
+
+    def coordinate(node, key):
+        value = node.get(key)
+        return float(value) if isinstance(value, (float, int)) else math.nan
+
+    digest = write_graph(path, [str(node['id']) for node in nodes], [node['name'] for node in nodes],
+                         [coordinate(node, 'lat') for node in nodes], [coordinate(node, 'lon') for node in nodes],
+                         edge_from, edge_to, edge_distance)
+    return digest, skipped
+
+
+def is_graph_file(path):
+    """Whether path starts with the graph file magic"""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class StringTable:
+    """Read-only sequence of strings stored as offsets plus a UTF-8 blob"""
+
+    def __init__(self, offsets, order, blob):
+        self.offsets = offsets
+        self.order = order
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.order)
+
+    def _bytes(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._bytes(i).decode()
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def find(self, text):
+        """Index of text, or -1; a binary search over the sorted order"""
+        if not isinstance(text, str):
+            return -1
+        key = text.encode()
+        lo, hi = 0, len(self.order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(self.order[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.order) and self._bytes(self.order[lo]) == key:
+            return self.order[lo]
+        return -1
+
+
+class _Lookup:
+    """Mapping from a string to a value found through a StringTable"""
+
+    def __init__(self, table, value=None):
+        self.table = table
+        self.value = value
+
+    def __getitem__(self, key):
+        i = self.table.find(key)
+        if i < 0:
+            raise KeyError(key)
+        return i if self.value is None else self.value(i)
+
+    def get(self, key, default=None):
+        i = self.table.find(key)
+        if i < 0:
+            return default
+        return i if self.value is None else self.value(i)
+
+    def __contains__(self, key):
+        return self.table.find(key) >= 0
+
+    def __len__(self):
+        return len(self.table)
+
+
+class GraphFile:
+    """A graph file mapped read-only, with its sections as zero-copy views"""
+
+    def __init__(self, path, verify=True):
+        self.path = os.path.abspath(path)
+        with open(self.path, 'rb') as f:
+            try:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                raise GraphFileError(f'{path}: empty file')
+        if len(self.mmap) < HEADER.size:
+            raise GraphFileError(f'{path}: truncated header')
+        (magic, fmt, self.node_count, self.edge_count, self.arc_count, id_bytes, name_bytes,
+         self.heuristic_scale, digest) = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC:
+            raise GraphFileError(f'{path}: not a graph file')
+        if fmt != FORMAT_VERSION:
+            raise GraphFileError(f'{path}: format version {fmt}, expected {FORMAT_VERSION}; convert the map again')
+
+        n, m, a = self.node_count, self.edge_count, self.arc_count
+        self._sections = {}
+        pos = HEADER.size
+        for name, typecode, count in (
+            ('lat', 'd', n), ('lon', 'd', n),
+            ('edge_from', 'q', m), ('edge_to', 'q', m), ('edge_distance', 'd', m),
+            ('offsets', 'q', n + 1), ('targets', 'q', a), ('weights', 'd', a),
+            ('id_offsets', 'q', n + 1), ('id_order', 'q', n),
+            ('name_offsets', 'q', n + 1), ('name_order', 'q', n),
+            ('id_blob', 'B', id_bytes), ('name_blob', 'B', name_bytes),
+        ):
+            self._sections[name] = (pos, typecode, count)
+            pos += _padded(count * (1 if typecode == 'B' else 8))
+        if pos != len(self.mmap):
+            raise GraphFileError(f'{path}: expected {pos} bytes, found {len(self.mmap)}')
+
+        payload = memoryview(self.mmap)[HEADER.size:]
+        if verify and hashlib.sha1(payload).digest() != digest:
+            raise GraphFileError(f'{path}: checksum mismatch')
+        self.version = digest.hex()
+
+    def view(self, name):
+        """Section as a read-only memoryview of its element type"""
+        pos, typecode, count = self._sections[name]
+        size = count * (1 if typecode == 'B' else 8)
+        return memoryview(self.mmap)[pos:pos + size].cast(typecode)
+
+    def array(self, name):
+        """Section as a read-only NumPy array, or a memoryview without NumPy"""
+        if numpy is None:
+            return self.view(name)
+        pos, typecode, count = self._sections[name]
+        dtype = {'d': numpy.float64, 'q': numpy.int64, 'B': numpy.uint8}[typecode]
+        return numpy.frombuffer(self.mmap, dtype=dtype, count=count, offset=pos)
+
+
+class _Nodes:
+    """Node dicts in the JSON schema, built on access"""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __len__(self):
+        return len(self.graph.index_to_name)
+
+    def __getitem__(self, i):
+        graph = self.graph
+        node = {'id': graph.index_to_id[i], 'name': graph.index_to_name[i]}
+        if graph.has_coordinates(i):
+            node['lat'] = round(math.degrees(graph.lat[i]), 7)
+            node['lon'] = round(math.degrees(graph.lon[i]), 7)
+        return node
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class _Edges:
+    """Edge dicts in the JSON schema, built on access"""
+
+    def __init__(self, graph, edge_from, edge_to, edge_distance):
+        self.graph = graph
+        self.edge_from = edge_from
+        self.edge_to = edge_to
+        self.edge_distance = edge_distance
+
+    def __len__(self):
+        return len(self.edge_from)
+
+    def __getitem__(self, k):
+        ids = self.graph.index_to_id
+        distance = self.edge_distance[k]
+        return {'from': ids[self.edge_from[k]], 'to': ids[self.edge_to[k]],
+                'distance': None if math.isnan(distance) else distance}
+
+    def __iter__(self):
+        return (self[k] for k in range(len(self)))
+
+
+class MappedRoadGraph(RoadGraph):
+    """RoadGraph served straight from a mapped graph file
+
+    Adjacency and coordinates are memoryviews into the file (see the
+    module docstring for why not NumPy) and name lookups
+    binary-search its sorted string tables, so loading costs no parsing;
+    the node and edge dicts of the JSON schema are only built on access.
+    """
+
+    def __init__(self, graph_file):
+        self.file = graph_file
+        self.path = graph_file.path
+        self.version = graph_file.version
+        self.heuristic_scale = graph_file.heuristic_scale
+        self.offsets = graph_file.view('offsets')
+        self.targets = graph_file.view('targets')
+        self.weights = graph_file.view('weights')
+        self.lat = graph_file.view('lat')
+        self.lon = graph_file.view('lon')
+
+        names = StringTable(graph_file.view('name_offsets'), graph_file.view('name_order'),
+                            graph_file.view('name_blob'))
+        ids = StringTable(graph_file.view('id_offsets'), graph_file.view('id_order'), graph_file.view('id_blob'))
+        self.index_to_name = names
+        self.index_to_id = ids
+        self.name_to_index = _Lookup(names)
+        self.id_to_name = _Lookup(ids, names.__getitem__)
+        self.nodes = _Nodes(self)
+        self.edges = _Edges(self, graph_file.view('edge_from'), graph_file.view('edge_to'),
+                            graph_file.view('edge_distance'))
+
+    def __len__(self):
+        return len(self.index_to_name)
+
+    @cached_property
+    def located_nodes(self):
+        return tuple(self.nodes[i] for i in range(len(self)) if self.has_coordinates(i))
+
+
+def open_graph(path, verify=True):
+    """Map a graph file and return it as a MappedRoadGraph"""
+    return MappedRoadGraph(GraphFile(path, verify))
+
+
+@click.group()
+def cli():
+    """Convert and inspect binary graph files"""
+
+
+@cli.command()
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.argument('output', type=click.Path(dir_okay=False))
+def convert(source, output):
+    """Convert a map in the JSON schema to a graph file"""
+    with open(source) as f:
+        map_data = json.load(f)
+    digest, skipped = convert_json(map_data, output)
+    graph = open_graph(output)
+    click.echo(f'{len(graph)} nodes, {len(graph.edges)} edges -> {output} (version {digest[:12]})', err=True)
+    if skipped:
+        click.echo(f'{skipped} edge(s) with unknown endpoints left out', err=True)
+
+
+@cli.command()
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def info(path):
+    """Check a graph file's checksum and print its header"""
+    try:
+        graph_file = GraphFile(path)
+    except GraphFileError as e:
+        click.echo(str(e), err=True)
+        sys.exit(1)
+    click.echo(json.dumps({
+        'version': graph_file.version,
+        'format': FORMAT_VERSION,
+        'nodes': graph_file.node_count,
+        'edges': graph_file.edge_count,
+        'arcs': graph_file.arc_count,
+        'heuristic_scale': graph_file.heuristic_scale,
+        'bytes': len(graph_file.mmap),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    cli()
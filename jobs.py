@@ -0,0 +1,116 @@
+"""
+Background job queue
+Runs submitted callables on a worker pool, hands back a job id straight
+away, and reuses the in-flight job when an identical request (same key)
+is submitted again
+"""
+
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Finished jobs remembered for status lookups before the oldest are dropped
+DEFAULT_KEEP = 1000
+
+
+class Job:
+    """One submitted unit of work and its outcome"""
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def as_dict(self):
+        data = {
+            'id': self.id,
+            'status': self.status,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if self.status == FAILED:
+            data['error'] = self.error
+        return data
+
+
+class JobQueue:
+    """Thread pool that tracks jobs by id and deduplicates them by key"""
+
+    def __init__(self, workers=2, keep=DEFAULT_KEEP, name='jobs'):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._jobs = OrderedDict()
+        self._in_flight = {}  # key -> Job
+        self._lock = threading.Lock()
+        self.keep = keep
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Queue fn(job, *args, **kwargs); returns (job, created)
+
+        If a job with the same key is still queued or running it is returned
+        instead and created is False.
+        """
+        with self._lock:
+            job = self._in_flight.get(key)
+            if job is not None:
+                return job, False
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+            self._trim()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job, True
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = DONE
+        except Exception as e:
+            job.error = f'{type(e).__name__}: {e}'
+            job.status = FAILED
+            traceback.print_exc()
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._in_flight.get(job.key) is job:
+                    del self._in_flight[job.key]
+
+    def _trim(self):
+        # Drop the oldest finished jobs; in-flight ones are always kept
+        excess = len(self._jobs) - self.keep
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:excess]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def stats(self):
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return counts
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,126 @@
+"""
+Pre-serialized map data for the Leaflet views
+Payloads are built once per (graph version, bbox, zoom), stored both plain
+and gzipped, and tagged with a content hash for conditional GETs. The bbox
+is widened to whole map tiles first, so panning reuses cached payloads.
+"""
+
+import gzip
+import hashlib
+import json
+import math
+
+from route_cache import LRUCache
+
+# At or above this zoom every node and edge is sent unchanged
+FULL_DETAIL_ZOOM = 14
+# Nodes closer together than this many screen pixels are merged below it
+CLUSTER_PIXELS = 16
+# Screen pixels per map tile; requested boxes are widened to tile edges
+TILE_PIXELS = 256
+# Bytes of cached payloads (plain and gzipped) kept across all versions and views
+CACHE_BYTES = 64 * 1024 * 1024
+
+_payloads = LRUCache(maxsize=CACHE_BYTES, sizeof=lambda payload: payload.size)
+
+
+class MapPayload:
+    """Serialized map JSON with a gzipped copy and a content-hash ETag"""
+
+    def __init__(self, data):
+        self.body = json.dumps(data, separators=(',', ':')).encode()
+        self.gzipped = gzip.compress(self.body, compresslevel=6)
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+    @property
+    def size(self):
+        return len(self.body) + len(self.gzipped)
+
+
+def parse_bbox(value):
+    """Parse 'min_lon,min_lat,max_lon,max_lat' into a tuple, or None"""
+    if not value:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(','))
+    except ValueError:
+        return None
+    if min_lon > max_lon or min_lat > max_lat:
+        return None
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def _degrees_per_pixel(zoom):
+    return 360.0 / (256 * 2 ** max(zoom, 0))
+
+
+def snap_bbox(bbox, zoom=None):
+    """Widen bbox outward to the tile grid of zoom (full detail when None)
+
+    Tiles are a whole number of level-of-detail cells, so the clustering
+    inside the box is the same as for the exact box.
+    """
+    if bbox is None:
+        return None
+    tile = _degrees_per_pixel(FULL_DETAIL_ZOOM if zoom is None else zoom) * TILE_PIXELS
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return (math.floor(min_lon / tile) * tile, math.floor(min_lat / tile) * tile,
+            math.ceil(max_lon / tile) * tile, math.ceil(max_lat / tile) * tile)
+
+
+def _in_bbox(node, bbox):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return min_lon <= node['lon'] <= max_lon and min_lat <= node['lat'] <= max_lat
+
+
+def build_map_data(graph, bbox=None, zoom=None):
+    """Nodes and edges for the map, clipped to bbox and simplified for zoom"""
+    nodes = {node['id']: node for node in graph.located_nodes}
+    edges = [edge for edge in graph.edges if edge.get('from') in nodes and edge.get('to') in nodes]
+
+    if bbox is not None:
+        # Keep edges touching the box, plus the far endpoint so lines still draw
+        edges = [edge for edge in edges if _in_bbox(nodes[edge['from']], bbox) or _in_bbox(nodes[edge['to']], bbox)]
+        keep = {node_id for node_id, node in nodes.items() if _in_bbox(node, bbox)}
+        keep.update(edge['from'] for edge in edges)
+        keep.update(edge['to'] for edge in edges)
+        nodes = {node_id: nodes[node_id] for node_id in keep}
+
+    if zoom is not None and zoom < FULL_DETAIL_ZOOM:
+        # Level of detail: snap nodes to a grid about CLUSTER_PIXELS wide on
+        # screen, keep one node per cell and one edge per pair of cells
+        cell = _degrees_per_pixel(zoom) * CLUSTER_PIXELS
+        representative = {}
+        cell_node = {}
+        for node_id, node in nodes.items():
+            key = (int(node['lon'] // cell), int(node['lat'] // cell))
+            representative[node_id] = cell_node.setdefault(key, node_id)
+        simplified = {}
+        for edge in edges:
+            a, b = representative[edge['from']], representative[edge['to']]
+            if a == b:
+                continue
+            pair = (a, b) if a < b else (b, a)
+            if pair not in simplified:
+                simplified[pair] = {'from': a, 'to': b, 'distance': edge.get('distance')}
+        nodes = {node_id: nodes[node_id] for node_id in set(cell_node.values())}
+        edges = list(simplified.values())
+
+    return {
+        'version': graph.version,
+        'nodes': [{'id': n['id'], 'name': n['name'], 'lat': n['lat'], 'lon': n['lon']} for n in nodes.values()],
+        'edges': [{'from': e['from'], 'to': e['to'], 'distance': e.get('distance')} for e in edges],
+    }
+
+
+def get_map_payload(graph, bbox=None, zoom=None):
+    """Return the cached MapPayload for a graph version, bbox and zoom"""
+    if zoom is not None and zoom >= FULL_DETAIL_ZOOM:
+        zoom = None
+    bbox = snap_bbox(bbox, zoom)
+    key = (graph.version, bbox, zoom)
+    payload = _payloads.get(key)
+    if payload is None:
+        payload = MapPayload(build_map_data(graph, bbox, zoom))
+        _payloads.put(key, payload)
+    return payload
@@ -0,0 +1,248 @@
+"""
+Pooled client for the native routing engine
+Keeps a few `routing_engine --serve` processes warm, sends them batched
+newline-delimited JSON queries, and falls back to the Python router in
+routing.py whenever the binary is missing or fails, or the engine was
+started against a different map version than the caller's graph
+"""
+
+import json
+import os
+import selectors
+import subprocess
+import threading
+import time
+
+from delivery_planner import distance_matrix
+from road_graph import MAP_FILE, get_graph
+from routing import INF, SearchStats, nearest_targets, shortest_path
+
+ENGINE_BINARY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'routing_engine')
+# Consecutive engine crashes after which the pool stops trying
+MAX_FAILURES = 3
+# Seconds an engine may take to answer one request line before it is killed
+REQUEST_TIMEOUT = 30.0
+
+
+class EngineError(Exception):
+    """The engine process died, hung or answered with something unreadable"""
+
+
+class EngineProcess:
+    """One warm `routing_engine --serve` process loaded with a map version"""
+
+    def __init__(self, binary, map_path, version):
+        self.version = version
+        self.proc = subprocess.Popen(
+            [binary, '--serve', '--map', map_path],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.proc.stdout, selectors.EVENT_READ)
+
+    def request(self, payload, timeout=REQUEST_TIMEOUT):
+        """Send one request line and return the decoded response line
+
+        A process that has not answered within timeout seconds is killed.
+        """
+        try:
+            self.proc.stdin.write(json.dumps(payload).encode('utf-8') + b'\n')
+            self.proc.stdin.flush()
+            line = self._readline(time.monotonic() + timeout)
+        except OSError as e:
+            raise EngineError(str(e))
+        try:
+            return json.loads(line)
+        except ValueError:
+            raise EngineError('unreadable response')
+
+    def _readline(self, deadline):
+        # Read the raw pipe so select() never misses data held in a buffer
+        fd = self.proc.stdout.fileno()
+        pieces = []
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._selector.select(remaining):
+                self.kill()
+                raise EngineError('engine timed out')
+            piece = os.read(fd, 65536)
+            if not piece:
+                raise EngineError('engine exited')
+            pieces.append(piece)
+            if b'\n' in piece:
+                return b''.join(pieces).split(b'\n', 1)[0]
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def kill(self):
+        self.proc.kill()
+        self.proc.wait()
+
+    def close(self):
+        if self.alive():
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=1)
+            except (OSError, subprocess.TimeoutExpired):
+                self.kill()
+        self._selector.close()
+
+
+class NativeRouter:
+    """Routing calls served by a pool of engine processes
+
+    The methods take the same RoadGraph and node names as routing.py and
+    return the same shapes, so callers can swap one for the other.
+    """
+
+    def __init__(self, binary=ENGINE_BINARY, map_path=MAP_FILE, processes=2, timeout=REQUEST_TIMEOUT):
+        self.binary = binary
+        self.map_path = os.path.abspath(map_path)
+        self.processes = processes
+        self.timeout = timeout
+        self.native_calls = 0
+        self.fallback_calls = 0
+        self._failures = 0
+        self._idle = []
+        # Guards _idle and the counters; request threads share the pool
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(processes, 1))
+
+    @property
+    def available(self):
+        # The engine only reads the JSON map, not binary graph files
+        return (self.processes > 0 and self._failures < MAX_FAILURES
+                and self.map_path.endswith('.json') and os.access(self.binary, os.X_OK))
+
+    def _fallback(self, failed=False):
+        with self._lock:
+            self.fallback_calls += 1
+            if failed:
+                self._failures += 1
+        return None
+
+    def _call(self, graph, payload):
+        """Send payload to a warm engine for graph, or return None to fall back"""
+        if not self.available:
+            return self._fallback()
+        with self._slots:
+            with self._lock:
+                engine = self._idle.pop() if self._idle else None
+            if engine is not None and (engine.version != graph.version or not engine.alive()):
+                engine.close()
+                engine = None
+            if engine is None:
+                # Only start an engine for the graph the map file holds now
+                if get_graph(self.map_path).version != graph.version:
+                    return self._fallback()
+                try:
+                    engine = EngineProcess(self.binary, self.map_path, graph.version)
+                except OSError:
+                    return self._fallback(failed=True)
+            try:
+                response = engine.request(payload, self.timeout)
+            except EngineError:
+                engine.close()
+                return self._fallback(failed=True)
+            with self._lock:
+                self._failures = 0
+                self._idle.append(engine)
+        if 'error' in response:
+            return self._fallback()
+        with self._lock:
+            self.native_calls += 1
+        return response
+
+    @staticmethod
+    def _node_id(graph, name):
+        return graph.nodes[graph.name_to_index[name]]['id']
+
+    @staticmethod
+    def _names(graph, ids):
+        return [graph.id_to_name[node_id] for node_id in ids]
+
+    def shortest_paths(self, graph, pairs, algorithm='astar'):
+        """(distance, path) for each (start, end) pair, in one engine round trip"""
+        pairs = list(pairs)
+        known = [(a, b) for a, b in pairs if a in graph and b in graph]
+        response = None
+        if known:
+            response = self._call(graph, {'op': 'batch', 'queries': [
+                {'from': self._node_id(graph, a), 'to': self._node_id(graph, b), 'algorithm': algorithm}
+                for a, b in known
+            ]})
+        if response is None or any('error' in r for r in response['results']):
+            return [tuple(shortest_path(graph, a, b, algorithm)[:2]) for a, b in pairs]
+        found = {}
+        for (a, b), result in zip(known, response['results']):
+            distance = result['distance']
+            found[a, b] = (INF, []) if distance is None else (distance, self._names(graph, result['path']))
+        return [found.get(pair, (INF, [])) for pair in pairs]
+
+    def _ranked(self, graph, result, with_paths):
+        ranked = []
+        for item in result['ranked']:
+            # routing.nearest_targets paths run from the target back to source
+            path = self._names(graph, reversed(item['path'])) if with_paths else None
+            ranked.append((graph.id_to_name[item['target']], item['distance'], path))
+        return ranked
+
+    def nearest_targets_many(self, graph, sources, targets, with_paths=True):
+        """{source: ranked} for several sources against one target set, batched"""
+        sources = list(dict.fromkeys(sources))
+        known = [s for s in sources if s in graph]
+        target_ids = [self._node_id(graph, t) for t in targets if t in graph]
+        response = None
+        if known and target_ids:
+            response = self._call(graph, {'op': 'batch', 'queries': [
+                {'op': 'nearest', 'from': self._node_id(graph, s), 'targets': target_ids, 'paths': with_paths}
+                for s in known
+            ]})
+        if response is None or any('error' in r for r in response['results']):
+            return {s: nearest_targets(graph, s, targets, with_paths)[0] for s in sources}
+        ranking = {s: [] for s in sources}
+        for source, result in zip(known, response['results']):
+            ranking[source] = self._ranked(graph, result, with_paths)
+        return ranking
+
+    def nearest_targets(self, graph, source, targets, with_paths=True):
+        """Drop-in for routing.nearest_targets; returns (ranked, stats)"""
+        if source not in graph:
+            return [], SearchStats('native')
+        target_ids = [self._node_id(graph, t) for t in targets if t in graph]
+        if not target_ids:
+            return [], SearchStats('native')
+        response = self._call(graph, {'op': 'nearest', 'from': self._node_id(graph, source),
+                                      'targets': target_ids, 'paths': with_paths})
+        if response is None:
+            return nearest_targets(graph, source, targets, with_paths)
+        return self._ranked(graph, response, with_paths), SearchStats('native')
+
+    def distance_matrix(self, graph, points):
+        """Road distances between every pair of node names (INF if unreachable)"""
+        response = None
+        if points:
+            response = self._call(graph, {'op': 'matrix', 'points': [
+                self._node_id(graph, p) if p in graph else '' for p in points
+            ]})
+        if response is None:
+            return distance_matrix(graph, points)
+        return [[INF if d is None else d for d in row] for row in response['distances']]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'available': self.available,
+                'processes': self.processes,
+                'warm': len(self._idle),
+                'native_calls': self.native_calls,
+                'fallback_calls': self.fallback_calls,
+            }
+
+    def close(self):
+        """Stop every idle engine process"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for engine in idle:
+            engine.close()
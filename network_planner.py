@@ -0,0 +1,188 @@
+"""
+Network-wide batch planning across processes
+Fans per-warehouse plans out over a ProcessPoolExecutor. The road graph's
+CSR arrays and node names are copied once into a shared memory block that
+every worker maps read-only, so tasks only carry their own deliveries. A
+graph loaded from a binary graph file is already shareable: workers map
+the same file instead.
+"""
+
+import math
+import os
+import struct
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+from delivery_planner import DEFAULT_TIME_BUDGET, plan_fleet, plan_route
+from graph_file import MappedRoadGraph, open_graph
+
+# n nodes, m arcs, name blob bytes, heuristic scale
+_HEADER = struct.Struct('<qqqd')
+
+
+class GraphView:
+    """Read-only routing view of a RoadGraph backed by a shared buffer
+
+    Provides what routing.py and delivery_planner.py read from a graph:
+    CSR adjacency, radian coordinates and the name/index lookups.
+    """
+
+    def __init__(self, buf, version):
+        self.version = version
+        n, m, blob_len, self.heuristic_scale = _HEADER.unpack_from(buf, 0)
+        pos = _HEADER.size
+        view = memoryview(buf)
+
+        def take(typecode, count):
+            nonlocal pos
+            size = count * 8
+            part = view[pos:pos + size].cast(typecode)
+            pos += size
+            return part
+
+        self.offsets = take('q', n + 1)
+        self.targets = take('q', m)
+        self.weights = take('d', m)
+        self.lat = take('d', n)
+        self.lon = take('d', n)
+        name_offsets = take('q', n + 1)
+        blob = bytes(view[pos:pos + blob_len])
+        self.index_to_name = tuple(blob[name_offsets[i]:name_offsets[i + 1]].decode() for i in range(n))
+        self.name_to_index = {name: i for i, name in enumerate(self.index_to_name)}
+
+    def __contains__(self, name):
+        return name in self.name_to_index
+
+    def __len__(self):
+        return len(self.index_to_name)
+
+    def has_coordinates(self, index):
+        return not math.isnan(self.lat[index])
+
+
+class SharedGraph:
+    """A RoadGraph copied into a named shared memory block"""
+
+    def __init__(self, graph):
+        names = [name.encode() for name in graph.index_to_name]
+        name_offsets = array('q', [0]) * (len(names) + 1)
+        for i, name in enumerate(names):
+            name_offsets[i + 1] = name_offsets[i] + len(name)
+        blob = b''.join(names)
+        parts = [graph.offsets, graph.targets, graph.weights, graph.lat, graph.lon, name_offsets]
+        size = _HEADER.size + sum(len(part) * 8 for part in parts) + len(blob)
+
+        self.version = graph.version
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        _HEADER.pack_into(self.shm.buf, 0, len(graph), len(graph.targets), len(blob), graph.heuristic_scale)
+        pos = _HEADER.size
+        for part in parts:
+            data = part.tobytes()
+            self.shm.buf[pos:pos + len(data)] = data
+            pos += len(data)
+        self.shm.buf[pos:pos + len(blob)] = blob
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+_worker = {}
+
+
+def _init_worker(shm_name, version):
+    # Spawned workers share the parent's resource tracker, so attaching here
+    # does not hand ownership of the block to the worker
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker['shm'] = shm  # keep the mapping alive for the worker's lifetime
+    _worker['graph'] = GraphView(shm.buf, version)
+
+
+def _init_mapped_worker(path, version):
+    # The parent already verified the checksum, so only compare versions
+    graph = open_graph(path, verify=False)
+    if graph.version != version:
+        raise RuntimeError(f'{path} changed while planning')
+    _worker['graph'] = graph
+
+
+def plan_warehouse(graph, task):
+    """Plan one warehouse task dict; returns the task's id, name and plan"""
+    started = time.perf_counter()
+    time_budget = task.get('time_budget', DEFAULT_TIME_BUDGET)
+    if task.get('vehicles'):
+        plan = plan_fleet(graph, task['name'], task['deliveries'], task['vehicles'], task.get('capacity'),
+                          time_budget=time_budget)
+    else:
+        plan = plan_route(graph, task['name'], [d['address'] for d in task['deliveries']],
+                          time_budget=time_budget)
+    return {
+        'warehouse_id': task['warehouse_id'],
+        'name': task['name'],
+        'plan': plan,
+        'seconds': time.perf_counter() - started,
+        'pid': os.getpid(),
+    }
+
+
+def _plan_in_worker(task):
+    return plan_warehouse(_worker['graph'], task)
+
+
+def _unplanned(task, result):
+    plan = result['plan']
+    if 'unassigned' in plan:
+        return [dict(item, warehouse=task['name']) for item in plan['unassigned']]
+    skipped = set(plan['skipped'])
+    return [dict(d, warehouse=task['name'], reason='address not reachable on map')
+            for d in task['deliveries'] if d['address'] in skipped]
+
+
+def plan_network(graph, tasks, workers=None):
+    """Plan every warehouse task, in parallel when workers > 1
+
+    tasks are dicts with 'warehouse_id', 'name' (the warehouse's node),
+    'deliveries' ([{'id', 'address', 'weight'}]) and optional 'vehicles',
+    'capacity' and 'time_budget'. Returns one network-wide plan with the
+    per-warehouse plans, totals, unplanned deliveries and timings.
+    """
+    started = time.perf_counter()
+    workers = min(workers or os.cpu_count() or 1, max(len(tasks), 1))
+    # Biggest warehouses first so one long plan does not start last
+    tasks = sorted(tasks, key=lambda task: -len(task['deliveries']))
+    if workers <= 1:
+        results = [plan_warehouse(graph, task) for task in tasks]
+    elif isinstance(graph, MappedRoadGraph):
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                 initializer=_init_mapped_worker, initargs=(graph.path, graph.version)) as pool:
+            results = list(pool.map(_plan_in_worker, tasks))
+    else:
+        shared = SharedGraph(graph)
+        try:
+            # spawn, not fork: the web process has threads and open sockets
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                     initializer=_init_worker, initargs=(shared.name, graph.version)) as pool:
+                results = list(pool.map(_plan_in_worker, tasks))
+        finally:
+            shared.close()
+    unplanned = [item for task, result in zip(tasks, results) for item in _unplanned(task, result)]
+    results.sort(key=lambda result: result['warehouse_id'])
+
+    network = {
+        'version': graph.version,
+        'warehouses': results,
+        'total_distance': sum(result['plan']['total_distance'] for result in results),
+        'route_path_edges': [edge for result in results for edge in result['plan']['route_path_edges']],
+        'unplanned': unplanned,
+        'workers': workers,
+        'wall_seconds': time.perf_counter() - started,
+        'cpu_seconds': sum(result['seconds'] for result in results),
+    }
+    network['planned_orders'] = sum(len(task['deliveries']) for task in tasks) - len(network['unplanned'])
+    return network
@@ -0,0 +1,356 @@
+"""
+Streaming OpenStreetMap importer
+Builds the routing graph from a local .osm XML extract in two streaming
+passes, so memory grows with the drivable road network rather than with
+the file:
+
+1. ways: keep drivable highways and record their node references
+2. nodes: keep coordinates (and name tags) of referenced nodes only
+
+Intermediate way nodes are then dropped, edge lengths are summed with
+haversine along the original geometry, and chains of degree-2 nodes are
+merged into single edges. The graph is undirected like the rest of the
+app, so oneway tags are ignored.
+
+    python osm_import.py dehradun.osm -o real_map_with_distances.json
+    python osm_import.py dehradun.osm -o dehradun.graph --format binary
+"""
+
+import json
+import math
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from array import array
+from bisect import bisect_left
+from heapq import merge
+
+import click
+
+from graph_file import write_graph
+from road_graph import haversine_km
+
+# highway=* values a delivery vehicle can use
+DRIVABLE_HIGHWAYS = frozenset({
+    'motorway', 'motorway_link', 'trunk', 'trunk_link', 'primary', 'primary_link',
+    'secondary', 'secondary_link', 'tertiary', 'tertiary_link', 'unclassified',
+    'residential', 'living_street', 'service', 'road',
+})
+NO_ACCESS = frozenset({'no', 'private'})
+# Node references sorted per run before merging, bounding the Python list
+# sorted() builds to this many ints
+SORT_RUN = 1 << 18
+
+
+def is_drivable(tags):
+    """Whether a way's tags describe a road open to motor vehicles"""
+    if tags.get('highway') not in DRIVABLE_HIGHWAYS:
+        return False
+    if tags.get('area') == 'yes':
+        return False
+    for key in ('access', 'motor_vehicle', 'vehicle'):
+        if tags.get(key) in NO_ACCESS:
+            return False
+    return True
+
+
+def iter_elements(path, tag):
+    """Yield each top-level <tag> element, freeing everything parsed so far"""
+    context = ET.iterparse(path, events=('start', 'end'))
+    _, root = next(context)
+    depth = 1
+    for event, elem in context:
+        if event == 'start':
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            if elem.tag == tag:
+                yield elem
+            # Drop the element and every earlier sibling the root still holds
+            root.clear()
+
+
+def _tags(elem):
+    return {child.get('k'): child.get('v') for child in elem.iter('tag')}
+
+
+class OsmGraph:
+    """Road graph extracted from an OSM file, held in flat arrays"""
+
+    def __init__(self):
+        self.ids = []
+        self.names = []
+        self.lat = array('d')
+        self.lon = array('d')
+        self.edge_from = array('q')
+        self.edge_to = array('q')
+        self.edge_distance = array('d')
+        self.stats = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _read_ways(path):
+    # Node references of drivable ways, flattened, plus per-way offsets
+    refs = array('q')
+    way_offsets = array('q', [0])
+    for elem in iter_elements(path, 'way'):
+        if not is_drivable(_tags(elem)):
+            continue
+        nodes = [int(nd.get('ref')) for nd in elem.iter('nd')]
+        if len(nodes) < 2:
+            continue
+        refs.extend(nodes)
+        way_offsets.append(len(refs))
+    return refs, way_offsets
+
+
+def _sorted_in_runs(values):
+    # Sort an array in place one SORT_RUN slice at a time and iterate the
+    # merged runs, so the whole array never becomes a list of ints
+    for start in range(0, len(values), SORT_RUN):
+        values[start:start + SORT_RUN] = array(values.typecode, sorted(values[start:start + SORT_RUN]))
+    view = memoryview(values)
+    return merge(*(view[start:start + SORT_RUN] for start in range(0, len(values), SORT_RUN)))
+
+
+def _count_uses(refs, way_offsets):
+    # Sorted distinct node ids and how often ways use each; way endpoints
+    # count twice so that "used at least twice" means "must stay a node"
+    ends = array('q')
+    for w in range(len(way_offsets) - 1):
+        ends.append(refs[way_offsets[w]])
+        ends.append(refs[way_offsets[w + 1] - 1])
+    unique, uses = array('q'), array('q')
+    for node_id in _sorted_in_runs(refs + ends):
+        if unique and unique[-1] == node_id:
+            uses[-1] += 1
+        else:
+            unique.append(node_id)
+            uses.append(1)
+    return unique, uses
+
+
+def _index(unique, node_id):
+    i = bisect_left(unique, node_id)
+    return i if i < len(unique) and unique[i] == node_id else -1
+
+
+def _read_nodes(path, unique):
+    # Coordinates and name tags for referenced nodes only
+    lat = array('d', [math.nan]) * len(unique)
+    lon = array('d', [math.nan]) * len(unique)
+    names = {}
+    for elem in iter_elements(path, 'node'):
+        i = _index(unique, int(elem.get('id')))
+        if i < 0:
+            continue
+        lat[i] = float(elem.get('lat'))
+        lon[i] = float(elem.get('lon'))
+        name = _tags(elem).get('name')
+        if name:
+            names[i] = name
+    return lat, lon, names
+
+
+def _way_edges(refs, way_offsets, unique, keep, lat, lon):
+    # Edges between kept nodes along each way, summing the geometry between
+    # them; nodes missing from the extract split the way
+    edge_u, edge_v, edge_length = array('q'), array('q'), array('d')
+    for w in range(len(way_offsets) - 1):
+        start, prev, length = -1, -1, 0.0
+        for k in range(way_offsets[w], way_offsets[w + 1]):
+            i = _index(unique, refs[k])
+            if math.isnan(lat[i]):
+                start, prev, length = -1, -1, 0.0
+                continue
+            if prev >= 0:
+                length += haversine_km(lat[prev], lon[prev], lat[i], lon[i])
+            if start < 0:
+                start, length = i, 0.0
+            elif keep[i]:
+                if i != start:
+                    edge_u.append(min(start, i))
+                    edge_v.append(max(start, i))
+                    edge_length.append(length)
+                start, length = i, 0.0
+            prev = i
+    return _unique_edges(len(unique), edge_u, edge_v, edge_length)
+
+
+def _incidence(size, edge_u, edge_v):
+    # Edge indexes touching each node, grouped with a counting sort: node
+    # i's edges are slots[offsets[i]:offsets[i + 1]]
+    offsets = array('q', [0]) * (size + 1)
+    for u, v in zip(edge_u, edge_v):
+        offsets[u + 1] += 1
+        offsets[v + 1] += 1
+    for i in range(size):
+        offsets[i + 1] += offsets[i]
+    fill = offsets[:-1]
+    slots = array('q', [0]) * offsets[size]
+    for e, (u, v) in enumerate(zip(edge_u, edge_v)):
+        slots[fill[u]] = e
+        fill[u] += 1
+        slots[fill[v]] = e
+        fill[v] += 1
+    return offsets, slots
+
+
+def _unique_edges(size, edge_u, edge_v, edge_length):
+    # Parallel (u, v, length) arrays with u < v keeping the shortest edge
+    # per node pair, ordered by (u, v)
+    offsets, slots = _incidence(size, edge_u, edge_v)
+    out_u, out_v, out_length = array('q'), array('q'), array('d')
+    for u in range(size):
+        shortest = {}
+        for k in range(offsets[u], offsets[u + 1]):
+            e = slots[k]
+            if edge_u[e] == u and edge_length[e] < shortest.get(edge_v[e], math.inf):
+                shortest[edge_v[e]] = edge_length[e]
+        for v in sorted(shortest):
+            out_u.append(u)
+            out_v.append(v)
+            out_length.append(shortest[v])
+    return out_u, out_v, out_length
+
+
+def _compress_chains(size, edges, pinned):
+    # Merge runs of degree-2 nodes into single edges; pinned nodes always stay
+    edge_u, edge_v, edge_length = edges
+    offsets, slots = _incidence(size, edge_u, edge_v)
+
+    def through(node):
+        return offsets[node + 1] - offsets[node] == 2 and not pinned(node)
+
+    walked = bytearray(len(edge_u))
+    out_u, out_v, out_length = array('q'), array('q'), array('d')
+    for u in range(size):
+        if offsets[u] == offsets[u + 1] or through(u):
+            continue
+        for k in range(offsets[u], offsets[u + 1]):
+            e = slots[k]
+            if walked[e]:
+                continue
+            walked[e] = 1
+            node = edge_v[e] if edge_u[e] == u else edge_u[e]
+            length = edge_length[e]
+            while through(node):
+                first = slots[offsets[node]]
+                e = slots[offsets[node] + 1] if first == e else first
+                walked[e] = 1
+                node = edge_v[e] if edge_u[e] == node else edge_u[e]
+                length += edge_length[e]
+            if node != u:
+                out_u.append(min(u, node))
+                out_v.append(max(u, node))
+                out_length.append(length)
+    # Closed loops made only of degree-2 nodes carry no route and are dropped
+    return _unique_edges(size, out_u, out_v, out_length)
+
+
+def import_osm(path, compress=True, log=None):
+    """Read an .osm XML file and return an OsmGraph of its drivable roads"""
+    started = time.perf_counter()
+    refs, way_offsets = _read_ways(path)
+    unique, uses = _count_uses(refs, way_offsets)
+    if log:
+        log(f'{len(way_offsets) - 1} drivable ways referencing {len(unique)} nodes')
+    lat, lon, names = _read_nodes(path, unique)
+
+    # Junctions, way ends and named places stay; other way nodes only shape edges
+    keep = bytearray(1 if count >= 2 else 0 for count in uses)
+    for i in names:
+        keep[i] = 1
+    edges = _way_edges(refs, way_offsets, unique, keep, lat, lon)
+    del refs, way_offsets
+    if compress:
+        edges = _compress_chains(len(unique), edges, lambda i: i in names)
+    edge_u, edge_v, edge_length = edges
+
+    graph = OsmGraph()
+    index = {}
+    taken = set()
+    # Edges come ordered by (u, v), which numbers the nodes as they appear
+    for u, v in zip(edge_u, edge_v):
+        for i in (u, v):
+            if i in index:
+                continue
+            index[i] = len(graph.ids)
+            node_id = str(unique[i])
+            name = names.get(i) or f'node {node_id}'
+            if name in taken:
+                name = f'{name} ({node_id})'
+            taken.add(name)
+            graph.ids.append(node_id)
+            graph.names.append(name)
+            graph.lat.append(lat[i])
+            graph.lon.append(lon[i])
+    for u, v, length in zip(edge_u, edge_v, edge_length):
+        graph.edge_from.append(index[u])
+        graph.edge_to.append(index[v])
+        graph.edge_distance.append(length)
+    graph.stats = {
+        'nodes': len(graph),
+        'edges': len(graph.edge_from),
+        'named_nodes': sum(1 for i in names if i in index),
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+    return graph
+
+
+def write_json(graph, path, precision=4):
+    """Write graph in the real_map_with_distances.json schema, one node at a time"""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        f.write('{\n  "nodes": [')
+        for i in range(len(graph)):
+            node = {'id': graph.ids[i], 'name': graph.names[i],
+                    'lat': round(graph.lat[i], 7), 'lon': round(graph.lon[i], 7)}
+            f.write((',' if i else '') + '\n    ' + json.dumps(node))
+        f.write('\n  ],\n  "edges": [')
+        for k in range(len(graph.edge_from)):
+            edge = {'from': graph.ids[graph.edge_from[k]], 'to': graph.ids[graph.edge_to[k]],
+                    'distance': round(graph.edge_distance[k], precision)}
+            f.write((',' if k else '') + '\n    ' + json.dumps(edge))
+        f.write('\n  ]\n}\n')
+    os.replace(tmp, path)
+
+
+def _peak_memory_mib():
+    """Peak resident memory of this process in MiB, or None where unknown"""
+    try:
+        import resource  # POSIX only
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+@click.command()
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.option('--output', '-o', required=True, type=click.Path(dir_okay=False), help='Graph file to write.')
+@click.option('--format', 'fmt', default='json', show_default=True, type=click.Choice(['json', 'binary']),
+              help='The app\'s JSON map schema, or the compact binary graph file.')
+@click.option('--no-compress', is_flag=True, help='Keep degree-2 nodes between junctions.')
+def main(source, output, fmt, no_compress):
+    """Import drivable roads from an OSM XML extract"""
+    graph = import_osm(source, compress=not no_compress, log=lambda message: click.echo(message, err=True))
+    if fmt == 'binary':
+        write_graph(output, graph.ids, graph.names, graph.lat, graph.lon,
+                    graph.edge_from, graph.edge_to, graph.edge_distance)
+    else:
+        write_json(graph, output)
+    peak = _peak_memory_mib()
+    stats = graph.stats
+    memory = f', peak memory {peak:.0f} MiB' if peak is not None else ''
+    click.echo(f"{stats['nodes']} nodes, {stats['edges']} edges ({stats['named_nodes']} named) "
+               f"in {stats['seconds']}s{memory} -> {output}", err=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Shared road graph for the logistics network
+Loads real_map_with_distances.json once per process and rebuilds it only
+when the file changes on disk. MAP_FILE may also point at a binary graph
+file (see graph_file.py), which is mapped instead of parsed.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+from array import array
+from types import MappingProxyType
+
+MAP_FILE = os.environ.get('MAP_FILE', 'real_map_with_distances.json')
+EARTH_RADIUS_KM = 6371.0
+
+
+class RoadGraph:
+    """Immutable road network with prebuilt lookup tables and adjacency"""
+
+    def __init__(self, map_data, version):
+        self.version = version
+        self.nodes = tuple(map_data.get('nodes', []))
+        self.edges = tuple(map_data.get('edges', []))
+
+        # Index lookups
+        self.id_to_name = MappingProxyType({node['id']: node['name'] for node in self.nodes})
+        self.name_to_index = MappingProxyType({node['name']: i for i, node in enumerate(self.nodes)})
+        self.index_to_name = tuple(node['name'] for node in self.nodes)
+
+        # Undirected arcs by node index, skipping edges with no distance
+        arcs = []
+        for edge in self.edges:
+            from_name = self.id_to_name.get(edge.get('from'))
+            to_name = self.id_to_name.get(edge.get('to'))
+            distance = edge.get('distance')
+            if from_name is None or to_name is None or distance is None:
+                continue
+            u = self.name_to_index[from_name]
+            v = self.name_to_index[to_name]
+            arcs.append((u, v, float(distance)))
+            arcs.append((v, u, float(distance)))
+        arcs.sort()
+
+        # Compressed sparse row adjacency: the neighbors of node i are
+        # targets[offsets[i]:offsets[i + 1]] with matching weights
+        n = len(self.nodes)
+        self.offsets = array('q', [0]) * (n + 1)
+        for u, _, _ in arcs:
+            self.offsets[u + 1] += 1
+        for i in range(n):
+            self.offsets[i + 1] += self.offsets[i]
+        self.targets = array('q', (v for _, v, _ in arcs))
+        self.weights = array('d', (w for _, _, w in arcs))
+
+        # Coordinates in radians (NaN when a node has no lat/lon)
+        self.lat = array('d', (_radians(node.get('lat')) for node in self.nodes))
+        self.lon = array('d', (_radians(node.get('lon')) for node in self.nodes))
+
+        # Scale that keeps the straight-line heuristic admissible even when
+        # an edge is recorded shorter than the great-circle distance
+        self.heuristic_scale = admissible_scale(arcs, self.lat, self.lon)
+
+        # Nodes with usable coordinates, used by the map views
+        self.located_nodes = tuple(
+            node for node in self.nodes
+            if isinstance(node, dict)
+            and isinstance(node.get('lat'), (float, int))
+            and isinstance(node.get('lon'), (float, int))
+        )
+
+    def __contains__(self, name):
+        return name in self.name_to_index
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def neighbors(self, name):
+        """Return (neighbor_name, distance) pairs for a node name"""
+        index = self.name_to_index[name]
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return [(self.index_to_name[self.targets[i]], self.weights[i]) for i in range(start, end)]
+
+    def has_coordinates(self, index):
+        """Check if the node at index has a usable lat/lon"""
+        return not math.isnan(self.lat[index])
+
+
+def _radians(value):
+    if isinstance(value, (float, int)):
+        return math.radians(value)
+    return math.nan
+
+
+def haversine_rad(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between two points given in radians"""
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def admissible_scale(arcs, lat, lon):
+    """Largest factor <= 1 by which straight-line distance never overestimates
+
+    arcs are (u, v, km) with lat/lon in radians (NaN when unknown).
+    """
+    scale = 1.0
+    for u, v, w in arcs:
+        if math.isnan(lat[u]) or math.isnan(lat[v]):
+            continue
+        straight = haversine_rad(lat[u], lon[u], lat[v], lon[v])
+        if straight > 0 and w < straight * scale:
+            scale = w / straight
+    return scale
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between two points given in degrees"""
+    return haversine_rad(math.radians(lat1), math.radians(lon1), math.radians(lat2), math.radians(lon2))
+
+
+_lock = threading.Lock()
+_cache = {}  # path -> (stat_key, RoadGraph)
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def get_graph(path=MAP_FILE):
+    """Return the shared RoadGraph for path, reloading it if the file changed"""
+    path = os.path.abspath(path)
+    stat_key = _stat_key(path)
+    cached = _cache.get(path)
+    if cached and cached[0] == stat_key:
+        return cached[1]
+
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == stat_key:
+            return cached[1]
+
+        # graph_file builds on this module, so it is imported here
+        from graph_file import is_graph_file, open_graph
+        if is_graph_file(path):
+            graph = open_graph(path)
+            if cached and cached[1].version == graph.version:
+                graph = cached[1]
+        else:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            version = hashlib.sha1(raw).hexdigest()
+
+            # Touched but unchanged file: keep the graph, remember the new stat
+            if cached and cached[1].version == version:
+                graph = cached[1]
+            else:
+                graph = RoadGraph(json.loads(raw), version)
+
+        # Swap in a single assignment so readers never see a partial graph
+        _cache[path] = (stat_key, graph)
+        return graph
@@ -0,0 +1,162 @@
+"""
+Route cache for computed shortest paths
+An in-process LRU sits in front of an optional persistent tier (the Route
+table in app.py). Keys include the road graph version, so editing the map
+file makes older entries unreachable.
+"""
+
+import threading
+from collections import OrderedDict
+
+from routing import shortest_path
+
+DEFAULT_MAXSIZE = 4096
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit/miss counters
+
+    maxsize bounds the number of entries, or the summed sizeof(value) of
+    the entries when sizeof is given.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, sizeof=None):
+        self.maxsize = maxsize
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.total = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _weight(self, value):
+        return self.sizeof(value) if self.sizeof is not None else 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self.total -= self._weight(self._data[key])
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self.total += self._weight(value)
+            # A value bigger than the whole budget evicts itself too
+            while self.total > self.maxsize:
+                self.total -= self._weight(self._data.popitem(last=False)[1])
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.total = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        stats = {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+        if self.sizeof is not None:
+            stats['total'] = self.total
+        return stats
+
+
+class RouteCache:
+    """Two-tier cache of (distance, path) keyed by graph version and endpoints
+
+    load(version, pairs) -> {(start, end): (distance, path)} and
+    store(version, [(start, end, distance, path)]) are the persistent tier,
+    each called once per batch; either may be None to run memory-only.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, load=None, store=None):
+        self.memory = LRUCache(maxsize)
+        self.load = load
+        self.store = store
+        self.persistent_hits = 0
+        self.computed = 0
+
+    def get_many(self, version, pairs):
+        """{(start, end): (distance, path)} for the cached pairs
+
+        Memory misses go to the persistent tier in a single lookup.
+        """
+        found = {}
+        missing = []
+        for start, end in pairs:
+            route = self.memory.get((version, start, end))
+            if route is None:
+                missing.append((start, end))
+            else:
+                found[(start, end)] = route
+        if missing and self.load is not None:
+            for (start, end), route in self.load(version, missing).items():
+                self.persistent_hits += 1
+                self.memory.put((version, start, end), route)
+                found[(start, end)] = route
+        return found
+
+    def get(self, version, start, end):
+        """Return a cached (distance, path) or None"""
+        return self.get_many(version, [(start, end)]).get((start, end))
+
+    def put_many(self, version, routes):
+        """Cache (start, end, distance, path) tuples, persisting them in one write"""
+        routes = self.persist(version, routes)
+        self.remember(version, routes)
+
+    def persist(self, version, routes):
+        """Write routes to the persistent tier only; returns them as a list
+
+        For callers inside a transaction, which remember() the routes once
+        it has committed so the memory tier never holds rolled-back rows.
+        """
+        routes = [(start, end, distance, list(path)) for start, end, distance, path in routes]
+        if self.store is not None and routes:
+            self.store(version, routes)
+        return routes
+
+    def remember(self, version, routes):
+        """Put routes in the memory tier only"""
+        for start, end, distance, path in routes:
+            self.memory.put((version, start, end), (distance, list(path)))
+
+    def put(self, version, start, end, distance, path):
+        self.put_many(version, [(start, end, distance, path)])
+
+    def paths(self, graph, pairs):
+        """[(distance, path)] for (start, end) pairs, computing the misses
+
+        One cache lookup for all pairs and one write for every computed
+        route, however many pairs there are.
+        """
+        pairs = list(pairs)
+        found = self.get_many(graph.version, pairs)
+        computed = []
+        for start, end in dict.fromkeys(pairs):
+            if (start, end) in found:
+                continue
+            distance, path, _ = shortest_path(graph, start, end)
+            self.computed += 1
+            found[(start, end)] = (distance, path)
+            if path:
+                computed.append((start, end, distance, path))
+        self.put_many(graph.version, computed)
+        return [found[pair] for pair in pairs]
+
+    def path(self, graph, start, end):
+        """Return (distance, path) between two nodes, computing it on a miss"""
+        return self.paths(graph, [(start, end)])[0]
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats.update(persistent_hits=self.persistent_hits, computed=self.computed)
+        return stats
@@ -0,0 +1,324 @@
+"""
+Shortest-path routing over the shared RoadGraph
+Dijkstra, bidirectional Dijkstra and A* running on the graph's CSR arrays
+"""
+
+from heapq import heappop, heappush
+import math
+import threading
+from array import array
+from collections import namedtuple
+
+from road_graph import EARTH_RADIUS_KM
+
+INF = float('inf')
+
+PathResult = namedtuple('PathResult', ['distance', 'path', 'stats'])
+
+
+class SearchStats:
+    """Work counters for a single routing query"""
+    __slots__ = ('algorithm', 'settled', 'pushes')
+
+    def __init__(self, algorithm):
+        self.algorithm = algorithm
+        self.settled = 0
+        self.pushes = 0
+
+    def as_dict(self):
+        return {'algorithm': self.algorithm, 'settled': self.settled, 'pushes': self.pushes}
+
+    def __repr__(self):
+        return f'SearchStats({self.algorithm}, settled={self.settled}, pushes={self.pushes})'
+
+
+# Called with the SearchStats of every finished search (app.py feeds /metrics)
+search_observers = []
+
+
+def report_search(stats):
+    """Hand a finished search's stats to search_observers; returns stats"""
+    for observe in search_observers:
+        observe(stats)
+    return stats
+
+
+class _Workspace:
+    """Per-thread search arrays reused across queries
+
+    Entries are only valid when stamp[i] equals the current generation, so
+    starting a new search is O(1) instead of re-initialising every node.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.dist = array('d', [INF]) * size
+        self.prev = array('q', [-1]) * size
+        self.stamp = array('q', [0]) * size
+        self.settled = array('q', [0]) * size
+        self.generation = 0
+
+    def reset(self):
+        self.generation += 1
+        return self.generation
+
+
+_local = threading.local()
+
+
+def _workspaces(graph, count=1):
+    """Return count reusable workspaces sized for graph"""
+    size = len(graph)
+    spaces = getattr(_local, 'spaces', None)
+    if not spaces or spaces[0].size != size:
+        spaces = _local.spaces = [_Workspace(size), _Workspace(size)]
+    return spaces[:count]
+
+
+def _reconstruct(graph, ws, target):
+    path = []
+    u = target
+    while u != -1:
+        path.append(graph.index_to_name[u])
+        u = ws.prev[u]
+    path.reverse()
+    return path
+
+
+def _unreachable(stats):
+    return PathResult(INF, [], stats)
+
+
+def dijkstra(graph, source, target):
+    """Shortest path between two node names with plain Dijkstra"""
+    stats = SearchStats('dijkstra')
+    if source not in graph or target not in graph:
+        return _unreachable(stats)
+    s = graph.name_to_index[source]
+    t = graph.name_to_index[target]
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+
+    ws, = _workspaces(graph)
+    gen = ws.reset()
+    dist, prev, stamp = ws.dist, ws.prev, ws.stamp
+    dist[s] = 0.0
+    prev[s] = -1
+    stamp[s] = gen
+    heap = [(0.0, s)]
+    pushes, settled = 1, 0
+
+    found = False
+    while heap:
+        d, u = heappop(heap)
+        if d > dist[u]:
+            continue
+        settled += 1
+        if u == t:
+            found = True
+            break
+        for i in range(offsets[u], offsets[u + 1]):
+            v = targets[i]
+            nd = d + weights[i]
+            if stamp[v] != gen or nd < dist[v]:
+                dist[v] = nd
+                prev[v] = u
+                stamp[v] = gen
+                heappush(heap, (nd, v))
+                pushes += 1
+
+    stats.pushes, stats.settled = pushes, settled
+    if not found:
+        return _unreachable(stats)
+    return PathResult(dist[t], _reconstruct(graph, ws, t), stats)
+
+
+def bidirectional_dijkstra(graph, source, target):
+    """Shortest path searching from both ends until the frontiers meet"""
+    stats = SearchStats('bidirectional')
+    if source not in graph or target not in graph:
+        return _unreachable(stats)
+    s = graph.name_to_index[source]
+    t = graph.name_to_index[target]
+    if s == t:
+        stats.settled = 1
+        return PathResult(0.0, [source], stats)
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+
+    fwd, bwd = _workspaces(graph, 2)
+    gens = (fwd.reset(), bwd.reset())
+    spaces = (fwd, bwd)
+    heaps = ([(0.0, s)], [(0.0, t)])
+    for ws, gen, start in ((fwd, gens[0], s), (bwd, gens[1], t)):
+        ws.dist[start] = 0.0
+        ws.prev[start] = -1
+        ws.stamp[start] = gen
+    pushes, settled = 2, 0
+
+    best = INF
+    meeting = -1
+    while heaps[0] and heaps[1]:
+        # Stop once no shorter connection can be found through either frontier
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        # Expand the smaller frontier
+        side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+        ws, gen, heap = spaces[side], gens[side], heaps[side]
+        other, other_gen = spaces[1 - side], gens[1 - side]
+        dist, prev, stamp = ws.dist, ws.prev, ws.stamp
+        other_dist, other_stamp = other.dist, other.stamp
+
+        d, u = heappop(heap)
+        if d > dist[u]:
+            continue
+        settled += 1
+        for i in range(offsets[u], offsets[u + 1]):
+            v = targets[i]
+            nd = d + weights[i]
+            if stamp[v] != gen or nd < dist[v]:
+                dist[v] = nd
+                prev[v] = u
+                stamp[v] = gen
+                heappush(heap, (nd, v))
+                pushes += 1
+            if other_stamp[v] == other_gen and nd + other_dist[v] < best:
+                best = nd + other_dist[v]
+                meeting = v
+
+    stats.pushes, stats.settled = pushes, settled
+    if meeting == -1:
+        return _unreachable(stats)
+    forward_path = _reconstruct(graph, fwd, meeting)
+    backward_path = _reconstruct(graph, bwd, meeting)
+    backward_path.reverse()
+    return PathResult(best, forward_path + backward_path[1:], stats)
+
+
+def astar(graph, source, target):
+    """Shortest path guided by a great-circle distance heuristic"""
+    stats = SearchStats('astar')
+    if source not in graph or target not in graph:
+        return _unreachable(stats)
+    s = graph.name_to_index[source]
+    t = graph.name_to_index[target]
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    lat, lon = graph.lat, graph.lon
+
+    # Precompute the target-side terms of the haversine formula
+    scale = 2 * EARTH_RADIUS_KM * graph.heuristic_scale
+    t_lat, t_lon = lat[t], lon[t]
+    cos_t = math.cos(t_lat)
+    use_heuristic = not math.isnan(t_lat)
+    sin, cos, asin, sqrt, isnan = math.sin, math.cos, math.asin, math.sqrt, math.isnan
+
+    def heuristic(v):
+        if not use_heuristic or isnan(lat[v]):
+            return 0.0
+        a = sin((t_lat - lat[v]) / 2) ** 2 + cos(lat[v]) * cos_t * sin((t_lon - lon[v]) / 2) ** 2
+        return scale * asin(sqrt(min(a, 1.0)))
+
+    ws, = _workspaces(graph)
+    gen = ws.reset()
+    dist, prev, stamp = ws.dist, ws.prev, ws.stamp
+    dist[s] = 0.0
+    prev[s] = -1
+    stamp[s] = gen
+    heap = [(heuristic(s), 0.0, s)]
+    pushes, settled = 1, 0
+
+    found = False
+    while heap:
+        _, d, u = heappop(heap)
+        if d > dist[u]:
+            continue
+        settled += 1
+        if u == t:
+            found = True
+            break
+        for i in range(offsets[u], offsets[u + 1]):
+            v = targets[i]
+            nd = d + weights[i]
+            if stamp[v] != gen or nd < dist[v]:
+                dist[v] = nd
+                prev[v] = u
+                stamp[v] = gen
+                heappush(heap, (nd + heuristic(v), nd, v))
+                pushes += 1
+
+    stats.pushes, stats.settled = pushes, settled
+    if not found:
+        return _unreachable(stats)
+    return PathResult(dist[t], _reconstruct(graph, ws, t), stats)
+
+
+def nearest_targets(graph, source, targets, with_paths=True):
+    """Rank targets by road distance from source with one Dijkstra search
+
+    The search stops as soon as every reachable target has been settled.
+    Returns (ranked, stats) where ranked is a list of (target, distance,
+    path) sorted by distance, each path running from the target to source
+    (the graph is undirected, so it is also the target's shortest route).
+    With with_paths=False the paths are left as None, which is cheaper when
+    only distances are needed.
+    """
+    stats = SearchStats('multi_target')
+    if source not in graph:
+        return [], stats
+    wanted = {graph.name_to_index[name] for name in targets if name in graph}
+    if not wanted:
+        return [], stats
+    s = graph.name_to_index[source]
+    offsets, targets_arr, weights = graph.offsets, graph.targets, graph.weights
+
+    ws, = _workspaces(graph)
+    gen = ws.reset()
+    dist, prev, stamp, done = ws.dist, ws.prev, ws.stamp, ws.settled
+    dist[s] = 0.0
+    prev[s] = -1
+    stamp[s] = gen
+    heap = [(0.0, s)]
+    pushes, settled = 1, 0
+
+    found = []
+    remaining = len(wanted)
+    while heap:
+        d, u = heappop(heap)
+        if d > dist[u] or done[u] == gen:
+            continue
+        done[u] = gen
+        settled += 1
+        if u in wanted:
+            path = None
+            if with_paths:
+                path = _reconstruct(graph, ws, u)
+                path.reverse()
+            found.append((graph.index_to_name[u], d, path))
+            remaining -= 1
+            if not remaining:
+                break
+        for i in range(offsets[u], offsets[u + 1]):
+            v = targets_arr[i]
+            nd = d + weights[i]
+            if stamp[v] != gen or nd < dist[v]:
+                dist[v] = nd
+                prev[v] = u
+                stamp[v] = gen
+                heappush(heap, (nd, v))
+                pushes += 1
+
+    stats.pushes, stats.settled = pushes, settled
+    # Targets are settled in distance order, so found is already ranked
+    return found, report_search(stats)
+
+
+ALGORITHMS = {
+    'dijkstra': dijkstra,
+    'bidirectional': bidirectional_dijkstra,
+    'astar': astar,
+}
+
+
+def shortest_path(graph, source, target, algorithm='astar'):
+    """Shortest path between two node names using the named algorithm"""
+    result = ALGORITHMS[algorithm](graph, source, target)
+    report_search(result.stats)
+    return result
@@ -2,260 +2,381 @@
 #include <vector>
 #include <queue>
 #include <map>
+#include <set>
 #include <string>
 #include <limits>
 #include <algorithm>
 #include <sstream>
 #include <fstream>
+#include <cmath>
+#include <cstring>
+#include <cstdio>
+#include <unistd.h>
+#include <sys/socket.h>
+#include <sys/un.h>
+#include <memory>
 #include <json/json.h>
 
 using namespace std;
 
+static const double INF = numeric_limits<double>::infinity();
+static const double EARTH_RADIUS_KM = 6371.0;
+static const double DEG_TO_RAD = M_PI / 180.0;
+
 // Structure to represent a node in the graph
 struct Node {
     string id;
     string name;
-    double x, y;
-    
-    Node(string id, string name, double x, double y) 
-        : id(id), name(name), x(x), y(y) {}
-};
+    double lat, lon;  // radians, NaN when the node has no coordinates
 
-// Structure to represent an edge in the graph
-struct Edge {
-    string from, to;
-    double distance;
-    
-    Edge(string from, string to, double distance) 
-        : from(from), to(to), distance(distance) {}
+    Node(string id, string name, double lat, double lon)
+        : id(id), name(name), lat(lat), lon(lon) {}
 };
 
-// Structure for Dijkstra's algorithm
-struct DijkstraNode {
-    string id;
-    double distance;
-    string previous;
-    
-    DijkstraNode(string id, double distance, string previous) 
-        : id(id), distance(distance), previous(previous) {}
-    
-    bool operator>(const DijkstraNode& other) const {
-        return distance > other.distance;
-    }
-};
+// Great-circle distance in km between two points given in radians
+static double haversine(double lat1, double lon1, double lat2, double lon2) {
+    double a = pow(sin((lat2 - lat1) / 2), 2) + cos(lat1) * cos(lat2) * pow(sin((lon2 - lon1) / 2), 2);
+    return 2 * EARTH_RADIUS_KM * asin(sqrt(min(a, 1.0)));
+}
 
 class RoutingEngine {
 private:
-    map<string, Node> nodes;
-    map<string, vector<pair<string, double>>> adjacencyList;
-    
+    vector<Node> nodes;
+    map<string, int> idIndex;
+    map<string, int> nameIndex;
+    vector<vector<pair<int, double>>> adjacencyList;
+    double heuristicScale = 1.0;
+
+    // Search workspace reused between queries, reset with generation stamps
+    vector<double> dist;
+    vector<int> previous;
+    vector<unsigned> stamp;
+    unsigned generation = 0;
+
+    typedef pair<double, int> QueueEntry;
+    typedef priority_queue<QueueEntry, vector<QueueEntry>, greater<QueueEntry>> Queue;
+
+    void resetSearch() {
+        if (dist.size() != nodes.size()) {
+            dist.assign(nodes.size(), INF);
+            previous.assign(nodes.size(), -1);
+            stamp.assign(nodes.size(), 0);
+            generation = 0;
+        }
+        if (++generation == 0) {
+            fill(stamp.begin(), stamp.end(), 0);
+            generation = 1;
+        }
+    }
+
+    double distanceOf(int v) const {
+        return stamp[v] == generation ? dist[v] : INF;
+    }
+
+    void relax(int v, double d, int from) {
+        stamp[v] = generation;
+        dist[v] = d;
+        previous[v] = from;
+    }
+
+    bool hasCoordinates(int v) const {
+        return !std::isnan(nodes[v].lat) && !std::isnan(nodes[v].lon);
+    }
+
+    // Straight-line lower bound, scaled so it never exceeds a road distance
+    double heuristic(int v, int goal) const {
+        if (!hasCoordinates(v) || !hasCoordinates(goal)) {
+            return 0;
+        }
+        return heuristicScale * haversine(nodes[v].lat, nodes[v].lon, nodes[goal].lat, nodes[goal].lon);
+    }
+
+    vector<int> reconstruct(int target) const {
+        vector<int> path;
+        for (int v = target; v != -1; v = previous[v]) {
+            path.push_back(v);
+        }
+        reverse(path.begin(), path.end());
+        return path;
+    }
+
+    void computeHeuristicScale() {
+        heuristicScale = 1.0;
+        for (size_t u = 0; u < nodes.size(); u++) {
+            if (!hasCoordinates(u)) {
+                continue;
+            }
+            for (const auto& arc : adjacencyList[u]) {
+                if (!hasCoordinates(arc.first)) {
+                    continue;
+                }
+                double straight = haversine(nodes[u].lat, nodes[u].lon, nodes[arc.first].lat, nodes[arc.first].lon);
+                if (straight > 0 && arc.second < straight * heuristicScale) {
+                    heuristicScale = arc.second / straight;
+                }
+            }
+        }
+    }
+
 public:
+    void clear() {
+        nodes.clear();
+        idIndex.clear();
+        nameIndex.clear();
+        adjacencyList.clear();
+        dist.clear();
+        heuristicScale = 1.0;
+    }
+
+    size_t size() const {
+        return nodes.size();
+    }
+
     // Add a node to the graph
-    void addNode(const string& id, const string& name, double x, double y) {
-        nodes[id] = Node(id, name, x, y);
-        adjacencyList[id] = vector<pair<string, double>>();
+    void addNode(const string& id, const string& name, double lat, double lon) {
+        idIndex[id] = nodes.size();
+        nameIndex.insert({name, (int)nodes.size()});
+        nodes.push_back(Node(id, name, lat, lon));
+        adjacencyList.push_back(vector<pair<int, double>>());
     }
-    
+
     // Add an edge to the graph
     void addEdge(const string& from, const string& to, double distance) {
-        adjacencyList[from].push_back({to, distance});
-        adjacencyList[to].push_back({from, distance}); // Undirected graph
+        auto a = idIndex.find(from);
+        auto b = idIndex.find(to);
+        if (a == idIndex.end() || b == idIndex.end()) {
+            return;
+        }
+        adjacencyList[a->second].push_back({b->second, distance});
+        adjacencyList[b->second].push_back({a->second, distance}); // Undirected graph
     }
-    
-    // Calculate distance between two points using Euclidean distance
-    double calculateDistance(const Node& a, const Node& b) {
-        double dx = a.x - b.x;
-        double dy = a.y - b.y;
-        return sqrt(dx*dx + dy*dy);
+
+    // Resolve a node id or name to its index, -1 if unknown
+    int indexOf(const string& key) const {
+        auto it = idIndex.find(key);
+        if (it != idIndex.end()) {
+            return it->second;
+        }
+        it = nameIndex.find(key);
+        return it != nameIndex.end() ? it->second : -1;
+    }
+
+    const Node& node(int v) const {
+        return nodes[v];
     }
-    
+
     // Dijkstra's algorithm for shortest path
-    vector<string> findShortestPath(const string& start, const string& end) {
-        if (nodes.find(start) == nodes.end() || nodes.find(end) == nodes.end()) {
-            return vector<string>();
-        }
-        
-        map<string, double> distances;
-        map<string, string> previous;
-        priority_queue<DijkstraNode, vector<DijkstraNode>, greater<DijkstraNode>> pq;
-        
-        // Initialize distances
-        for (const auto& node : nodes) {
-            distances[node.first] = numeric_limits<double>::infinity();
-        }
-        distances[start] = 0;
-        
-        pq.push(DijkstraNode(start, 0, ""));
-        
+    double dijkstra(int start, int end, vector<int>& path) {
+        path.clear();
+        resetSearch();
+        Queue pq;
+        relax(start, 0, -1);
+        pq.push({0, start});
+
         while (!pq.empty()) {
-            DijkstraNode current = pq.top();
+            QueueEntry current = pq.top();
             pq.pop();
-            
-            if (current.distance > distances[current.id]) {
+            int u = current.second;
+            if (current.first > distanceOf(u)) {
                 continue;
             }
-            
-            if (current.id == end) {
-                break;
+            if (u == end) {
+                path = reconstruct(end);
+                return current.first;
             }
-            
-            for (const auto& neighbor : adjacencyList[current.id]) {
-                string neighborId = neighbor.first;
-                double weight = neighbor.second;
-                double newDistance = current.distance + weight;
-                
-                if (newDistance < distances[neighborId]) {
-                    distances[neighborId] = newDistance;
-                    previous[neighborId] = current.id;
-                    pq.push(DijkstraNode(neighborId, newDistance, current.id));
+            for (const auto& neighbor : adjacencyList[u]) {
+                double newDistance = current.first + neighbor.second;
+                if (newDistance < distanceOf(neighbor.first)) {
+                    relax(neighbor.first, newDistance, u);
+                    pq.push({newDistance, neighbor.first});
                 }
             }
         }
-        
-        // Reconstruct path
-        vector<string> path;
-        string current = end;
-        while (!current.empty()) {
-            path.push_back(current);
-            current = previous[current];
-        }
-        reverse(path.begin(), path.end());
-        
-        return path;
+        return INF;
     }
-    
+
     // A* algorithm for pathfinding with heuristic
-    vector<string> findPathAStar(const string& start, const string& end) {
-        if (nodes.find(start) == nodes.end() || nodes.find(end) == nodes.end()) {
-            return vector<string>();
-        }
-        
-        map<string, double> gScore;
-        map<string, double> fScore;
-        map<string, string> cameFrom;
-        priority_queue<pair<double, string>, vector<pair<double, string>>, greater<pair<double, string>>> openSet;
-        
-        // Initialize scores
-        for (const auto& node : nodes) {
-            gScore[node.first] = numeric_limits<double>::infinity();
-            fScore[node.first] = numeric_limits<double>::infinity();
-        }
-        
-        gScore[start] = 0;
-        fScore[start] = calculateDistance(nodes[start], nodes[end]);
-        openSet.push({fScore[start], start});
-        
+    double astar(int start, int end, vector<int>& path) {
+        path.clear();
+        resetSearch();
+        Queue openSet;
+        relax(start, 0, -1);
+        openSet.push({heuristic(start, end), start});
+
         while (!openSet.empty()) {
-            string current = openSet.top().second;
+            QueueEntry current = openSet.top();
             openSet.pop();
-            
-            if (current == end) {
-                // Reconstruct path
-                vector<string> path;
-                while (!current.empty()) {
-                    path.push_back(current);
-                    current = cameFrom[current];
+            int u = current.second;
+            double g = distanceOf(u);
+            if (current.first > g + heuristic(u, end) + 1e-12) {
+                continue;
+            }
+            if (u == end) {
+                path = reconstruct(end);
+                return g;
+            }
+            for (const auto& neighbor : adjacencyList[u]) {
+                double tentativeGScore = g + neighbor.second;
+                if (tentativeGScore < distanceOf(neighbor.first)) {
+                    relax(neighbor.first, tentativeGScore, u);
+                    openSet.push({tentativeGScore + heuristic(neighbor.first, end), neighbor.first});
+                }
+            }
+        }
+        return INF;
+    }
+
+    // One Dijkstra from start that stops once every target is settled.
+    // Returns (target, distance) pairs in settle order; paths run start->target.
+    vector<pair<int, double>> nearestTargets(int start, const set<int>& targets, vector<vector<int>>* paths) {
+        vector<pair<int, double>> ranked;
+        if (paths) {
+            paths->clear();
+        }
+        resetSearch();
+        Queue pq;
+        relax(start, 0, -1);
+        pq.push({0, start});
+        size_t remaining = targets.size();
+
+        while (!pq.empty() && remaining > 0) {
+            QueueEntry current = pq.top();
+            pq.pop();
+            int u = current.second;
+            if (current.first > distanceOf(u)) {
+                continue;
+            }
+            if (targets.count(u)) {
+                ranked.push_back({u, current.first});
+                if (paths) {
+                    paths->push_back(reconstruct(u));
                 }
-                reverse(path.begin(), path.end());
-                return path;
+                remaining--;
             }
-            
-            for (const auto& neighbor : adjacencyList[current]) {
-                string neighborId = neighbor.first;
-                double weight = neighbor.second;
-                double tentativeGScore = gScore[current] + weight;
-                
-                if (tentativeGScore < gScore[neighborId]) {
-                    cameFrom[neighborId] = current;
-                    gScore[neighborId] = tentativeGScore;
-                    fScore[neighborId] = gScore[neighborId] + calculateDistance(nodes[neighborId], nodes[end]);
-                    openSet.push({fScore[neighborId], neighborId});
+            for (const auto& neighbor : adjacencyList[u]) {
+                double newDistance = current.first + neighbor.second;
+                if (newDistance < distanceOf(neighbor.first)) {
+                    relax(neighbor.first, newDistance, u);
+                    pq.push({newDistance, neighbor.first});
                 }
             }
         }
-        
-        return vector<string>();
+        return ranked;
     }
-    
-    // Load graph from JSON file
+
+    // Shortest path by node id, for the command line
+    vector<string> findShortestPath(const string& start, const string& end) {
+        return findPath(start, end, false);
+    }
+
+    vector<string> findPathAStar(const string& start, const string& end) {
+        return findPath(start, end, true);
+    }
+
+    vector<string> findPath(const string& start, const string& end, bool useAStar) {
+        vector<string> result;
+        int s = indexOf(start), t = indexOf(end);
+        if (s < 0 || t < 0) {
+            return result;
+        }
+        vector<int> path;
+        if (useAStar) {
+            astar(s, t, path);
+        } else {
+            dijkstra(s, t, path);
+        }
+        for (int v : path) {
+            result.push_back(nodes[v].id);
+        }
+        return result;
+    }
+
+    // Load graph from JSON file (lat/lon in degrees; edges without a distance are skipped)
     bool loadFromJSON(const string& filename) {
         ifstream file(filename);
         if (!file.is_open()) {
             return false;
         }
-        
+
         Json::Value root;
         Json::CharReaderBuilder builder;
         string errors;
-        
+
         if (!Json::parseFromStream(builder, file, &root, &errors)) {
             return false;
         }
-        
+
+        clear();
+
         // Load nodes
         if (root.isMember("nodes")) {
             const Json::Value& nodesArray = root["nodes"];
             for (const Json::Value& node : nodesArray) {
                 string id = node["id"].asString();
-                string name = node["name"].asString();
-                double x = node["x"].asDouble();
-                double y = node["y"].asDouble();
-                addNode(id, name, x, y);
+                string name = node.get("name", id).asString();
+                double lat = node["lat"].isNumeric() ? node["lat"].asDouble() * DEG_TO_RAD : NAN;
+                double lon = node["lon"].isNumeric() ? node["lon"].asDouble() * DEG_TO_RAD : NAN;
+                addNode(id, name, lat, lon);
             }
         }
-        
+
         // Load edges
         if (root.isMember("edges")) {
             const Json::Value& edgesArray = root["edges"];
             for (const Json::Value& edge : edgesArray) {
-                string from = edge["from"].asString();
-                string to = edge["to"].asString();
-                double distance = edge["distance"].asDouble();
-                addEdge(from, to, distance);
+                if (!edge["distance"].isNumeric()) {
+                    continue;
+                }
+                addEdge(edge["from"].asString(), edge["to"].asString(), edge["distance"].asDouble());
             }
         }
-        
+
+        computeHeuristicScale();
         return true;
     }
-    
+
     // Create default warehouse network
     void createDefaultNetwork() {
+        clear();
         // Factory - Clock Tower Dehradun
-        addNode("factory", "Clock Tower Factory", 0, 0);
-        
+        addNode("factory", "Clock Tower Factory", 30.3256 * DEG_TO_RAD, 78.0437 * DEG_TO_RAD);
+
         // Warehouses in Dehradun
-        addNode("warehouse_clement", "Clement Town Warehouse", 5, 3);
-        addNode("warehouse_prem", "Prem Nagar Warehouse", -4, 2);
-        addNode("warehouse_raipur", "Raipur Warehouse", 2, -6);
-        
+        addNode("warehouse_clement", "Clement Town Warehouse", 30.2736 * DEG_TO_RAD, 78.0322 * DEG_TO_RAD);
+        addNode("warehouse_prem", "Prem Nagar Warehouse", 30.3076 * DEG_TO_RAD, 77.9632 * DEG_TO_RAD);
+        addNode("warehouse_raipur", "Raipur Warehouse", 30.3115 * DEG_TO_RAD, 78.0806 * DEG_TO_RAD);
+
         // Connections from factory to warehouses
         addEdge("factory", "warehouse_clement", 6.0);
         addEdge("factory", "warehouse_prem", 4.5);
         addEdge("factory", "warehouse_raipur", 6.3);
-        
+
         // Inter-warehouse connections
         addEdge("warehouse_clement", "warehouse_prem", 9.2);
         addEdge("warehouse_clement", "warehouse_raipur", 9.4);
         addEdge("warehouse_prem", "warehouse_raipur", 8.1);
+        computeHeuristicScale();
     }
-    
+
     // Print route information
     void printRoute(const vector<string>& path) {
         if (path.empty()) {
             cout << "No path found!" << endl;
             return;
         }
-        
+
         cout << "Route found:" << endl;
         double totalDistance = 0;
-        
+
         for (size_t i = 0; i < path.size(); i++) {
-            cout << (i + 1) << ". " << nodes[path[i]].name << " (" << path[i] << ")";
-            
+            int v = indexOf(path[i]);
+            cout << (i + 1) << ". " << nodes[v].name << " (" << path[i] << ")";
+
             if (i < path.size() - 1) {
                 // Find distance to next node
-                for (const auto& neighbor : adjacencyList[path[i]]) {
-                    if (neighbor.first == path[i + 1]) {
+                int next = indexOf(path[i + 1]);
+                for (const auto& neighbor : adjacencyList[v]) {
+                    if (neighbor.first == next) {
                         totalDistance += neighbor.second;
                         cout << " -> " << neighbor.second << " km";
                         break;
@@ -264,43 +385,317 @@ public:
             }
             cout << endl;
         }
-        
+
         cout << "Total distance: " << totalDistance << " km" << endl;
         cout << "Estimated travel time: " << (totalDistance / 60.0) << " hours (60 km/h)" << endl;
     }
 };
 
+// Server mode: one JSON request per line in, one JSON response per line out.
+//   {"op": "route", "from": a, "to": b, "algorithm": "astar"|"dijkstra"}
+//   {"op": "nearest", "from": a, "targets": [...], "paths": true}
+//   {"op": "matrix", "points": [...]}
+//   {"op": "batch", "queries": [<route or nearest requests>]}
+//   {"op": "ping"} / {"op": "reload"}
+// Nodes may be given by id or name; paths come back as node ids and
+// unreachable distances as null. An "id" field is echoed back.
+class RequestHandler {
+private:
+    RoutingEngine& router;
+    string mapFile;
+    Json::StreamWriterBuilder writer;
+    Json::CharReaderBuilder reader;
+
+    static Json::Value distanceValue(double distance) {
+        return std::isinf(distance) ? Json::Value(Json::nullValue) : Json::Value(distance);
+    }
+
+    Json::Value pathValue(const vector<int>& path) {
+        Json::Value ids(Json::arrayValue);
+        for (int v : path) {
+            ids.append(router.node(v).id);
+        }
+        return ids;
+    }
+
+    Json::Value error(const string& message) {
+        Json::Value result;
+        result["error"] = message;
+        return result;
+    }
+
+    Json::Value route(const Json::Value& request) {
+        int s = router.indexOf(request["from"].asString());
+        int t = router.indexOf(request["to"].asString());
+        if (s < 0 || t < 0) {
+            return error("unknown node");
+        }
+        vector<int> path;
+        double distance = request.get("algorithm", "astar").asString() == "dijkstra"
+            ? router.dijkstra(s, t, path)
+            : router.astar(s, t, path);
+        Json::Value result;
+        result["distance"] = distanceValue(distance);
+        result["path"] = pathValue(path);
+        return result;
+    }
+
+    Json::Value nearest(const Json::Value& request) {
+        int s = router.indexOf(request["from"].asString());
+        if (s < 0) {
+            return error("unknown node");
+        }
+        set<int> targets;
+        for (const Json::Value& target : request["targets"]) {
+            int t = router.indexOf(target.asString());
+            if (t >= 0) {
+                targets.insert(t);
+            }
+        }
+        bool withPaths = request.get("paths", true).asBool();
+        vector<vector<int>> paths;
+        vector<pair<int, double>> ranked = router.nearestTargets(s, targets, withPaths ? &paths : NULL);
+        Json::Value results(Json::arrayValue);
+        for (size_t i = 0; i < ranked.size(); i++) {
+            Json::Value item;
+            item["target"] = router.node(ranked[i].first).id;
+            item["distance"] = ranked[i].second;
+            if (withPaths) {
+                item["path"] = pathValue(paths[i]);
+            }
+            results.append(item);
+        }
+        Json::Value result;
+        result["ranked"] = results;
+        return result;
+    }
+
+    Json::Value matrix(const Json::Value& request) {
+        vector<int> points;
+        for (const Json::Value& point : request["points"]) {
+            points.push_back(router.indexOf(point.asString()));
+        }
+        size_t n = points.size();
+        vector<vector<double>> distances(n, vector<double>(n, INF));
+        for (size_t i = 0; i < n; i++) {
+            distances[i][i] = 0;
+            if (points[i] < 0) {
+                continue;
+            }
+            set<int> targets;
+            map<int, vector<size_t>> positions;
+            for (size_t j = i + 1; j < n; j++) {
+                if (points[j] >= 0) {
+                    targets.insert(points[j]);
+                    positions[points[j]].push_back(j);
+                }
+            }
+            for (const auto& found : router.nearestTargets(points[i], targets, NULL)) {
+                for (size_t j : positions[found.first]) {
+                    distances[i][j] = distances[j][i] = found.second;
+                }
+            }
+        }
+        Json::Value rows(Json::arrayValue);
+        for (size_t i = 0; i < n; i++) {
+            Json::Value row(Json::arrayValue);
+            for (size_t j = 0; j < n; j++) {
+                row.append(distanceValue(distances[i][j]));
+            }
+            rows.append(row);
+        }
+        Json::Value result;
+        result["distances"] = rows;
+        return result;
+    }
+
+public:
+    RequestHandler(RoutingEngine& router, const string& mapFile) : router(router), mapFile(mapFile) {
+        writer["indentation"] = "";
+    }
+
+    Json::Value dispatch(const Json::Value& request) {
+        if (!request.isObject()) {
+            return error("request must be an object");
+        }
+        string op = request.get("op", "route").asString();
+        if (op == "route") {
+            return route(request);
+        } else if (op == "nearest") {
+            return nearest(request);
+        } else if (op == "matrix") {
+            return matrix(request);
+        } else if (op == "batch") {
+            Json::Value results(Json::arrayValue);
+            for (const Json::Value& query : request["queries"]) {
+                results.append(dispatch(query));
+            }
+            Json::Value result;
+            result["results"] = results;
+            return result;
+        } else if (op == "ping") {
+            Json::Value result;
+            result["nodes"] = (Json::UInt64)router.size();
+            return result;
+        } else if (op == "reload") {
+            if (!router.loadFromJSON(mapFile)) {
+                return error("could not load " + mapFile);
+            }
+            Json::Value result;
+            result["nodes"] = (Json::UInt64)router.size();
+            return result;
+        }
+        return error("unknown op: " + op);
+    }
+
+    string handleLine(const string& line) {
+        Json::Value request;
+        Json::Value response;
+        string errors;
+        unique_ptr<Json::CharReader> parser(reader.newCharReader());
+        if (!parser->parse(line.data(), line.data() + line.size(), &request, &errors)) {
+            response = error("invalid JSON");
+        } else {
+            response = dispatch(request);
+            if (request.isObject() && request.isMember("id")) {
+                response["id"] = request["id"];
+            }
+        }
+        return Json::writeString(writer, response);
+    }
+};
+
+// Answer requests from stdin until EOF
+static int serveStdio(RequestHandler& handler) {
+    ios::sync_with_stdio(false);
+    string line;
+    while (getline(cin, line)) {
+        if (line.empty()) {
+            continue;
+        }
+        cout << handler.handleLine(line) << '\n' << flush;
+    }
+    return 0;
+}
+
+// Answer requests on a Unix socket, one connection at a time
+static int serveSocket(RequestHandler& handler, const string& socketPath) {
+    int server = socket(AF_UNIX, SOCK_STREAM, 0);
+    if (server < 0) {
+        perror("socket");
+        return 1;
+    }
+    sockaddr_un addr;
+    memset(&addr, 0, sizeof(addr));
+    addr.sun_family = AF_UNIX;
+    if (socketPath.size() >= sizeof(addr.sun_path)) {
+        cerr << "Socket path too long: " << socketPath << endl;
+        return 1;
+    }
+    strncpy(addr.sun_path, socketPath.c_str(), sizeof(addr.sun_path) - 1);
+    unlink(socketPath.c_str());
+    if (bind(server, (sockaddr*)&addr, sizeof(addr)) < 0 || listen(server, 16) < 0) {
+        perror("bind");
+        return 1;
+    }
+    while (true) {
+        int client = accept(server, NULL, NULL);
+        if (client < 0) {
+            continue;
+        }
+        FILE* in = fdopen(client, "r");
+        char* buffer = NULL;
+        size_t capacity = 0;
+        ssize_t length;
+        while ((length = getline(&buffer, &capacity, in)) > 0) {
+            string line(buffer, length);
+            while (!line.empty() && (line.back() == '\n' || line.back() == '\r')) {
+                line.pop_back();
+            }
+            if (line.empty()) {
+                continue;
+            }
+            string response = handler.handleLine(line) + "\n";
+            size_t sent = 0;
+            while (sent < response.size()) {
+                ssize_t n = write(client, response.data() + sent, response.size() - sent);
+                if (n <= 0) {
+                    break;
+                }
+                sent += n;
+            }
+        }
+        free(buffer);
+        fclose(in);
+    }
+    return 0;
+}
+
+static void usage(const char* program) {
+    cout << "Usage: " << program << " <start_point> <end_point> [map_file]" << endl;
+    cout << "       " << program << " --serve [--map map_file] [--socket path]" << endl;
+    cout << "Example: " << program << " factory warehouse_raipur" << endl;
+}
+
 int main(int argc, char* argv[]) {
-    if (argc != 3) {
-        cout << "Usage: " << argv[0] << " <start_point> <end_point>" << endl;
-        cout << "Example: " << argv[0] << " factory warehouse_north" << endl;
+    string mapFile = "real_map_with_distances.json";
+    bool serve = false;
+    string socketPath;
+    vector<string> positional;
+    for (int i = 1; i < argc; i++) {
+        string arg = argv[i];
+        if (arg == "--serve") {
+            serve = true;
+        } else if (arg == "--map" && i + 1 < argc) {
+            mapFile = argv[++i];
+        } else if (arg == "--socket" && i + 1 < argc) {
+            socketPath = argv[++i];
+        } else {
+            positional.push_back(arg);
+        }
+    }
+
+    if (!serve && (positional.size() < 2 || positional.size() > 3)) {
+        usage(argv[0]);
         return 1;
     }
-    
-    string startPoint = argv[1];
-    string endPoint = argv[2];
-    
+    if (positional.size() == 3) {
+        mapFile = positional[2];
+    }
+
     RoutingEngine router;
-    
+
     // Try to load from JSON file first
-    if (!router.loadFromJSON("map_data.json")) {
+    if (!router.loadFromJSON(mapFile)) {
+        if (serve) {
+            cerr << "Could not load " << mapFile << endl;
+            return 1;
+        }
         // Create default network if no JSON file
         router.createDefaultNetwork();
     }
-    
+
+    if (serve) {
+        RequestHandler handler(router, mapFile);
+        return socketPath.empty() ? serveStdio(handler) : serveSocket(handler, socketPath);
+    }
+
+    string startPoint = positional[0];
+    string endPoint = positional[1];
+
     cout << "Calculating route from " << startPoint << " to " << endPoint << "..." << endl;
     cout << "Algorithm: Dijkstra's Shortest Path" << endl;
     cout << "=====================================" << endl;
-    
+
     vector<string> path = router.findShortestPath(startPoint, endPoint);
     router.printRoute(path);
-    
+
     cout << endl;
     cout << "Algorithm: A* Pathfinding" << endl;
     cout << "=========================" << endl;
-    
+
     vector<string> pathAStar = router.findPathAStar(startPoint, endPoint);
     router.printRoute(pathAStar);
-    
+
     return 0;
-} 
\ No newline at end of file
+}
@@ -0,0 +1,185 @@
+"""
+Snapping locations to road graph nodes
+A uniform grid over node coordinates answers nearest-node queries by
+searching outward ring by ring from the query's cell, so a lookup touches
+a handful of cells however large the map is. Addresses resolve to nodes
+by exact node name, by coordinates written in the address, or by a
+case- and punctuation-insensitive name match.
+"""
+
+import math
+import re
+import threading
+from functools import cached_property
+
+from road_graph import EARTH_RADIUS_KM, haversine_rad
+
+# Farthest a location may be from the road network and still snap to it
+DEFAULT_SNAP_RADIUS_KM = 2.0
+# Average located nodes per grid cell
+NODES_PER_CELL = 4
+
+# "30.3256, 78.0437" on its own or at the end of an address, optionally in brackets
+COORDINATES = re.compile(r'\(?\s*(-?\d{1,2}(?:\.\d+)?)\s*,\s*(-?\d{1,3}(?:\.\d+)?)\s*\)?\s*$')
+
+
+def parse_coordinates(text):
+    """(lat, lon) in degrees from the end of text, or None"""
+    match = COORDINATES.search(text or '')
+    if not match:
+        return None
+    lat, lon = float(match.group(1)), float(match.group(2))
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return lat, lon
+    return None
+
+
+def normalize_name(text):
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', text.lower()).split())
+
+
+class GridIndex:
+    """Uniform lat/lon grid over the located nodes of a RoadGraph
+
+    Cells are at least cell_km wide in both directions everywhere on the
+    map, so nodes in ring r around the query cell are at least
+    (r - 1) * cell_km away and the search can stop once that exceeds the
+    best match or the snap radius.
+    """
+
+    def __init__(self, graph, cell_km=None):
+        self.graph = graph
+        located = [i for i in range(len(graph)) if graph.has_coordinates(i)]
+        self.size = len(located)
+        self.cells = {}
+        if not located:
+            return
+        lat, lon = graph.lat, graph.lon
+        self.min_lat = min(lat[i] for i in located)
+        self.min_lon = min(lon[i] for i in located)
+        max_lat = max(lat[i] for i in located)
+        max_lon = max(lon[i] for i in located)
+        # A degree of longitude is shortest at the highest latitude on the map
+        shrink = max(math.cos(max(abs(self.min_lat), abs(max_lat))), 0.01)
+        if cell_km is None:
+            area = ((max_lat - self.min_lat) * EARTH_RADIUS_KM) * ((max_lon - self.min_lon) * EARTH_RADIUS_KM)
+            cell_km = math.sqrt(area * NODES_PER_CELL / len(located)) if area > 0 else 1.0
+        self.cell_km = max(cell_km, 0.01)
+        self.cell_lat = self.cell_km / EARTH_RADIUS_KM
+        self.cell_lon = self.cell_km / (EARTH_RADIUS_KM * shrink)
+        for i in located:
+            self.cells.setdefault(self._cell(lat[i], lon[i]), []).append(i)
+        rows = [row for row, _ in self.cells]
+        cols = [col for _, col in self.cells]
+        self.row_range = (min(rows), max(rows))
+        self.col_range = (min(cols), max(cols))
+
+    def _cell(self, lat, lon):
+        return int((lat - self.min_lat) // self.cell_lat), int((lon - self.min_lon) // self.cell_lon)
+
+    def _ring(self, row, col, r):
+        if r == 0:
+            yield row, col
+            return
+        for c in range(col - r, col + r + 1):
+            yield row - r, c
+            yield row + r, c
+        for rr in range(row - r + 1, row + r):
+            yield rr, col - r
+            yield rr, col + r
+
+    def nearest(self, lat, lon, max_km=DEFAULT_SNAP_RADIUS_KM):
+        """(node index, km) of the node nearest to lat/lon in degrees, or (None, None)"""
+        if not self.cells:
+            return None, None
+        lat, lon = math.radians(lat), math.radians(lon)
+        row, col = self._cell(lat, lon)
+        # Rings beyond every occupied cell cannot hold anything
+        last = max(abs(row - self.row_range[0]), abs(row - self.row_range[1]),
+                   abs(col - self.col_range[0]), abs(col - self.col_range[1]))
+        best, best_km = None, math.inf
+        r = 0
+        while r <= last and (r - 1) * self.cell_km <= min(best_km, max_km):
+            for cell in self._ring(row, col, r):
+                for i in self.cells.get(cell, ()):
+                    km = haversine_rad(lat, lon, self.graph.lat[i], self.graph.lon[i])
+                    if km < best_km:
+                        best, best_km = i, km
+            r += 1
+        if best is None or best_km > max_km:
+            return None, None
+        return best, best_km
+
+    def nearest_many(self, points, max_km=DEFAULT_SNAP_RADIUS_KM):
+        """nearest() for each (lat, lon) in points"""
+        return [self.nearest(lat, lon, max_km) for lat, lon in points]
+
+
+class LocationIndex:
+    """Resolves coordinates and addresses of one graph to node names"""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.grid = GridIndex(graph)
+
+    @cached_property
+    def _names(self):
+        # Built on the first address that is not an exact node name
+        names = {}
+        for name in self.graph.index_to_name:
+            names.setdefault(normalize_name(name), name)
+        return names
+
+    def warm(self):
+        """Build the name index now rather than on the first fuzzy address"""
+        self._names
+        return self
+
+    def snap(self, lat, lon, max_km=DEFAULT_SNAP_RADIUS_KM):
+        """(node name, km) nearest to lat/lon in degrees, or (None, None)"""
+        i, km = self.grid.nearest(lat, lon, max_km)
+        return (None, None) if i is None else (self.graph.index_to_name[i], km)
+
+    def snap_many(self, points, max_km=DEFAULT_SNAP_RADIUS_KM):
+        return [self.snap(lat, lon, max_km) for lat, lon in points]
+
+    def resolve(self, address, max_km=DEFAULT_SNAP_RADIUS_KM):
+        """(node name, snap km) for an address, or (None, None)
+
+        Tries the exact node name, then coordinates at the end of the
+        address ("Gate 2 (30.3256, 78.0437)"), then the name ignoring case
+        and punctuation.
+        """
+        address = (address or '').strip()
+        if not address:
+            return None, None
+        if address in self.graph:
+            return address, 0.0
+        point = parse_coordinates(address)
+        if point is not None:
+            return self.snap(*point, max_km)
+        name = self._names.get(normalize_name(address))
+        return (name, 0.0) if name is not None else (None, None)
+
+    def resolve_many(self, addresses, max_km=DEFAULT_SNAP_RADIUS_KM):
+        """{address: node name or None} for each distinct address"""
+        return {address: self.resolve(address, max_km)[0] for address in dict.fromkeys(addresses)}
+
+
+_lock = threading.Lock()
+_indexes = {}  # graph version -> LocationIndex
+
+
+def get_location_index(graph):
+    """Shared LocationIndex for graph, rebuilt when the map version changes"""
+    index = _indexes.get(graph.version)
+    if index is not None:
+        return index
+    with _lock:
+        index = _indexes.get(graph.version)
+        if index is None:
+            index = LocationIndex(graph)
+            # Only the current map's index is worth keeping
+            _indexes.clear()
+            _indexes[graph.version] = index
+        return index
@@ -2,12 +2,13 @@
 """
 Startup script for Logistics Management System
 Checks dependencies and starts the application
+
+    python start.py [--debug] [--host 0.0.0.0] [--port 5000]
 """
 
-import os
+import argparse
 import sys
-import subprocess
-import platform
+import time
 from pathlib import Path
 
 def check_python_version():
@@ -33,13 +34,9 @@ def check_python_dependencies():
             print(f"❌ {package} - Missing")
     
     if missing_packages:
-        print(f"\n📦 Installing missing packages: {', '.join(missing_packages)}")
-        try:
-            subprocess.check_call([sys.executable, '-m', 'pip', 'install'] + missing_packages)
-            print("✅ All Python dependencies installed")
-        except subprocess.CalledProcessError:
-            print("❌ Failed to install Python dependencies")
-            return False
+        print(f"\n📦 Missing packages: {', '.join(missing_packages)}")
+        print("   Install them with: pip install -r requirements.txt")
+        return False
     
     return True
 
@@ -79,6 +76,12 @@ def create_sample_map_data():
 
 def main():
     """Main startup function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--debug', action='store_true', help='Run the Flask debug server with the reloader')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+
     print("\U0001F69A Logistics Management System - Startup Check")
     print("=" * 50)
     
@@ -99,14 +102,6 @@ def main():
     
     print("\n\U0001F4C1 Setting up files...")
     create_sample_map_data()
-
-    # Ensure users.csv exists
-    users_csv = 'users.csv'
-    if not os.path.exists(users_csv):
-        import csv
-        with open(users_csv, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['id', 'username', 'password'])
     
     print("\n\U0001F389 All checks completed!")
     print("\nStarting the application...")
@@ -114,10 +109,17 @@ def main():
     print("\U0001F4CA Click 'Initialize Database' to get started")
     print("\nPress Ctrl+C to stop the application")
     
-    # Start the Flask application
+    # Start the Flask application; users.csv is created on the first signup
     try:
-        from app import app
-        app.run(debug=True, host='0.0.0.0', port=5000)
+        started = time.perf_counter()
+        from app import create_app, db, warm
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+        timings = warm(app)
+        print(f"\u23F1\uFE0F  Ready in {time.perf_counter() - started:.2f}s "
+              f"(create_app {timings['create_app'] * 1000:.0f} ms, warm {timings['warm'] * 1000:.0f} ms)")
+        app.run(debug=args.debug, host=args.host, port=args.port)
     except KeyboardInterrupt:
         print("\n\U0001F44B Application stopped")
     except Exception as e:
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the app's top-level modules directly
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App on a scratch database and users file, using the repo's map"""
+    from app import create_app, db
+    # The map file path is relative to the repo
+    monkeypatch.chdir(ROOT)
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'logistics.db'}",
+        'USERS_CSV': str(tmp_path / 'users.csv'),
+        'ROUTING_ENGINE_PROCESSES': 0,
+        'ROUTING_BACKEND': 'native',
+        'PLAN_JOB_WORKERS': 1,
+    })
+    yield app
+    services = app.extensions['logistics']
+    if 'plan_jobs' in services.__dict__:
+        services.plan_jobs.shutdown(wait=True)
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    """Logged-in test client on a database loaded with the sample data"""
+    client = app.test_client()
+    assert client.get('/init_db').status_code == 302
+    user_id = app.extensions['logistics'].user_store.add('tester@gmail.com', 'secret')
+    with client.session_transaction() as session:
+        session['_user_id'] = user_id
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
@@ -0,0 +1,85 @@
+import json
+
+from sqlalchemy import event
+
+
+def level(app, product_id, location):
+    from app import stock_levels
+    with app.app_context():
+        return stock_levels(product_id=product_id).get(location, {}).get(product_id, 0)
+
+
+def order(address='ISBT', product_id=1, quantity=1, **extra):
+    return dict(customer_name='a', customer_email='a@gmail.com', customer_address=address,
+                product_id=product_id, quantity=quantity, **extra)
+
+
+def test_bulk_json_allocates_and_reports_each_row(app, client):
+    rows = [order(quantity=5), order(quantity=-1), order(address=''), order(product_id=999),
+            order(address='Atlantis'), 'not an object']
+    data = client.post('/api/orders/bulk', json=rows).get_json()
+    statuses = [(r['status'], r.get('error')) for r in data['results']]
+    assert statuses == [
+        ('allocated', None),
+        ('rejected', 'quantity must be positive'),
+        ('rejected', 'customer_address is required'),
+        ('rejected', 'unknown product 999'),
+        ('unfulfilled', 'address could not be matched to the road network'),
+        ('rejected', 'row must be an object'),
+    ]
+    assert data['summary']['counts'] == {'allocated': 1, 'rejected': 4, 'unfulfilled': 1}
+    warehouse = data['results'][0]['warehouse']
+    assert level(app, 1, warehouse) == 15
+    from app import Order
+    with app.app_context():
+        types = sorted(o.type for o in Order.query.filter_by(warehouse_name=warehouse))
+    assert types == ['customer_order', 'delivery']
+
+
+def test_bulk_orders_share_one_stock_snapshot(app, client):
+    # Three orders of 15 cannot all come from the nearest warehouse's 20
+    data = client.post('/api/orders/bulk', json={'orders': [order(quantity=15)] * 3}).get_json()
+    warehouses = [r['warehouse'] for r in data['results']]
+    assert len(set(warehouses)) == 3
+    assert all(level(app, 1, name) == 5 for name in warehouses)
+
+
+def test_bulk_orders_write_in_batches(app, client):
+    from app import db
+    statements = []
+    with app.app_context():
+        engine = db.engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((' '.join(statement.split()[:3]), executemany))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        client.post('/api/orders/bulk', json=[order(address=a) for a in ('ISBT', 'Rajpur Road Store')] * 10)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    # 40 order rows in one executemany, one stock decrement per warehouse used
+    assert [s for s in statements if s[0] == 'INSERT INTO "order"'] == [('INSERT INTO "order"', True)]
+    assert sum(1 for s, _ in statements if s == 'UPDATE inventory SET') <= 2
+
+
+def test_bulk_csv_body(app, client):
+    body = 'customer_name,customer_email,customer_address,product_id,quantity\n' \
+           'a,a@gmail.com,ISBT,2,3\nb,b@gmail.com,Rajpur Road Store,2,x\n'
+    data = client.post('/api/orders/bulk', data=body, content_type='text/csv').get_json()
+    assert [r['status'] for r in data['results']] == ['allocated', 'rejected']
+
+
+def test_bulk_rejects_malformed_json(client):
+    response = client.post('/api/orders/bulk', data='{"orders": 5}', content_type='application/json')
+    assert response.status_code == 400
+
+
+def test_import_orders_command(app, client, tmp_path):
+    source = tmp_path / 'orders.json'
+    source.write_text(json.dumps([order(), order(quantity=0)]))
+    report = tmp_path / 'report.json'
+    result = app.test_cli_runner().invoke(args=['import-orders', str(source), '--report', str(report)])
+    assert result.exit_code == 0, result.output
+    summary = json.loads(report.read_text())['summary']
+    assert summary['counts'] == {'allocated': 1, 'rejected': 1}
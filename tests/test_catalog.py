@@ -0,0 +1,83 @@
+import csv
+import gzip
+import io
+import json
+
+PRODUCTS_CSV = '''name,category,weight,price
+Laptop,Electronics,2.5,45999.00
+Desk Lamp,Lighting,1.2,1299.50
+,Lighting,1.0,10
+Kettle,Appliances,heavy,999
+'''
+
+
+def import_body(client, kind, body, content_type):
+    response = client.post(f'/api/{kind}/import', data=body, content_type=content_type)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_product_csv_import_upserts_by_name(app, client):
+    from app import Product, db
+    summary = import_body(client, 'products', PRODUCTS_CSV, 'text/csv')
+    assert (summary['inserted'], summary['updated'], summary['rejected']) == (1, 1, 2)
+    assert [error['line'] for error in summary['errors']] == [4, 5]
+    assert summary['rows'] == 4 and 'rows_per_second' in summary
+    with app.app_context():
+        prices = dict(db.session.execute(db.select(Product.name, Product.price)).all())
+    assert prices['Laptop'] == 45999.0
+    assert prices['Desk Lamp'] == 1299.5
+    assert 'Kettle' not in prices
+
+
+def test_inventory_ndjson_import_refreshes_rollups(app, client):
+    from app import InventoryRollup, db, stock_levels
+    body = '\n'.join(json.dumps(row) for row in [
+        {'product': 'Laptop', 'location': 'Clement Town Warehouse', 'quantity': 7},
+        {'product_id': 2, 'location': 'Overflow Depot', 'quantity': 40},
+        {'product': 'Hoverboard', 'location': 'Overflow Depot', 'quantity': 1},
+        'not an object',
+    ])
+    summary = import_body(client, 'inventory', body, 'application/x-ndjson')
+    assert (summary['upserted'], summary['rejected']) == (2, 2)
+    with app.app_context():
+        assert stock_levels(product_id=1)['Clement Town Warehouse'][1] == 7
+        rollup = db.session.get(InventoryRollup, 'Overflow Depot')
+        assert (rollup.total_products, rollup.total_quantity) == (1, 40)
+
+
+def test_unknown_format_is_rejected(client):
+    response = client.post('/api/products/import?format=xml', data='x', content_type='text/plain')
+    assert response.status_code == 400
+    assert client.get('/api/products/export?format=xml').status_code == 400
+
+
+def test_export_streams_csv(client):
+    response = client.get('/api/inventory/export?location=factory')
+    assert response.is_streamed
+    assert response.headers['Content-Disposition'] == 'attachment; filename=inventory.csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 6
+    assert {row['location'] for row in rows} == {'factory'}
+    assert rows[0]['product'] == 'Laptop' and rows[0]['quantity'] == '100'
+
+
+def test_export_is_gzipped_when_accepted(client):
+    response = client.get('/api/products/export?format=ndjson', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    lines = gzip.decompress(response.get_data()).decode().splitlines()
+    assert [json.loads(line)['name'] for line in lines][:2] == ['Laptop', 'Smartphone']
+
+
+def test_cli_round_trip(app, client, tmp_path):
+    runner = app.test_cli_runner()
+    output = str(tmp_path / 'products.csv.gz')
+    result = runner.invoke(args=['export-catalog', 'products', '-o', output, '--format', 'csv'])
+    assert result.exit_code == 0
+    with gzip.open(output, 'rt') as f:
+        exported = f.read()
+    assert exported.startswith('id,name,category,weight,price')
+    path = tmp_path / 'products.csv'
+    path.write_text(exported)
+    result = runner.invoke(args=['import-catalog', 'products', str(path)])
+    assert json.loads(result.output)['updated'] == 6
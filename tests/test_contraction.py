@@ -0,0 +1,101 @@
+import random
+
+import pytest
+
+import contraction
+from benchmark import geometric_graph, grid_graph
+from contraction import Hierarchy, HierarchyRouter, build_hierarchy, get_hierarchy
+from road_graph import RoadGraph
+from routing import INF, bidirectional_dijkstra, dijkstra
+
+
+@pytest.fixture(scope='module', params=['grid', 'geometric'])
+def graph(request):
+    generate = {'grid': grid_graph, 'geometric': geometric_graph}[request.param]
+    return RoadGraph(generate(150, seed=7), f'{request.param}-test')
+
+
+@pytest.fixture(scope='module')
+def hierarchy(graph):
+    return build_hierarchy(graph)
+
+
+def sample_pairs(graph, count=60, seed=1):
+    rnd = random.Random(seed)
+    names = graph.index_to_name
+    return [(rnd.choice(names), rnd.choice(names)) for _ in range(count)]
+
+
+def path_length(graph, path):
+    total = 0.0
+    for a, b in zip(path, path[1:]):
+        arcs = range(graph.offsets[a], graph.offsets[a + 1])
+        total += min(graph.weights[k] for k in arcs if graph.targets[k] == b)
+    return total
+
+
+def test_query_matches_dijkstra(graph, hierarchy):
+    for a, b in sample_pairs(graph):
+        expected = dijkstra(graph, a, b).distance
+        distance, path, _ = hierarchy.query(graph.name_to_index[a], graph.name_to_index[b])
+        assert distance == pytest.approx(expected)
+        if expected < INF:
+            assert path[0] == graph.name_to_index[a] and path[-1] == graph.name_to_index[b]
+            assert path_length(graph, path) == pytest.approx(expected)
+        else:
+            assert path == []
+
+
+def test_bidirectional_matches_dijkstra(graph):
+    for a, b in sample_pairs(graph, seed=2):
+        assert bidirectional_dijkstra(graph, a, b).distance == pytest.approx(dijkstra(graph, a, b).distance)
+
+
+def test_many_to_many_matches_dijkstra(graph, hierarchy):
+    rnd = random.Random(3)
+    sources = rnd.sample(range(len(graph)), 6)
+    targets = rnd.sample(range(len(graph)), 5)
+    names = graph.index_to_name
+    for row, s in zip(hierarchy.many_to_many(sources, targets), sources):
+        assert row == pytest.approx([dijkstra(graph, names[s], names[t]).distance for t in targets])
+    # Without targets the sources are matched against themselves
+    square = hierarchy.many_to_many(sources)
+    for row, s in zip(square, sources):
+        assert row == pytest.approx([dijkstra(graph, names[s], names[t]).distance for t in sources])
+
+
+def test_save_and_load_round_trip(graph, hierarchy, tmp_path):
+    path = str(tmp_path / 'map.ch')
+    hierarchy.save(path)
+    loaded = Hierarchy.load(path)
+    assert loaded.version == graph.version and len(loaded) == len(graph)
+    for a, b in sample_pairs(graph, count=20, seed=4):
+        s, t = graph.name_to_index[a], graph.name_to_index[b]
+        assert loaded.query(s, t)[0] == pytest.approx(hierarchy.query(s, t)[0])
+
+
+def test_router_distance_matrix(graph, tmp_path):
+    map_path = str(tmp_path / 'map.json')
+    get_hierarchy(graph, map_path, wait=True)
+    points = list(graph.index_to_name[:8]) + ['Nowhere']
+    matrix = HierarchyRouter(map_path).distance_matrix(graph, points)
+    for i, a in enumerate(points[:-1]):
+        assert matrix[i][:-1] == pytest.approx([dijkstra(graph, a, b).distance for b in points[:-1]])
+    assert matrix[-1] == [INF] * 8 + [0.0]
+
+
+def test_failed_build_is_not_retried(graph, tmp_path, monkeypatch):
+    calls = []
+
+    def broken(graph, log=None):
+        calls.append(graph.version)
+        raise MemoryError('out of memory')
+
+    monkeypatch.setattr(contraction, 'build_hierarchy', broken)
+    map_path = str(tmp_path / 'map.json')
+    with pytest.raises(MemoryError):
+        get_hierarchy(graph, map_path, wait=True)
+    assert get_hierarchy(graph, map_path) is None
+    with pytest.raises(RuntimeError):
+        get_hierarchy(graph, map_path, wait=True)
+    assert len(calls) == 1
@@ -0,0 +1,104 @@
+import random
+from collections import Counter
+
+import pytest
+
+from benchmark import grid_graph
+from delivery_planner import _fit_fleet, plan_fleet, plan_route
+from road_graph import RoadGraph
+from routing import dijkstra
+
+
+@pytest.fixture(scope='module')
+def graph():
+    return RoadGraph(grid_graph(100, seed=3), 'planner-test')
+
+
+def make_deliveries(graph, count, seed):
+    rnd = random.Random(seed)
+    names = graph.index_to_name[1:]
+    return [{'id': i, 'address': rnd.choice(names), 'weight': rnd.randint(1, 10)} for i in range(count)]
+
+
+def check_fleet(graph, depot, deliveries, plan, vehicles, capacity):
+    weights = {d['id']: d['weight'] for d in deliveries}
+    planned = [i for route in plan['vehicles'] for i in route['deliveries']]
+    unassigned = [d['id'] for d in plan['unassigned']]
+    # Every delivery is either on exactly one route or unassigned
+    assert Counter(planned + unassigned) == Counter(d['id'] for d in deliveries)
+    assert len(plan['vehicles']) <= vehicles
+    for route in plan['vehicles']:
+        assert route['load'] == sum(weights[i] for i in route['deliveries'])
+        if capacity is not None:
+            assert route['load'] <= capacity
+        legs = route['order']
+        assert legs[0]['from'] == depot and legs[-1]['to'] == depot
+        assert all(a['to'] == b['from'] for a, b in zip(legs, legs[1:]))
+        assert route['total_distance'] == pytest.approx(sum(leg['distance'] for leg in legs))
+    assert plan['total_distance'] == pytest.approx(sum(route['total_distance'] for route in plan['vehicles']))
+
+
+@pytest.mark.parametrize('vehicles, capacity, seed', [(1, None, 0), (3, 40, 1), (5, 25, 2), (2, 15, 3)])
+def test_plan_fleet_respects_limits(graph, vehicles, capacity, seed):
+    depot = graph.index_to_name[0]
+    deliveries = make_deliveries(graph, 30, seed)
+    plan = plan_fleet(graph, depot, deliveries, vehicles, capacity, time_budget=0.2)
+    check_fleet(graph, depot, deliveries, plan, vehicles, capacity)
+    if capacity is not None and vehicles * capacity < sum(d['weight'] for d in deliveries):
+        assert {d['reason'] for d in plan['unassigned']} == {'fleet capacity exceeded'}
+
+
+def test_plan_fleet_reports_unplannable_deliveries(graph):
+    depot = graph.index_to_name[0]
+    deliveries = make_deliveries(graph, 5, 4) + [
+        {'id': 'far', 'address': 'Nowhere', 'weight': 1},
+        {'id': 'heavy', 'address': graph.index_to_name[5], 'weight': 100},
+    ]
+    plan = plan_fleet(graph, depot, deliveries, 2, 50, time_budget=0.2)
+    check_fleet(graph, depot, deliveries, plan, 2, 50)
+    reasons = {d['id']: d['reason'] for d in plan['unassigned']}
+    assert reasons == {'far': 'address not reachable on map', 'heavy': 'heavier than vehicle capacity'}
+
+
+def test_plan_fleet_without_vehicles(graph):
+    deliveries = make_deliveries(graph, 4, 5)
+    plan = plan_fleet(graph, graph.index_to_name[0], deliveries, 0, None, time_budget=0.2)
+    assert plan['vehicles'] == []
+    assert sorted(d['id'] for d in plan['unassigned']) == [0, 1, 2, 3]
+
+
+def test_plan_route_visits_every_address(graph):
+    start = graph.index_to_name[0]
+    addresses = [d['address'] for d in make_deliveries(graph, 12, 6)] + [start, 'Nowhere']
+    plan = plan_route(graph, start, addresses, time_budget=0.2)
+    assert plan['skipped'] == ['Nowhere']
+    legs = plan['order']
+    assert legs[0]['from'] == start
+    assert {leg['to'] for leg in legs} == set(addresses) - {'Nowhere'}
+    assert sum(leg['orders'] for leg in legs) == len(addresses) - 1
+    for leg in legs:
+        assert leg['distance'] == pytest.approx(dijkstra(graph, leg['from'], leg['to']).distance)
+
+
+def test_expired_budget_still_merges_feasible_routes(graph):
+    # With no time left the plan is worse, but every delivery that fits
+    # the fleet must still be planned
+    depot = graph.index_to_name[0]
+    deliveries = make_deliveries(graph, 30, 7)
+    total = sum(d['weight'] for d in deliveries)
+    plan = plan_fleet(graph, depot, deliveries, 2, total, time_budget=0)
+    check_fleet(graph, depot, deliveries, plan, 2, total)
+    assert plan['unassigned'] == []
+
+
+def test_fit_fleet_drops_only_when_no_merge_fits():
+    # Depot 0 and four customers on a line; loads 4, 4, 3, 3 with capacity 7
+    matrix = [[abs(p - q) for q in range(5)] for p in range(5)]
+    routes = [([0], 4), ([1], 4), ([2], 3), ([3], 3)]
+    node = [1, 2, 3, 4]
+    for deadline in (None, 0):
+        kept, dropped = _fit_fleet(matrix, node, routes, 2, 7, deadline)
+        assert sorted(load for _, load in kept) == [4, 6]
+        assert [load for _, load in dropped] == [4]
+    kept, dropped = _fit_fleet(matrix, node, routes, 1, None, 0)
+    assert dropped == [] and sorted(kept[0][0]) == [0, 1, 2, 3]
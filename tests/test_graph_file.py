@@ -0,0 +1,113 @@
+import random
+
+import pytest
+
+from benchmark import geometric_graph
+from graph_file import HEADER, GraphFile, GraphFileError, MappedRoadGraph, convert_json, open_graph
+from road_graph import RoadGraph, get_graph
+from routing import dijkstra
+
+
+@pytest.fixture(scope='module')
+def map_data():
+    data = geometric_graph(120, seed=5)
+    # Awkward cases: a node without coordinates, a null distance and an
+    # edge to a node that does not exist
+    data['nodes'].append({'id': 'bare', 'name': 'No Coordinates'})
+    data['edges'].append({'from': 'bare', 'to': data['nodes'][0]['id'], 'distance': 0.5})
+    data['edges'].append({'from': data['nodes'][1]['id'], 'to': data['nodes'][2]['id'], 'distance': None})
+    data['edges'].append({'from': data['nodes'][1]['id'], 'to': 'missing', 'distance': 1.0})
+    return data
+
+
+@pytest.fixture
+def graph_path(map_data, tmp_path):
+    path = str(tmp_path / 'map.graph')
+    convert_json(map_data, path)
+    return path
+
+
+def test_round_trip_matches_json_graph(map_data, graph_path):
+    expected = RoadGraph(map_data, 'json')
+    graph = open_graph(graph_path)
+    assert len(graph) == len(expected)
+    assert list(graph.index_to_name) == list(expected.index_to_name)
+    assert list(graph.offsets) == list(expected.offsets)
+    assert list(graph.targets) == list(expected.targets)
+    assert list(graph.weights) == pytest.approx(list(expected.weights))
+    assert graph.heuristic_scale == pytest.approx(expected.heuristic_scale)
+    for i, node in enumerate(map_data['nodes']):
+        assert graph.name_to_index[node['name']] == i
+        assert graph.id_to_name[node['id']] == node['name']
+        mapped = graph.nodes[i]
+        if 'lat' in node:
+            assert (mapped['lat'], mapped['lon']) == pytest.approx((node['lat'], node['lon']))
+        else:
+            assert 'lat' not in mapped and not graph.has_coordinates(i)
+    assert len(graph.located_nodes) == len(expected.located_nodes)
+
+
+def test_round_trip_edges_and_routes(map_data, graph_path):
+    graph = open_graph(graph_path)
+    edges = [e for e in map_data['edges'] if e['to'] != 'missing']
+    assert list(graph.edges) == [
+        {'from': e['from'], 'to': e['to'], 'distance': e['distance']} for e in edges]
+    expected = RoadGraph(map_data, 'json')
+    rnd = random.Random(1)
+    for _ in range(20):
+        a, b = rnd.choice(expected.index_to_name), rnd.choice(expected.index_to_name)
+        assert dijkstra(graph, a, b).distance == pytest.approx(dijkstra(expected, a, b).distance)
+
+
+def test_sections_are_read_only_views(graph_path):
+    graph_file = GraphFile(graph_path)
+    # NumPy views where NumPy is installed, memoryviews otherwise
+    offsets = graph_file.array('offsets')
+    assert list(offsets) == list(graph_file.view('offsets'))
+    with pytest.raises((TypeError, ValueError)):
+        offsets[0] = 1
+
+
+def test_convert_reports_digest_and_skipped_edges(map_data, tmp_path):
+    digest, skipped = convert_json(map_data, str(tmp_path / 'map.graph'))
+    assert skipped == 1
+    assert open_graph(str(tmp_path / 'map.graph')).version == digest
+    # Same input, same bytes, same version
+    assert convert_json(map_data, str(tmp_path / 'again.graph'))[0] == digest
+
+
+def test_get_graph_maps_graph_files(graph_path):
+    graph = get_graph(graph_path)
+    assert isinstance(graph, MappedRoadGraph)
+    assert get_graph(graph_path) is graph
+
+
+def corrupt(path, offset):
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+
+def test_bad_checksum_is_rejected(graph_path):
+    corrupt(graph_path, HEADER.size + 8)
+    with pytest.raises(GraphFileError, match='checksum mismatch'):
+        open_graph(graph_path)
+    # Skipping verification still maps the file
+    assert len(open_graph(graph_path, verify=False)) > 0
+
+
+@pytest.mark.parametrize('damage, message', [
+    (lambda data: b'XXXX' + data[4:], 'not a graph file'),
+    (lambda data: data[:HEADER.size - 1], 'truncated header'),
+    (lambda data: data[:-8], 'expected'),
+    (lambda data: b'', 'empty file'),
+])
+def test_damaged_files_are_rejected(graph_path, damage, message):
+    with open(graph_path, 'rb') as f:
+        data = f.read()
+    with open(graph_path, 'wb') as f:
+        f.write(damage(data))
+    with pytest.raises(GraphFileError, match=message):
+        open_graph(graph_path)
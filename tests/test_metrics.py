@@ -0,0 +1,46 @@
+import logging
+
+
+def place_order(client, address='ISBT'):
+    return client.post('/orders', data={'customer_name': 'a', 'customer_email': 'a@gmail.com',
+                                        'customer_address': address, 'product_id': '1', 'quantity': '1'})
+
+
+def test_metrics_endpoint_serves_prometheus_text(client):
+    client.get('/warehouses')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_request_sql_queries_count{endpoint="warehouses"}' in text
+    assert 'sql_queries_total{operation="SELECT"}' in text
+
+
+def test_scrape_does_not_start_services(app):
+    services = app.extensions['logistics']
+    response = app.test_client().get('/metrics')
+    assert response.status_code == 200
+    assert not {'plan_jobs', 'native_router', 'ch_router', 'route_cache'} & set(services.__dict__)
+    assert 'plan_jobs{' not in response.get_data(as_text=True)
+
+
+def test_search_stats_are_aggregated(client):
+    from app import routing_searches
+    searches = routing_searches.value(algorithm='multi_target')
+    assert b'Order placed successfully' in place_order(client).data
+    assert routing_searches.value(algorithm='multi_target') > searches
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'routing_nodes_settled_sum{algorithm="multi_target"}' in text
+    assert 'routing_heap_pushes_total{algorithm="multi_target"}' in text
+
+
+def test_slow_request_log_breaks_down_queries(app, client, caplog):
+    app.config['SLOW_REQUEST_SECONDS'] = 0
+    with caplog.at_level(logging.WARNING, logger='logistics.slow_requests'):
+        place_order(client)
+    message = caplog.records[-1].getMessage()
+    assert message.startswith('slow request POST /orders -> 200')
+    assert '\n  sql ' in message
+    assert 'x ' in message.split('\n  sql ', 1)[1]
+    assert '\n  routing multi_target 1 searches' in message
@@ -0,0 +1,61 @@
+import pytest
+
+
+@pytest.fixture
+def orders(client):
+    rows = [dict(customer_name=f'c{i}', customer_email='c@gmail.com', product_id=2, quantity=1,
+                 customer_address=('ISBT', 'Rajpur Road Store', 'Paltan Bazaar Store')[i % 3])
+            for i in range(57)]
+    results = client.post('/api/orders/bulk', json=rows).get_json()['results']
+    assert all(r['status'] == 'allocated' for r in results)
+    return results
+
+
+def pages(client, **params):
+    items, cursor = [], None
+    while True:
+        query = dict(params, cursor=cursor) if cursor else params
+        data = client.get('/api/orders', query_string=query).get_json()
+        items.append(data['items'])
+        cursor = data['next_cursor']
+        if cursor is None:
+            return items
+
+
+def test_pages_cover_every_order_once_newest_first(client, orders):
+    result = pages(client, limit=20)
+    assert [len(page) for page in result] == [20, 20, 17]
+    items = [item for page in result for item in page]
+    keys = [(item['created_at'], item['id']) for item in items]
+    assert keys == sorted(keys, reverse=True)
+    assert len({item['id'] for item in items}) == 57
+    assert {item['type'] for item in items} == {'customer_order'}
+
+
+def test_filters(client, orders):
+    by_warehouse = {}
+    for r in orders:
+        by_warehouse[r['warehouse']] = by_warehouse.get(r['warehouse'], 0) + 1
+    from app import Warehouse
+    with client.application.app_context():
+        ids = {w.name: w.id for w in Warehouse.query}
+    for name, count in by_warehouse.items():
+        items = [i for page in pages(client, type='delivery', warehouse_id=ids[name], limit=7) for i in page]
+        assert len(items) == count
+        assert {(i['warehouse_name'], i['status']) for i in items} == {(name, 'pending')}
+    assert pages(client, type='delivery', status='completed') == [[]]
+
+
+def test_bad_parameters(client, orders):
+    assert client.get('/api/orders', query_string={'type': 'bogus'}).status_code == 400
+    # An unreadable cursor starts from the first page; limit is clamped
+    first = client.get('/api/orders', query_string={'limit': 5}).get_json()
+    assert client.get('/api/orders', query_string={'limit': 5, 'cursor': '!!'}).get_json() == first
+    assert len(client.get('/api/orders', query_string={'limit': 0}).get_json()['items']) == 1
+
+
+def test_html_pages_follow_the_cursor(client, orders):
+    data = client.get('/api/orders', query_string={'limit': 50}).get_json()
+    response = client.get('/orders', query_string={'cursor': data['next_cursor']})
+    assert response.status_code == 200
+    assert b'c0' in response.data and b'c56' not in response.data
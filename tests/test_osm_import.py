@@ -0,0 +1,134 @@
+import json
+from array import array
+
+import pytest
+from click.testing import CliRunner
+
+import osm_import
+from graph_file import open_graph
+from osm_import import import_osm, is_drivable, write_json
+from road_graph import RoadGraph, haversine_km
+from routing import dijkstra
+
+# Depot -> Market along a residential street with two shape nodes, then a
+# primary road through a junction (5) to a side street (5-7) and on to an
+# unnamed way end (6) that a second street continues (6-11). The footway,
+# private road and pedestrian area are not drivable; node 9 is on no way.
+SMALL_OSM = '''<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="30.3000" lon="78.0000"><tag k="name" v="Depot"/></node>
+  <node id="2" lat="30.3010" lon="78.0000"/>
+  <node id="3" lat="30.3020" lon="78.0005"/>
+  <node id="4" lat="30.3020" lon="78.0015"><tag k="name" v="Market"/></node>
+  <node id="5" lat="30.3030" lon="78.0025"/>
+  <node id="6" lat="30.3040" lon="78.0035"/>
+  <node id="7" lat="30.3020" lon="78.0040"><tag k="name" v="Market"/></node>
+  <node id="8" lat="30.3000" lon="78.0050"/>
+  <node id="9" lat="30.3100" lon="78.0100"><tag k="name" v="Lonely"/></node>
+  <node id="11" lat="30.3050" lon="78.0045"/>
+  <way id="10">
+    <nd ref="1"/><nd ref="2"/><nd ref="3"/><nd ref="4"/>
+    <tag k="highway" v="residential"/><tag k="name" v="Station Road"/>
+  </way>
+  <way id="11">
+    <nd ref="4"/><nd ref="5"/><nd ref="6"/>
+    <tag k="highway" v="primary"/>
+  </way>
+  <way id="12">
+    <nd ref="5"/><nd ref="7"/>
+    <tag k="highway" v="tertiary"/>
+  </way>
+  <way id="13">
+    <nd ref="7"/><nd ref="8"/>
+    <tag k="highway" v="footway"/>
+  </way>
+  <way id="14">
+    <nd ref="8"/><nd ref="1"/>
+    <tag k="highway" v="service"/><tag k="access" v="private"/>
+  </way>
+  <way id="15">
+    <nd ref="2"/><nd ref="8"/><nd ref="7"/><nd ref="2"/>
+    <tag k="highway" v="pedestrian"/><tag k="area" v="yes"/>
+  </way>
+  <way id="16">
+    <nd ref="6"/><nd ref="11"/>
+    <tag k="highway" v="residential"/>
+  </way>
+</osm>
+'''
+
+COORDS = {1: (30.3000, 78.0000), 2: (30.3010, 78.0000), 3: (30.3020, 78.0005), 4: (30.3020, 78.0015),
+          5: (30.3030, 78.0025), 6: (30.3040, 78.0035), 7: (30.3020, 78.0040), 11: (30.3050, 78.0045)}
+
+
+def km(*ids):
+    return sum(haversine_km(*COORDS[a], *COORDS[b]) for a, b in zip(ids, ids[1:]))
+
+
+@pytest.fixture
+def osm_path(tmp_path):
+    path = tmp_path / 'small.osm'
+    path.write_text(SMALL_OSM)
+    return str(path)
+
+
+def edge_lengths(graph):
+    return {tuple(sorted((graph.ids[u], graph.ids[v]))): d
+            for u, v, d in zip(graph.edge_from, graph.edge_to, graph.edge_distance)}
+
+
+def test_is_drivable():
+    assert is_drivable({'highway': 'residential'})
+    assert not is_drivable({'highway': 'footway'})
+    assert not is_drivable({'highway': 'service', 'access': 'private'})
+    assert not is_drivable({'highway': 'primary', 'motor_vehicle': 'no'})
+    assert not is_drivable({'highway': 'residential', 'area': 'yes'})
+    assert not is_drivable({'name': 'Station Road'})
+
+
+def test_import_compresses_chains(osm_path):
+    graph = import_osm(osm_path)
+    assert sorted(graph.ids) == ['1', '11', '4', '5', '7']
+    names = dict(zip(graph.ids, graph.names))
+    assert names == {'1': 'Depot', '4': 'Market', '7': 'Market (7)', '5': 'node 5', '11': 'node 11'}
+    lengths = edge_lengths(graph)
+    assert set(lengths) == {('1', '4'), ('4', '5'), ('5', '7'), ('11', '5')}
+    assert lengths['1', '4'] == pytest.approx(km(1, 2, 3, 4))
+    assert lengths['11', '5'] == pytest.approx(km(5, 6, 11))
+    assert lengths['5', '7'] == pytest.approx(km(5, 7))
+    i = graph.ids.index('7')
+    assert (graph.lat[i], graph.lon[i]) == pytest.approx(COORDS[7])
+    assert graph.stats['nodes'] == 5 and graph.stats['edges'] == 4 and graph.stats['named_nodes'] == 3
+
+
+def test_import_is_unchanged_by_sort_run_size(osm_path, monkeypatch):
+    expected = edge_lengths(import_osm(osm_path))
+    monkeypatch.setattr(osm_import, 'SORT_RUN', 2)
+    assert edge_lengths(import_osm(osm_path)) == expected
+
+
+def test_parallel_ways_keep_the_shortest_edge():
+    edges = osm_import._unique_edges(3, array('q', [0, 1, 0]), array('q', [2, 2, 2]), array('d', [5.0, 1.0, 3.0]))
+    assert [list(column) for column in edges] == [[0, 1], [2, 2], [3.0, 1.0]]
+
+
+def test_import_without_compression_keeps_way_ends(osm_path):
+    graph = import_osm(osm_path, compress=False)
+    assert sorted(graph.ids) == ['1', '11', '4', '5', '6', '7']
+    assert set(edge_lengths(graph)) == {('1', '4'), ('4', '5'), ('5', '6'), ('5', '7'), ('11', '6')}
+
+
+def test_json_output_loads_as_road_graph(osm_path, tmp_path):
+    out = tmp_path / 'map.json'
+    write_json(import_osm(osm_path), str(out))
+    graph = RoadGraph(json.loads(out.read_text()), 'osm')
+    assert dijkstra(graph, 'Depot', 'Market (7)').distance == pytest.approx(km(1, 2, 3, 4, 5, 7), abs=1e-3)
+
+
+def test_cli_writes_binary_graph(osm_path, tmp_path):
+    out = tmp_path / 'map.graph'
+    result = CliRunner().invoke(osm_import.main, [osm_path, '-o', str(out), '--format', 'binary'])
+    assert result.exit_code == 0, result.output
+    assert '5 nodes, 4 edges (3 named)' in result.output
+    graph = open_graph(str(out))
+    assert dijkstra(graph, 'Depot', 'node 11').distance == pytest.approx(km(1, 2, 3, 4, 5, 6, 11))
@@ -0,0 +1,75 @@
+import threading
+import time
+
+
+def place_order(client, address):
+    response = client.post('/orders', data={'customer_name': 'a', 'customer_email': 'a@gmail.com',
+                                            'customer_address': address, 'product_id': '1', 'quantity': '1'})
+    assert b'Order placed successfully' in response.data
+
+
+def delivery_warehouse(app):
+    from app import Order, db
+    with app.app_context():
+        return db.session.scalar(db.select(Order.warehouse_id).where(Order.type == 'delivery'))
+
+
+def wait_for(client, url, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get(url).get_json()
+        if status['status'] in ('done', 'failed') or time.monotonic() > deadline:
+            return status
+        time.sleep(0.02)
+
+
+def test_plan_job_runs_in_background_and_persists(app, client):
+    from app import Route, db
+    place_order(client, 'ISBT')
+    place_order(client, 'Rajpur Road Store')
+    response = client.post('/api/plan_jobs', json={'warehouse_id': delivery_warehouse(app)})
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['deduplicated'] is False
+    assert response.headers['Location'] == job['status_url']
+    status = wait_for(client, job['status_url'])
+    assert status['status'] == 'done'
+    assert status['plan']['total_distance'] > 0
+    assert status['warnings'] == []
+    with app.app_context():
+        row = db.session.get(Route, status['route_id'])
+        assert (row.type, row.end_point) == ('batch_plan', job['id'])
+
+
+def test_identical_in_flight_plans_share_a_job(app, client):
+    place_order(client, 'ISBT')
+    warehouse_id = delivery_warehouse(app)
+    # Hold the single worker so both requests find the plan still queued
+    release = threading.Event()
+    app.extensions['logistics'].plan_jobs.submit(('hold',), lambda job: release.wait(10))
+    try:
+        first = client.post('/api/plan_jobs', json={'warehouse_id': warehouse_id}).get_json()
+        second = client.post('/api/plan_jobs', json={'warehouse_id': warehouse_id}).get_json()
+        assert first['status'] == 'queued'
+        assert second['id'] == first['id']
+        assert second['deduplicated'] is True
+    finally:
+        release.set()
+    assert wait_for(client, first['status_url'])['status'] == 'done'
+
+
+def test_finished_plans_are_served_from_the_database(app, client):
+    place_order(client, 'ISBT')
+    job = client.post('/api/plan_jobs', json={'warehouse_id': delivery_warehouse(app)}).get_json()
+    assert wait_for(client, job['status_url'])['status'] == 'done'
+    # As after a restart: the in-memory job list no longer knows the id
+    app.extensions['logistics'].plan_jobs._jobs.clear()
+    status = client.get(job['status_url']).get_json()
+    assert (status['status'], status['id']) == ('done', job['id'])
+
+
+def test_plan_job_api_rejects_bad_requests(client):
+    assert client.post('/api/plan_jobs', json={'warehouse_id': 999}).status_code == 404
+    assert client.post('/api/plan_jobs', json={'warehouse_id': 1}).status_code == 400
+    assert client.post('/api/plan_jobs', json={'warehouse_id': 1, 'vehicles': 'two'}).status_code == 400
+    assert client.get('/api/plan_jobs/missing').status_code == 404
@@ -0,0 +1,95 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from benchmark import grid_graph
+from delivery_planner import plan_fleet, plan_route
+from road_graph import RoadGraph
+from route_cache import RouteCache
+
+
+class Tier:
+    """Dict-backed persistent tier counting its round trips"""
+
+    def __init__(self):
+        self.rows = {}
+        self.loads = self.stores = 0
+
+    def load(self, version, pairs):
+        self.loads += 1
+        return {pair: self.rows[version, *pair] for pair in pairs if (version, *pair) in self.rows}
+
+    def store(self, version, routes):
+        self.stores += 1
+        for start, end, distance, path in routes:
+            self.rows[version, start, end] = (distance, path)
+
+
+@pytest.fixture(scope='module')
+def graph():
+    return RoadGraph(grid_graph(64, seed=2), 'cache-test')
+
+
+def test_paths_use_one_lookup_and_one_write(graph):
+    tier = Tier()
+    cache = RouteCache(load=tier.load, store=tier.store)
+    names = graph.index_to_name
+    pairs = [(names[0], names[i]) for i in range(1, 9)]
+    first = cache.paths(graph, pairs)
+    assert (tier.loads, tier.stores, cache.computed) == (1, 1, 8)
+    cache.memory.clear()
+    assert cache.paths(graph, pairs) == first
+    assert (tier.loads, tier.stores, cache.computed) == (2, 1, 8)
+    assert cache.persistent_hits == 8
+
+
+@pytest.mark.parametrize('plan', ['route', 'fleet'])
+def test_plans_batch_their_legs(graph, plan):
+    tier = Tier()
+    cache = RouteCache(load=tier.load, store=tier.store)
+    names = graph.index_to_name
+    if plan == 'route':
+        plan_route(graph, names[0], names[5:40:3], time_budget=0.1, cache=cache)
+    else:
+        deliveries = [{'id': i, 'address': names[i], 'weight': 1} for i in range(5, 40, 3)]
+        plan_fleet(graph, names[0], deliveries, 3, 4, time_budget=0.1, cache=cache)
+    assert (tier.loads, tier.stores) == (1, 1)
+
+
+def place_order(client, address='ISBT', quantity=2):
+    return client.post('/orders', data={'customer_name': 'a', 'customer_email': 'a@gmail.com',
+                                        'customer_address': address, 'product_id': '1',
+                                        'quantity': str(quantity)}, follow_redirects=True)
+
+
+def test_order_routes_persist_with_the_order(app, client):
+    from app import Route, services
+    assert b'Order placed successfully' in place_order(client).data
+    with app.app_context():
+        stored = {(r.start_point, r.end_point) for r in Route.query.filter_by(type='calculated_route')}
+        assert stored and all(end == 'ISBT' for _, end in stored)
+        assert len(services().route_cache.memory) == len(stored)
+
+
+def test_lock_retry_keeps_tiers_in_step(app, client, monkeypatch):
+    from app import Route, db, services
+    commit = db.session.commit
+    calls = []
+
+    def flaky_commit():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OperationalError('COMMIT', {}, Exception('database is locked'))
+        commit()
+
+    with app.app_context():
+        services().route_cache.memory.clear()
+    monkeypatch.setattr(db.session, 'commit', flaky_commit)
+    # The first commit fails before reaching the database; roll back as a lock would
+    assert b'Order placed successfully' in place_order(client).data
+    monkeypatch.undo()
+    assert len(calls) == 2
+    with app.app_context():
+        stored = {(r.start_point, r.end_point) for r in Route.query.filter_by(type='calculated_route')}
+        cache = services().route_cache
+        remembered = {(start, end) for _, start, end in cache.memory._data}
+        assert stored and stored == remembered
@@ -0,0 +1,36 @@
+import pytest
+
+
+@pytest.fixture
+def isbt(app):
+    from app import get_graph
+    with app.app_context():
+        graph = get_graph()
+        node = graph.nodes[graph.name_to_index['ISBT']]
+    return node['lat'], node['lon']
+
+
+def test_snap_by_coordinates(client, isbt):
+    lat, lon = isbt
+    body = client.get('/api/snap', query_string={'lat': lat, 'lon': lon}).get_json()
+    assert body['max_km'] == 2.0
+    assert body['results'][0]['node'] == 'ISBT'
+
+
+def test_large_radius_is_clamped(app, client, isbt):
+    lat, lon = isbt
+    body = client.post('/api/snap', json={'points': [[lat, lon]], 'max_km': 1e9}).get_json()
+    assert body['max_km'] == app.config['SNAP_RADIUS_MAX_KM']
+    assert body['results'][0]['node'] == 'ISBT'
+
+
+@pytest.mark.parametrize('max_km', ['inf', '-inf', 'nan', '-1', 'far'])
+def test_bad_radius_is_rejected(client, isbt, max_km):
+    lat, lon = isbt
+    response = client.get('/api/snap', query_string={'lat': lat, 'lon': lon, 'max_km': max_km})
+    assert response.status_code == 400
+
+
+def test_non_finite_points_are_rejected(client):
+    response = client.post('/api/snap', json={'points': [['nan', 78.0]]})
+    assert response.status_code == 400
@@ -0,0 +1,97 @@
+import math
+import random
+
+import pytest
+
+from benchmark import ORIGIN_LAT, ORIGIN_LON, geometric_graph, grid_graph
+from road_graph import RoadGraph, haversine_km
+from spatial_index import GridIndex, LocationIndex, parse_coordinates
+
+
+def brute_force(graph, lat, lon, max_km):
+    best, best_km = None, math.inf
+    for i, node in enumerate(graph.nodes):
+        if 'lat' not in node:
+            continue
+        km = haversine_km(lat, lon, node['lat'], node['lon'])
+        if km < best_km:
+            best, best_km = i, km
+    if best is None or best_km > max_km:
+        return None, None
+    return best, best_km
+
+
+def random_points(count, seed, spread=0.06):
+    rnd = random.Random(seed)
+    return [(ORIGIN_LAT + rnd.uniform(-spread, 2 * spread), ORIGIN_LON + rnd.uniform(-spread, 2 * spread))
+            for _ in range(count)]
+
+
+@pytest.fixture(scope='module', params=['grid', 'geometric'])
+def graph(request):
+    generate = {'grid': grid_graph, 'geometric': geometric_graph}[request.param]
+    data = generate(400, seed=11)
+    # Nodes without coordinates are never snapped to
+    data['nodes'].append({'id': 'bare', 'name': 'No Coordinates'})
+    return RoadGraph(data, request.param)
+
+
+@pytest.mark.parametrize('cell_km', [None, 0.05, 0.5, 20.0])
+@pytest.mark.parametrize('max_km', [0.1, 2.0, math.inf])
+def test_nearest_matches_brute_force(graph, cell_km, max_km):
+    index = GridIndex(graph, cell_km)
+    for lat, lon in random_points(60, seed=int(max_km) if max_km < math.inf else 99):
+        expected, expected_km = brute_force(graph, lat, lon, max_km)
+        found, km = index.nearest(lat, lon, max_km)
+        if expected is None:
+            assert found is None and km is None
+        else:
+            # Ties may pick either node, but never a farther one
+            assert km == pytest.approx(expected_km)
+            assert haversine_km(lat, lon, graph.nodes[found]['lat'], graph.nodes[found]['lon']) == pytest.approx(km)
+
+
+def test_nearest_on_a_node_is_that_node(graph):
+    index = GridIndex(graph)
+    for i, node in enumerate(graph.nodes[:50]):
+        found, km = index.nearest(node['lat'], node['lon'])
+        assert km == pytest.approx(0.0, abs=1e-9)
+        assert found == i or graph.nodes[found]['lat'] == node['lat']
+
+
+def test_nearest_many_matches_nearest(graph):
+    index = GridIndex(graph)
+    points = random_points(20, seed=3)
+    assert index.nearest_many(points) == [index.nearest(lat, lon) for lat, lon in points]
+
+
+def test_empty_graph():
+    index = GridIndex(RoadGraph({'nodes': [{'id': 'a', 'name': 'A'}], 'edges': []}, 'empty'))
+    assert index.nearest(ORIGIN_LAT, ORIGIN_LON) == (None, None)
+
+
+def test_parse_coordinates():
+    assert parse_coordinates('Gate 2 (30.3256, 78.0437)') == (30.3256, 78.0437)
+    assert parse_coordinates('30.3256,78.0437') == (30.3256, 78.0437)
+    assert parse_coordinates('-33.9,151.2') == (-33.9, 151.2)
+    assert parse_coordinates('Clock Tower') is None
+    assert parse_coordinates('95.0, 78.0') is None
+    assert parse_coordinates(None) is None
+
+
+def test_location_index_resolves_addresses(graph):
+    index = LocationIndex(graph)
+    node = graph.nodes[7]
+    assert index.resolve(node['name']) == (node['name'], 0.0)
+    assert index.resolve(f"  {node['name'].upper()}. ") == (node['name'], 0.0)
+    lat, lon = node['lat'] + 0.0001, node['lon']
+    name, km = index.resolve(f'Back gate ({lat}, {lon})')
+    _, expected_km = brute_force(graph, lat, lon, 2.0)
+    assert km == pytest.approx(expected_km)
+    snapped = graph.nodes[graph.name_to_index[name]]
+    assert haversine_km(lat, lon, snapped['lat'], snapped['lon']) == pytest.approx(expected_km)
+    assert index.resolve('Far away (10.0, 10.0)') == (None, None)
+    assert index.resolve('Unknown Street') == (None, None)
+    assert index.resolve('') == (None, None)
+    assert index.resolve_many([node['name'], 'Unknown Street', node['name']]) == {
+        node['name']: node['name'], 'Unknown Street': None}
@@ -0,0 +1,63 @@
+import pytest
+
+QUANTITY_ERROR = b'Quantity must be a whole number of at least 1'
+
+
+def level(app, product_id, location):
+    from app import stock_levels
+    with app.app_context():
+        return stock_levels(product_id=product_id).get(location, {}).get(product_id)
+
+
+def test_ship_moves_stock(app, client):
+    response = client.post('/ship_to_warehouse', data={'product_id': 1, 'warehouse_id': 1, 'quantity': 5},
+                           follow_redirects=True)
+    assert b'Shipped 5 Laptop to Clement Town Warehouse' in response.data
+    assert level(app, 1, 'factory') == 95
+    assert level(app, 1, 'Clement Town Warehouse') == 25
+
+
+def test_ship_beyond_factory_stock_is_refused(app, client):
+    response = client.post('/ship_to_warehouse', data={'product_id': 1, 'warehouse_id': 1, 'quantity': 101},
+                           follow_redirects=True)
+    assert b'Not enough Laptop in factory stock' in response.data
+    assert level(app, 1, 'factory') == 100
+
+
+@pytest.mark.parametrize('quantity', ['-5', '0', 'five', '2.5'])
+def test_ship_rejects_bad_quantities(app, client, quantity):
+    response = client.post('/ship_to_warehouse', data={'product_id': 1, 'warehouse_id': 1, 'quantity': quantity},
+                           follow_redirects=True)
+    assert QUANTITY_ERROR in response.data
+    assert level(app, 1, 'factory') == 100
+    assert level(app, 1, 'Clement Town Warehouse') == 20
+
+
+@pytest.mark.parametrize('quantity', ['-3', '0'])
+def test_dispatch_rejects_bad_quantities(app, client, quantity):
+    response = client.post('/dispatch_from_warehouse', follow_redirects=True, data={
+        'product_id': 1, 'warehouse_id': 1, 'quantity': quantity, 'customer_address': 'ISBT'})
+    assert QUANTITY_ERROR in response.data
+    assert level(app, 1, 'Clement Town Warehouse') == 20
+
+
+@pytest.mark.parametrize('quantity', ['-2', '0'])
+def test_order_rejects_bad_quantities(app, client, quantity):
+    response = client.post('/orders', follow_redirects=True, data={
+        'customer_name': 'a', 'customer_email': 'a@gmail.com', 'customer_address': 'ISBT',
+        'product_id': 1, 'quantity': quantity})
+    assert QUANTITY_ERROR in response.data
+    assert level(app, 1, 'Clement Town Warehouse') == 20
+    assert level(app, 1, 'Prem Nagar Warehouse') == 20
+
+
+def test_stock_helpers_refuse_negative_quantities(app, client):
+    from app import receive_stock, reserve_stock
+    with app.app_context():
+        with pytest.raises(ValueError):
+            reserve_stock(1, 'factory', -5)
+        with pytest.raises(ValueError):
+            reserve_stock(1, 'factory', 0)
+        with pytest.raises(ValueError):
+            receive_stock(1, 'factory', -5)
+    assert level(app, 1, 'factory') == 100
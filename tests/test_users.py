@@ -0,0 +1,77 @@
+import builtins
+import threading
+
+from user_store import UserStore
+
+
+def signup(client, email, password='secret'):
+    return client.post('/signup', data={'email': email, 'password': password}, follow_redirects=True)
+
+
+def login(client, email, password='secret'):
+    return client.post('/login', data={'email': email, 'password': password}, follow_redirects=True)
+
+
+def test_signup_then_login(app):
+    client = app.test_client()
+    assert b'Signup successful' in signup(client, 'ana@gmail.com').data
+    assert b'Logged in successfully' in login(client, 'ANA@gmail.com ').data
+    assert client.get('/').status_code == 200
+
+
+def test_signup_rejects_taken_email(app):
+    client = app.test_client()
+    signup(client, 'ana@gmail.com')
+    assert b'Email already exists' in signup(client, 'Ana@gmail.com').data
+    assert len(app.extensions['logistics'].user_store) == 1
+
+
+def test_login_rejects_wrong_password(app):
+    client = app.test_client()
+    signup(client, 'ana@gmail.com')
+    assert b'Invalid email or password' in login(client, 'ana@gmail.com', 'wrong').data
+    assert client.get('/').status_code == 302
+
+
+def test_authenticated_requests_do_not_reread_users_file(app, client, monkeypatch):
+    path = app.config['USERS_CSV']
+    opened = []
+    real_open = builtins.open
+
+    def counting_open(file, *args, **kwargs):
+        if str(file) == path:
+            opened.append(file)
+        return real_open(file, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, 'open', counting_open)
+    for _ in range(5):
+        assert client.get('/').status_code == 200
+    assert opened == []
+
+
+def test_store_sees_users_added_by_another_process(tmp_path):
+    path = str(tmp_path / 'users.csv')
+    store, other = UserStore(path), UserStore(path)
+    store.ensure_file()
+    assert store.get('0') is None
+    user_id = other.add('ana@gmail.com', 'secret')
+    assert store.get(user_id)['email'] == 'ana@gmail.com'
+    assert store.find_by_email('ANA@gmail.com')['id'] == user_id
+
+
+def test_concurrent_signups_get_distinct_ids(tmp_path):
+    path = str(tmp_path / 'users.csv')
+    stores = [UserStore(path) for _ in range(4)]
+    ids = []
+
+    def sign_up(store, worker):
+        for n in range(10):
+            ids.append(store.add(f'user{worker}-{n}@gmail.com', 'secret'))
+
+    threads = [threading.Thread(target=sign_up, args=(store, worker)) for worker, store in enumerate(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(ids)) == 40
+    assert len(UserStore(path)) == 40
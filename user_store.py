@@ -0,0 +1,127 @@
+"""
+Indexed user store backed by users.csv
+Keeps id and email indexes in memory and reloads them when the file's
+mtime or size changes, so looking up a user no longer scans the file
+"""
+
+import csv
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+FIELDS = ['id', 'email', 'password']
+
+
+@contextmanager
+def _locked(f):
+    """Hold an exclusive lock on an open file across processes"""
+    if fcntl:
+        fcntl.flock(f, fcntl.LOCK_EX)
+    try:
+        yield f
+    finally:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _write_header(f):
+    """Write the CSV header if the locked file is empty; True if written"""
+    f.seek(0, os.SEEK_END)
+    if f.tell():
+        return False
+    csv.writer(f).writerow(FIELDS)
+    f.flush()
+    return True
+
+
+class UserStore:
+    """In-memory id/email index over a CSV user file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stat_key = None
+        self._by_id = {}
+        self._by_email = {}
+        self._next_id = 0
+
+    def ensure_file(self):
+        """Create the CSV with its header if it does not exist yet
+
+        Safe against other threads and worker processes creating it at
+        the same moment: the header is only written to an empty file,
+        under the file lock.
+        """
+        with self._lock:
+            with open(self.path, 'a+', newline='') as f:
+                with _locked(f):
+                    return _write_header(f)
+
+    def _current_stat_key(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _reload(self, stat_key):
+        by_id, by_email, next_id = {}, {}, 0
+        if stat_key is not None:
+            with open(self.path, 'r', newline='') as f:
+                for row in csv.DictReader(f):
+                    if not row.get('id') or 'email' not in row or 'password' not in row:
+                        continue
+                    user = {'id': row['id'], 'email': row['email'], 'password': row['password']}
+                    by_id[user['id']] = user
+                    by_email.setdefault(user['email'].strip().lower(), user)
+                    if user['id'].isdigit():
+                        next_id = max(next_id, int(user['id']) + 1)
+        self._by_id, self._by_email, self._next_id = by_id, by_email, next_id
+        self._stat_key = stat_key
+
+    def _refresh(self):
+        stat_key = self._current_stat_key()
+        if stat_key != self._stat_key:
+            with self._lock:
+                if stat_key != self._stat_key:
+                    self._reload(stat_key)
+
+    def get(self, user_id):
+        """Return the user dict for an id, or None"""
+        self._refresh()
+        return self._by_id.get(str(user_id))
+
+    def find_by_email(self, email):
+        """Return the user dict for an email (case-insensitive), or None"""
+        self._refresh()
+        return self._by_email.get(email.strip().lower())
+
+    def add(self, email, password):
+        """Append a user and return its id, or None if the email is taken
+
+        The file is locked while the next id is chosen, so concurrent
+        signups in other threads or worker processes cannot collide.
+        """
+        with self._lock:
+            with open(self.path, 'a+', newline='') as f:
+                with _locked(f):
+                    _write_header(f)
+                    # Re-read under the lock to see other workers' signups
+                    self._reload(self._current_stat_key())
+                    if email.strip().lower() in self._by_email:
+                        return None
+                    user_id = str(self._next_id)
+                    f.seek(0, os.SEEK_END)
+                    csv.writer(f).writerow([user_id, email, password])
+                    f.flush()
+            self._reload(self._current_stat_key())
+        return user_id
+
+    def __len__(self):
+        self._refresh()
+        return len(self._by_id)